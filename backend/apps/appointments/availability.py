@@ -0,0 +1,529 @@
+"""
+Bitmap-backed slot availability for doctors.
+
+Every doctor has an ordered *layout* of their TimeSlot rows. For each
+(doctor, date) pair we keep a bitmap with one bit per layout position: a set
+bit means the slot holds an active appointment on that date. Lookups are a
+bit scan over the layout and never touch the database once both pieces are
+warm. Appointment.save keeps the bitmaps up to date incrementally and
+check_consistency() can rebuild them from the database.
+
+A bitmap rebuilt lazily from the database is only stored if no transition
+touched its (doctor, date) while the appointments were read: every
+transition bumps a per-(doctor, date) generation in the same atomic step as
+its bit update, and the rebuild writes only if the generation it saw before
+reading is still current. A booking that commits mid-rebuild either finds the
+rebuilt key (and sets its bit) or makes the rebuild skip the write.
+
+Bitmaps use the Redis bit order (bit 0 is the most significant bit of the
+first byte) so the same bytes can be read from either store.
+"""
+import heapq
+import threading
+import time
+import uuid
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+ACTIVE_STATUSES = ('scheduled', 'confirmed')
+
+LAYOUT_TTL = getattr(settings, 'SLOT_LAYOUT_TTL', 60 * 60 * 24)
+BITMAP_TTL = getattr(settings, 'SLOT_BITMAP_TTL', 60 * 60 * 24)
+
+SlotState = namedtuple(
+    'SlotState', ['doctor_id', 'date', 'time_slot_id', 'status', 'priority'], defaults=(None,)
+)
+
+
+class SlotLayout:
+    """Ordered TimeSlot rows of a single doctor."""
+
+    __slots__ = ('version', 'slot_ids', 'start_times', 'end_times', 'positions')
+
+    def __init__(self, version, rows):
+        self.version = version
+        self.slot_ids = tuple(row[0] for row in rows)
+        self.start_times = tuple(row[1] for row in rows)
+        self.end_times = tuple(row[2] for row in rows)
+        self.positions = {slot_id: index for index, slot_id in enumerate(self.slot_ids)}
+
+    def __len__(self):
+        return len(self.slot_ids)
+
+
+class MemoryBitmapStore:
+    """Process-local store, suitable for tests and single-process deployments."""
+
+    def __init__(self):
+        self._data = {}
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def _live(self, key, now):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[0] < now:
+            del self._data[key]
+            return None
+        return entry[1]
+
+    def get_many(self, keys):
+        now = time.monotonic()
+        with self._lock:
+            found = {}
+            for key in keys:
+                bitmap = self._live(key, now)
+                if bitmap is not None:
+                    found[key] = bytes(bitmap)
+            return found
+
+    def set_many(self, mapping, ttl):
+        expires = time.monotonic() + ttl
+        with self._lock:
+            for key, bitmap in mapping.items():
+                self._data[key] = (expires, bytearray(bitmap))
+
+    def get_generations(self, keys):
+        with self._lock:
+            return {key: self._generations.get(key, 0) for key in keys}
+
+    def set_many_if_unchanged(self, entries, ttl):
+        """entries are (key, generation_key, generation, bitmap) tuples."""
+        expires = time.monotonic() + ttl
+        with self._lock:
+            for key, generation_key, generation, bitmap in entries:
+                if self._generations.get(generation_key, 0) == generation:
+                    self._data[key] = (expires, bytearray(bitmap))
+
+    def bump_generation(self, generation_key):
+        with self._lock:
+            self._generations[generation_key] = self._generations.get(generation_key, 0) + 1
+
+    def set_bit_if_exists(self, key, generation_key, position, value):
+        with self._lock:
+            self._generations[generation_key] = self._generations.get(generation_key, 0) + 1
+            bitmap = self._live(key, time.monotonic())
+            if bitmap is None:
+                return
+            index = position >> 3
+            if index >= len(bitmap):
+                bitmap.extend(b'\x00' * (index + 1 - len(bitmap)))
+            mask = 0x80 >> (position & 7)
+            if value:
+                bitmap[index] |= mask
+            else:
+                bitmap[index] &= ~mask
+
+    def delete_many(self, keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+
+class RedisBitmapStore:
+    """Store bitmaps as Redis strings so SETBIT updates are atomic."""
+
+    # Only touch bitmaps that already exist; a missing key is rebuilt lazily
+    # from the database instead of being resurrected with a single bit. The
+    # generation bump tells a concurrent rebuild its read is stale.
+    SET_BIT_SCRIPT = """
+        redis.call('incr', KEYS[2])
+        redis.call('expire', KEYS[2], ARGV[3])
+        if redis.call('exists', KEYS[1]) == 1 then
+            return redis.call('setbit', KEYS[1], ARGV[1], ARGV[2])
+        end
+        return -1
+    """
+
+    REBUILD_SCRIPT = """
+        if (redis.call('get', KEYS[2]) or '0') == ARGV[1] then
+            redis.call('set', KEYS[1], ARGV[2], 'EX', ARGV[3])
+            return 1
+        end
+        return 0
+    """
+
+    def __init__(self, alias='default'):
+        self.alias = alias
+        self._script = None
+        self._rebuild_script = None
+
+    @property
+    def connection(self):
+        from django_redis import get_redis_connection
+        return get_redis_connection(self.alias)
+
+    def get_many(self, keys):
+        if not keys:
+            return {}
+        values = self.connection.mget(keys)
+        return {key: value for key, value in zip(keys, values) if value is not None}
+
+    def set_many(self, mapping, ttl):
+        pipe = self.connection.pipeline(transaction=False)
+        for key, bitmap in mapping.items():
+            pipe.set(key, bytes(bitmap), ex=ttl)
+        pipe.execute()
+
+    def get_generations(self, keys):
+        if not keys:
+            return {}
+        values = self.connection.mget(keys)
+        return {key: int(value) if value is not None else 0 for key, value in zip(keys, values)}
+
+    def set_many_if_unchanged(self, entries, ttl):
+        """entries are (key, generation_key, generation, bitmap) tuples."""
+        if not entries:
+            return
+        if self._rebuild_script is None:
+            self._rebuild_script = self.connection.register_script(self.REBUILD_SCRIPT)
+        pipe = self.connection.pipeline(transaction=False)
+        for key, generation_key, generation, bitmap in entries:
+            self._rebuild_script(
+                keys=[key, generation_key], args=[str(generation), bytes(bitmap), ttl], client=pipe
+            )
+        pipe.execute()
+
+    def bump_generation(self, generation_key):
+        pipe = self.connection.pipeline(transaction=False)
+        pipe.incr(generation_key)
+        pipe.expire(generation_key, BITMAP_TTL)
+        pipe.execute()
+
+    def set_bit_if_exists(self, key, generation_key, position, value):
+        if self._script is None:
+            self._script = self.connection.register_script(self.SET_BIT_SCRIPT)
+        self._script(keys=[key, generation_key], args=[position, 1 if value else 0, BITMAP_TTL])
+
+    def delete_many(self, keys):
+        if keys:
+            self.connection.delete(*keys)
+
+
+_store = None
+
+
+def get_store():
+    global _store
+    if _store is None:
+        backend = getattr(settings, 'SLOT_AVAILABILITY_BACKEND', 'redis')
+        _store = MemoryBitmapStore() if backend == 'memory' else RedisBitmapStore()
+    return _store
+
+
+def _layout_key(doctor_id):
+    return f'slot_layout_{doctor_id}'
+
+
+def _bitmap_key(doctor_id, version, date):
+    return f'slot_bitmap:{doctor_id}:{version}:{date.isoformat()}'
+
+
+def _generation_key(doctor_id, date):
+    return f'slot_bitmap_generation:{doctor_id}:{date.isoformat()}'
+
+
+def _is_set(bitmap, position):
+    index = position >> 3
+    return index < len(bitmap) and bool(bitmap[index] & (0x80 >> (position & 7)))
+
+
+def _encode(layout, slot_ids):
+    bitmap = bytearray(max(1, (len(layout) + 7) // 8))
+    for slot_id in slot_ids:
+        position = layout.positions.get(slot_id)
+        if position is not None:
+            bitmap[position >> 3] |= 0x80 >> (position & 7)
+    return bytes(bitmap)
+
+
+def get_layouts(doctor_ids):
+    """Return {doctor_id: SlotLayout}, loading all cache misses in one query."""
+    from .models import TimeSlot
+
+    doctor_ids = list(doctor_ids)
+    cached = cache.get_many([_layout_key(doctor_id) for doctor_id in doctor_ids])
+    layouts = {}
+    missing = []
+    for doctor_id in doctor_ids:
+        entry = cached.get(_layout_key(doctor_id))
+        if entry is None:
+            missing.append(doctor_id)
+        else:
+            layouts[doctor_id] = SlotLayout(*entry)
+
+    if missing:
+        rows = {doctor_id: [] for doctor_id in missing}
+        slots = TimeSlot.objects.filter(doctor_id__in=missing).order_by(
+            'doctor_id', 'start_time', 'id'
+        ).values_list('doctor_id', 'id', 'start_time', 'end_time')
+        for doctor_id, slot_id, start_time, end_time in slots:
+            rows[doctor_id].append((slot_id, start_time, end_time))
+
+        fresh = {}
+        for doctor_id, doctor_rows in rows.items():
+            entry = (uuid.uuid4().hex[:12], doctor_rows)
+            fresh[_layout_key(doctor_id)] = entry
+            layouts[doctor_id] = SlotLayout(*entry)
+        cache.set_many(fresh, LAYOUT_TTL)
+
+    return layouts
+
+
+def get_layout(doctor_id):
+    return get_layouts([doctor_id])[doctor_id]
+
+
+def invalidate_layout(doctor_id):
+    """Drop a doctor's layout; bitmaps keyed by the old version expire on their own."""
+    cache.delete(_layout_key(doctor_id))
+
+
+def get_bitmaps(pairs, layouts):
+    """
+    Return {(doctor_id, date): bitmap} for the given pairs, rebuilding any
+    missing bitmaps from a single appointment query.
+    """
+    from .models import Appointment
+
+    pairs = list(pairs)
+    keys = {pair: _bitmap_key(pair[0], layouts[pair[0]].version, pair[1]) for pair in pairs}
+    stored = get_store().get_many(list(keys.values()))
+
+    bitmaps = {}
+    missing = []
+    for pair, key in keys.items():
+        if key in stored:
+            bitmaps[pair] = stored[key]
+        else:
+            missing.append(pair)
+
+    if missing:
+        generation_keys = {pair: _generation_key(*pair) for pair in missing}
+        # Read before the appointments: a transition after this makes the rebuild stale
+        generations = get_store().get_generations(list(generation_keys.values()))
+        booked = {pair: [] for pair in missing}
+        rows = Appointment.objects.filter(
+            doctor_id__in={doctor_id for doctor_id, _ in missing},
+            appointment_date__in={date for _, date in missing},
+            status__in=ACTIVE_STATUSES
+        ).values_list('doctor_id', 'appointment_date', 'time_slot_id')
+        for doctor_id, date, time_slot_id in rows:
+            if (doctor_id, date) in booked:
+                booked[(doctor_id, date)].append(time_slot_id)
+
+        fresh = []
+        for pair, slot_ids in booked.items():
+            bitmap = _encode(layouts[pair[0]], slot_ids)
+            generation_key = generation_keys[pair]
+            fresh.append((keys[pair], generation_key, generations[generation_key], bitmap))
+            bitmaps[pair] = bitmap
+        get_store().set_many_if_unchanged(fresh, BITMAP_TTL)
+
+    return bitmaps
+
+
+def iter_free_positions(layout, bitmap):
+    for position in range(len(layout)):
+        if not _is_set(bitmap, position):
+            yield position
+
+
+def iter_bookable_positions(layout, bitmap, date, now=None):
+    """Free positions, leaving out today's slots that have already started."""
+    now = now or timezone.localtime()
+    positions = iter_free_positions(layout, bitmap)
+    if date != now.date():
+        return positions
+    return (position for position in positions if layout.start_times[position] > now.time())
+
+
+def slot_payload(doctor_id, layout, position):
+    """Serialize a free slot the same way TimeSlotSerializer does."""
+    return {
+        'id': layout.slot_ids[position],
+        'doctor': doctor_id,
+        'start_time': layout.start_times[position].isoformat(),
+        'end_time': layout.end_times[position].isoformat(),
+        'is_available': True,
+    }
+
+
+def get_available_slot_ids(doctor_id, date):
+    layout = get_layout(doctor_id)
+    bitmap = get_bitmaps([(doctor_id, date)], {doctor_id: layout})[(doctor_id, date)]
+    return [layout.slot_ids[position] for position in iter_free_positions(layout, bitmap)]
+
+
+def get_available_slots(doctor_id, date):
+    """Free time slots of a doctor on a date, ordered by start time; past ones today are left out."""
+    layout = get_layout(doctor_id)
+    bitmap = get_bitmaps([(doctor_id, date)], {doctor_id: layout})[(doctor_id, date)]
+    return [
+        slot_payload(doctor_id, layout, position)
+        for position in iter_bookable_positions(layout, bitmap, date)
+    ]
+
+
+def find_free_slots(doctor_days, start_date, end_date, limit):
+    """
+    Earliest `limit` free slots across doctors and dates, sorted by time.
+
+    doctor_days maps doctor ids to the weekday names they work, as returned by
+    Doctor.get_available_days_list(). Layouts and bitmaps are fetched in bulk,
+    so the number of queries does not depend on the number of doctors or days.
+    """
+    from datetime import timedelta
+
+    pairs = []
+    day = start_date
+    while day <= end_date:
+        weekday = day.strftime('%A')
+        pairs.extend(
+            (doctor_id, day) for doctor_id, days in doctor_days.items() if weekday in days
+        )
+        day += timedelta(days=1)
+    if not pairs:
+        return []
+
+    layouts = get_layouts({doctor_id for doctor_id, _ in pairs})
+    bitmaps = get_bitmaps(pairs, layouts)
+
+    now = timezone.localtime()
+
+    def candidates():
+        for (doctor_id, date), bitmap in bitmaps.items():
+            layout = layouts[doctor_id]
+            for position in iter_bookable_positions(layout, bitmap, date, now):
+                yield (date, layout.start_times[position], doctor_id, position)
+
+    return [
+        dict(slot_payload(doctor_id, layouts[doctor_id], position), date=date.isoformat())
+        for date, _, doctor_id, position in heapq.nsmallest(limit, candidates())
+    ]
+
+
+def _set_bit(state, value):
+    generation_key = _generation_key(state.doctor_id, state.date)
+    entry = cache.get(_layout_key(state.doctor_id))
+    if entry is None:
+        # No layout means no reachable bitmaps; they are rebuilt on next read,
+        # and a rebuild already under way must not store what it read
+        get_store().bump_generation(generation_key)
+        return
+    layout = SlotLayout(*entry)
+    position = layout.positions.get(state.time_slot_id)
+    if position is None:
+        invalidate_layout(state.doctor_id)
+        get_store().bump_generation(generation_key)
+        return
+    get_store().set_bit_if_exists(
+        _bitmap_key(state.doctor_id, layout.version, state.date), generation_key, position, value
+    )
+
+
+def _is_active(state):
+    return (
+        state is not None
+        and state.status in ACTIVE_STATUSES
+        and None not in (state.doctor_id, state.date, state.time_slot_id)
+    )
+
+
+def slot_changes(old_state, new_state):
+    """Return (freed, taken) states of a transition; None where no slot changes."""
+    old_slot = old_state[:3] if _is_active(old_state) else None
+    new_slot = new_state[:3] if _is_active(new_state) else None
+    if old_slot == new_slot:
+        return None, None
+    return (old_state if old_slot else None), (new_state if new_slot else None)
+
+
+def apply_transition(old_state, new_state):
+    """Move an appointment's bit from old_state to new_state."""
+    freed, taken = slot_changes(old_state, new_state)
+    if freed:
+        _set_bit(freed, False)
+    if taken:
+        _set_bit(taken, True)
+
+
+def record_transition(old_state, new_state):
+    """Apply a transition once the surrounding transaction has committed."""
+    transaction.on_commit(lambda: apply_transition(old_state, new_state))
+
+
+def invalidate_dates(pairs):
+    """Forget the bitmaps of (doctor_id, date) pairs after set-based updates."""
+    pairs = list(pairs)
+    if not pairs:
+        return
+    layouts = get_layouts({doctor_id for doctor_id, _ in pairs})
+    get_store().delete_many([
+        _bitmap_key(doctor_id, layouts[doctor_id].version, date) for doctor_id, date in pairs
+    ])
+
+
+def check_consistency(start_date, end_date, doctor_ids=None, repair=False):
+    """
+    Compare stored bitmaps in [start_date, end_date] against the database.
+
+    Returns a list of (doctor_id, date, stored_slot_ids, expected_slot_ids)
+    for every mismatch. With repair=True the mismatching bitmaps are rewritten.
+    """
+    from datetime import timedelta
+    from .models import Appointment, TimeSlot
+
+    if doctor_ids is None:
+        doctor_ids = TimeSlot.objects.values_list('doctor_id', flat=True).distinct()
+    layouts = get_layouts(doctor_ids)
+
+    dates = []
+    day = start_date
+    while day <= end_date:
+        dates.append(day)
+        day += timedelta(days=1)
+
+    keys = {
+        (doctor_id, date): _bitmap_key(doctor_id, layout.version, date)
+        for doctor_id, layout in layouts.items()
+        for date in dates
+    }
+    stored = get_store().get_many(list(keys.values()))
+    if not stored:
+        return []
+
+    expected = {}
+    rows = Appointment.objects.filter(
+        doctor_id__in=list(layouts),
+        appointment_date__range=(start_date, end_date),
+        status__in=ACTIVE_STATUSES
+    ).values_list('doctor_id', 'appointment_date', 'time_slot_id')
+    for doctor_id, date, time_slot_id in rows:
+        expected.setdefault((doctor_id, date), set()).add(time_slot_id)
+
+    mismatches = []
+    repaired = {}
+    for pair, key in keys.items():
+        if key not in stored:
+            continue
+        layout = layouts[pair[0]]
+        bitmap = stored[key]
+        stored_ids = {
+            layout.slot_ids[position]
+            for position in range(len(layout))
+            if _is_set(bitmap, position)
+        }
+        expected_ids = expected.get(pair, set()) & set(layout.slot_ids)
+        if stored_ids != expected_ids:
+            mismatches.append((pair[0], pair[1], sorted(stored_ids), sorted(expected_ids)))
+            repaired[key] = _encode(layout, expected_ids)
+
+    if repair and repaired:
+        get_store().set_many(repaired, BITMAP_TTL)
+    return mismatches
@@ -0,0 +1,116 @@
+"""
+Race-free booking of time slots.
+
+On Postgres a booking takes a transaction-scoped advisory lock on its
+(doctor, date, slot) with pg_try_advisory_xact_lock, so concurrent requests
+for the same slot on the same day fail fast instead of queueing or piling
+into IntegrityErrors, while other dates of the slot stay bookable. Elsewhere
+the unique_active_appointment_slot constraint turns the losing insert into a
+SlotConflict. Checkout flows can reserve a slot for a few seconds with
+hold_slot(); the hold lives in the cache (SET NX with a TTL), so no database
+lock is held while the patient fills in the form, and held slots are left
+out of the free slots (without_held).
+"""
+import hashlib
+import uuid
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+
+from . import availability
+
+DEFAULT_HOLD_SECONDS = 120
+MAX_HOLD_SECONDS = 900
+
+
+class SlotConflict(ValidationError):
+    """The requested slot is booked, held or being booked by someone else."""
+
+
+def _hold_key(doctor_id, date, time_slot_id):
+    return f'slot_hold:{doctor_id}:{date.isoformat()}:{time_slot_id}'
+
+
+def _lock_id(doctor_id, date, time_slot_id):
+    digest = hashlib.blake2b(f'{doctor_id}:{date.isoformat()}:{time_slot_id}'.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'big', signed=True)
+
+
+def _try_lock_slot(doctor_id, date, time_slot_id):
+    """Lock the slot on that date until the transaction ends; False when taken."""
+    if connection.vendor != 'postgresql':
+        return True
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_try_advisory_xact_lock(%s)', [_lock_id(doctor_id, date, time_slot_id)])
+        return cursor.fetchone()[0]
+
+
+def without_held(doctor_id, date, slots):
+    """Drop the slots (payloads with an 'id') currently held for checkout."""
+    keys = {slot['id']: _hold_key(doctor_id, date, slot['id']) for slot in slots}
+    held = cache.get_many(list(keys.values()))
+    return [slot for slot in slots if keys[slot['id']] not in held]
+
+
+def hold_slot(doctor_id, date, time_slot_id, seconds=DEFAULT_HOLD_SECONDS):
+    """Reserve a free slot for `seconds` and return the hold token."""
+    seconds = max(1, min(int(seconds), MAX_HOLD_SECONDS))
+    if time_slot_id not in availability.get_available_slot_ids(doctor_id, date):
+        raise SlotConflict("This time slot is not available.")
+
+    token = uuid.uuid4().hex
+    if not cache.add(_hold_key(doctor_id, date, time_slot_id), token, timeout=seconds):
+        raise SlotConflict("This time slot is currently held by another booking.")
+    return {
+        'hold_token': token,
+        'expires_at': timezone.now() + timedelta(seconds=seconds),
+    }
+
+
+def release_hold(doctor_id, date, time_slot_id, token):
+    """Drop a hold early; only the holder's token can release it."""
+    key = _hold_key(doctor_id, date, time_slot_id)
+    if token and cache.get(key) == token:
+        cache.delete(key)
+        return True
+    return False
+
+
+def book_slot(create, doctor_id, date, time_slot_id, hold_token=None):
+    """
+    Run create() while holding the slot's lock for that date and return its result.
+
+    Raises SlotConflict when the slot is held with a different token, locked
+    by a concurrent booking or already taken on that date.
+    """
+    from .models import Appointment
+
+    key = _hold_key(doctor_id, date, time_slot_id)
+    holder = cache.get(key)
+    if holder is not None and holder != hold_token:
+        raise SlotConflict("This time slot is currently held by another booking.")
+
+    with transaction.atomic():
+        if not _try_lock_slot(doctor_id, date, time_slot_id):
+            raise SlotConflict("This time slot is being booked by someone else.")
+
+        if Appointment.objects.filter(
+            doctor_id=doctor_id,
+            appointment_date=date,
+            time_slot_id=time_slot_id,
+            status__in=availability.ACTIVE_STATUSES
+        ).exists():
+            raise SlotConflict("This time slot is no longer available.")
+
+        try:
+            with transaction.atomic():
+                result = create()
+        except IntegrityError:
+            raise SlotConflict("This time slot is no longer available.")
+
+    if holder is not None:
+        cache.delete(key)
+    return result
@@ -0,0 +1,32 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.appointments import statistics
+from hospital import appointment_stats
+
+ROLLUPS = {
+    'clinic': statistics.rebuild,
+    'hospital': appointment_stats.rebuild,
+}
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the daily appointment statistics rollups from the appointments tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help='First date to rebuild (YYYY-MM-DD), defaults to all history')
+        parser.add_argument('--end', help='Last date to rebuild (YYYY-MM-DD), defaults to all history')
+        parser.add_argument('--rollup', action='append', dest='rollups', choices=sorted(ROLLUPS),
+                            help='Rollup to rebuild (repeatable, defaults to all)')
+
+    def handle(self, *args, **options):
+        try:
+            start = datetime.strptime(options['start'], '%Y-%m-%d').date() if options['start'] else None
+            end = datetime.strptime(options['end'], '%Y-%m-%d').date() if options['end'] else None
+        except ValueError:
+            raise CommandError('Invalid date format. Use YYYY-MM-DD')
+
+        for name in options['rollups'] or ROLLUPS:
+            created = ROLLUPS[name](start, end)
+            self.stdout.write(self.style.SUCCESS(f'{name}: wrote {created} daily statistics rows'))
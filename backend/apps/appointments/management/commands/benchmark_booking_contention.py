@@ -0,0 +1,109 @@
+import random
+import statistics
+import threading
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+
+from apps.appointments import booking
+from apps.appointments.models import Appointment, TimeSlot
+from apps.patients.models import Patient
+
+
+class Command(BaseCommand):
+    help = 'Hammer the booking path for one doctor from many threads and report contention'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--doctor', type=int, required=True, help='Doctor id to book against')
+        parser.add_argument('--date', required=True, help='Appointment date (YYYY-MM-DD)')
+        parser.add_argument('--threads', type=int, default=32)
+        parser.add_argument('--attempts', type=int, default=20, help='Booking attempts per thread')
+        parser.add_argument('--hold', action='store_true', help='Take a slot hold before booking')
+        parser.add_argument('--keep', action='store_true', help='Keep the created appointments')
+
+    def handle(self, *args, **options):
+        try:
+            date = datetime.strptime(options['date'], '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError('Invalid date format. Use YYYY-MM-DD')
+
+        doctor_id = options['doctor']
+        slot_ids = list(TimeSlot.objects.filter(doctor_id=doctor_id).values_list('id', flat=True))
+        patient_ids = list(Patient.objects.values_list('id', flat=True)[:500])
+        if not slot_ids or not patient_ids:
+            raise CommandError('The doctor needs time slots and at least one patient must exist')
+
+        results = {'booked': 0, 'conflict': 0, 'error': 0}
+        latencies = []
+        created = []
+        lock = threading.Lock()
+
+        def worker(seed):
+            rng = random.Random(seed)
+            try:
+                for _ in range(options['attempts']):
+                    slot_id = rng.choice(slot_ids)
+                    started = time.perf_counter()
+                    outcome = 'booked'
+                    try:
+                        token = None
+                        if options['hold']:
+                            token = booking.hold_slot(doctor_id, date, slot_id, seconds=5)['hold_token']
+                        appointment = booking.book_slot(
+                            lambda: Appointment.objects.create(
+                                patient_id=rng.choice(patient_ids),
+                                doctor_id=doctor_id,
+                                appointment_date=date,
+                                time_slot_id=slot_id,
+                                reason='Contention benchmark'
+                            ),
+                            doctor_id, date, slot_id, hold_token=token
+                        )
+                    except booking.SlotConflict:
+                        outcome = 'conflict'
+                    except Exception:
+                        outcome = 'error'
+                    elapsed = time.perf_counter() - started
+                    with lock:
+                        results[outcome] += 1
+                        latencies.append(elapsed)
+                        if outcome == 'booked':
+                            created.append(appointment.pk)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(seed,)) for seed in range(options['threads'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - started
+
+        double_booked = Appointment.objects.filter(
+            doctor_id=doctor_id,
+            appointment_date=date,
+            status__in=['scheduled', 'confirmed']
+        ).values('time_slot_id').annotate(n=Count('id')).filter(n__gt=1).count()
+
+        latencies.sort()
+        attempts = len(latencies)
+        self.stdout.write(f'Attempts: {attempts} in {wall:.2f}s ({attempts / wall:.1f}/s)')
+        self.stdout.write(
+            f"Booked: {results['booked']}  Conflicts: {results['conflict']}  Errors: {results['error']}"
+        )
+        if latencies:
+            p95 = latencies[min(attempts - 1, int(attempts * 0.95))]
+            self.stdout.write(
+                f'Latency p50: {statistics.median(latencies) * 1000:.1f}ms  p95: {p95 * 1000:.1f}ms'
+            )
+
+        if not options['keep'] and created:
+            Appointment.objects.filter(pk__in=created).delete()
+
+        if double_booked:
+            raise CommandError(f'{double_booked} slots were double-booked')
+        self.stdout.write(self.style.SUCCESS('No double bookings'))
@@ -0,0 +1,43 @@
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from apps.appointments import availability
+
+
+class Command(BaseCommand):
+    help = 'Compare slot availability bitmaps with the database and optionally repair them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help='First date to check (YYYY-MM-DD), defaults to today')
+        parser.add_argument('--days', type=int, default=30, help='Number of days to check')
+        parser.add_argument('--doctor', type=int, action='append', dest='doctors',
+                            help='Limit the check to a doctor id (repeatable)')
+        parser.add_argument('--repair', action='store_true', help='Rewrite mismatching bitmaps')
+
+    def handle(self, *args, **options):
+        if options['start']:
+            try:
+                start = datetime.strptime(options['start'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('Invalid start date. Use YYYY-MM-DD')
+        else:
+            start = timezone.now().date()
+        end = start + timedelta(days=max(options['days'], 1) - 1)
+
+        mismatches = availability.check_consistency(
+            start, end, doctor_ids=options['doctors'], repair=options['repair']
+        )
+
+        for doctor_id, date, stored, expected in mismatches:
+            self.stdout.write(
+                f'Doctor {doctor_id} on {date}: bitmap has {stored}, database has {expected}'
+            )
+
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS(f'Slot bitmaps consistent from {start} to {end}'))
+        elif options['repair']:
+            self.stdout.write(self.style.SUCCESS(f'Repaired {len(mismatches)} bitmaps'))
+        else:
+            self.stdout.write(self.style.WARNING(f'Found {len(mismatches)} inconsistent bitmaps'))
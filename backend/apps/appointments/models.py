@@ -4,6 +4,10 @@ from django.core.exceptions import ValidationError
 from django.utils import timezone
 from datetime import datetime, time
 
+from hospital import realtime
+
+from . import availability, statistics
+
 class TimeSlot(models.Model):
     doctor = models.ForeignKey('doctors.Doctor', on_delete=models.CASCADE, related_name='time_slots')
     start_time = models.TimeField()
@@ -12,10 +16,27 @@ class TimeSlot(models.Model):
 
     class Meta:
         ordering = ['start_time']
+        indexes = [
+            # Slot layouts are read per doctor in start time order
+            models.Index(fields=['doctor', 'start_time'], name='timeslot_doctor_start_idx'),
+        ]
 
     def __str__(self):
         return f"{self.doctor} - {self.start_time} to {self.end_time}"
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Toggling is_available does not change the doctor's slot layout
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or set(update_fields) - {'is_available'}:
+            availability.invalidate_layout(self.doctor_id)
+
+    def delete(self, *args, **kwargs):
+        doctor_id = self.doctor_id
+        result = super().delete(*args, **kwargs)
+        availability.invalidate_layout(doctor_id)
+        return result
+
 class Appointment(models.Model):
     STATUS_CHOICES = [
         ('scheduled', 'Scheduled'),
@@ -51,11 +72,58 @@ class Appointment(models.Model):
 
     class Meta:
         ordering = ['-appointment_date', 'time_slot__start_time']
-        unique_together = ['doctor', 'appointment_date', 'time_slot']
+        indexes = [
+            # Keyset pages walk the date in index order; the start times of
+            # one day are sorted on top of it (incremental sort)
+            models.Index(fields=['-appointment_date', 'id'], name='appointment_date_id_idx'),
+            # Doctor lists and statistics; the active (doctor, date) lookups of
+            # availability and booking use unique_active_appointment_slot
+            models.Index(fields=['doctor', 'appointment_date', 'status'], name='appointment_doctor_date_idx'),
+            # Patient timelines, every status
+            models.Index(fields=['patient', '-appointment_date'], name='appointment_patient_date_idx'),
+            # Only active appointments are upcoming, reminded or marked no-show
+            models.Index(
+                fields=['patient', 'appointment_date'],
+                condition=models.Q(status__in=availability.ACTIVE_STATUSES),
+                name='appointment_patient_active_idx',
+            ),
+            models.Index(
+                fields=['appointment_date'],
+                condition=models.Q(status__in=availability.ACTIVE_STATUSES),
+                name='appointment_date_active_idx',
+            ),
+        ]
+        constraints = [
+            # Cancelled and finished appointments must not block a slot forever
+            models.UniqueConstraint(
+                fields=['doctor', 'appointment_date', 'time_slot'],
+                condition=models.Q(status__in=availability.ACTIVE_STATUSES),
+                name='unique_active_appointment_slot',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.patient} with {self.doctor} on {self.appointment_date} at {self.time_slot.start_time}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._snapshot_state()
+        return instance
+
+    def _current_state(self):
+        # Read from __dict__ so deferred fields are not loaded one by one
+        return availability.SlotState(
+            self.__dict__.get('doctor_id'),
+            self.__dict__.get('appointment_date'),
+            self.__dict__.get('time_slot_id'),
+            self.__dict__.get('status'),
+            self.__dict__.get('priority'),
+        )
+
+    def _snapshot_state(self):
+        self._original_state = self._current_state()
+
     def clean(self):
         if self.appointment_date and self.appointment_date < timezone.now().date():
             raise ValidationError("Cannot schedule appointments in the past.")
@@ -67,19 +135,49 @@ class Appointment(models.Model):
             raise ValidationError("Doctor has reached maximum appointments for this date.")
         
         # Check if the time slot belongs to the doctor
-        if self.time_slot and self.time_slot.doctor != self.doctor:
+        if self.time_slot and self.time_slot.doctor_id != self.doctor_id:
             raise ValidationError("Invalid time slot for this doctor.")
         
-        # Check if the time slot is available
-        if self.time_slot and not self.time_slot.is_available:
+        # Check if the time slot is free on this date
+        if self.time_slot_id and self._claims_new_slot() and Appointment.objects.filter(
+            doctor_id=self.doctor_id,
+            appointment_date=self.appointment_date,
+            time_slot_id=self.time_slot_id,
+            status__in=availability.ACTIVE_STATUSES
+        ).exclude(pk=self.pk).exists():
             raise ValidationError("This time slot is not available.")
 
+    def _claims_new_slot(self):
+        """Whether saving would occupy a slot this appointment did not hold before."""
+        current = self._current_state()
+        if current.status not in availability.ACTIVE_STATUSES:
+            return False
+        original = getattr(self, '_original_state', None)
+        return (
+            original is None
+            or original.status not in availability.ACTIVE_STATUSES
+            or original[:3] != current[:3]
+        )
+
     def save(self, *args, **kwargs):
         self.full_clean()
         if not self.pk:  # New appointment
             self.time_slot.is_available = False
-            self.time_slot.save()
+            self.time_slot.save(update_fields=['is_available'])
         super().save(*args, **kwargs)
+        original, current = getattr(self, '_original_state', None), self._current_state()
+        availability.record_transition(original, current)
+        statistics.record_transition(original, current)
+        realtime.record_transition(original, current)
+        self._snapshot_state()
+
+    def delete(self, *args, **kwargs):
+        state = getattr(self, '_original_state', None) or self._current_state()
+        result = super().delete(*args, **kwargs)
+        availability.record_transition(state, None)
+        statistics.record_transition(state, None)
+        realtime.record_transition(state, None)
+        return result
 
     def cancel(self, cancelled_by, reason):
         """Cancel an appointment with proper logging and notification."""
@@ -90,7 +188,7 @@ class Appointment(models.Model):
         self.cancelled_by = cancelled_by
         self.cancellation_reason = reason
         self.time_slot.is_available = True
-        self.time_slot.save()
+        self.time_slot.save(update_fields=['is_available'])
         self.save()
 
     def complete(self, notes=None, prescription=None, follow_up_date=None):
@@ -118,10 +216,25 @@ class Appointment(models.Model):
         
         # Make the old time slot available
         old_time_slot.is_available = True
-        old_time_slot.save()
+        old_time_slot.save(update_fields=['is_available'])
         
         # Mark the new time slot as unavailable
         new_time_slot.is_available = False
-        new_time_slot.save()
+        new_time_slot.save(update_fields=['is_available'])
         
-        self.save() 
\ No newline at end of file
+        self.save()
+
+class AppointmentDailyStat(models.Model):
+    """Appointment counts per day, doctor, status and priority, kept current by Appointment.save."""
+    date = models.DateField()
+    doctor = models.ForeignKey('doctors.Doctor', on_delete=models.CASCADE, related_name='daily_stats')
+    status = models.CharField(max_length=20, choices=Appointment.STATUS_CHOICES)
+    priority = models.CharField(max_length=20, choices=Appointment.PRIORITY_CHOICES)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ['date']
+        unique_together = ['date', 'doctor', 'status', 'priority']
+
+    def __str__(self):
+        return f"{self.date} {self.doctor_id} {self.status}/{self.priority}: {self.count}"
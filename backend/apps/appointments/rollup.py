@@ -0,0 +1,113 @@
+"""
+Daily counters of appointments, shared by the clinic and hospital rollups.
+
+A DailyRollup keeps one counter row per (date, *dimensions) bucket in a stats
+model with a `date`, a `count` and one field per dimension, named like the
+appointment fields they are copied from. `doctor_id` must be one of the
+dimensions: summaries name doctors through doctor__user. The apps keep thin
+wrappers that turn their appointments into buckets
+(apps.appointments.statistics, hospital.appointment_stats).
+"""
+from collections import Counter
+
+from django.apps import apps
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+
+
+class DailyRollup:
+
+    def __init__(self, stats_model, source_model, day, dimensions):
+        # Model labels, resolved on use since the models import their rollup
+        self.stats_model = stats_model
+        self.source_model = source_model
+        # Expression giving a source row's date, e.g. F('appointment_date')
+        self.day = day
+        self.dimensions = list(dimensions)
+
+    @property
+    def counters(self):
+        return apps.get_model(self.stats_model).objects
+
+    def adjust(self, bucket, delta):
+        date, *values = bucket
+        counters = self.counters.filter(date=date, **dict(zip(self.dimensions, values)))
+        if counters.update(count=F('count') + delta) or delta < 0:
+            return
+        try:
+            with transaction.atomic():
+                self.counters.create(date=date, count=delta, **dict(zip(self.dimensions, values)))
+        except IntegrityError:
+            # Another transaction created the bucket first
+            counters.update(count=F('count') + delta)
+
+    def apply_changes(self, changes):
+        """Apply a {bucket: delta} mapping, e.g. a Counter built from a set-based update."""
+        for bucket, delta in changes.items():
+            if delta:
+                self.adjust(bucket, delta)
+
+    def apply_transition(self, old_bucket, new_bucket):
+        """Move one appointment between buckets; None is no bucket."""
+        if old_bucket == new_bucket:
+            return
+        if old_bucket:
+            self.adjust(old_bucket, -1)
+        if new_bucket:
+            self.adjust(new_bucket, 1)
+
+    def summarize(self, start_date, end_date, **filters):
+        """Totals for [start_date, end_date] grouped by doctor, date and each other dimension."""
+        rows = self.counters.filter(date__range=(start_date, end_date), count__gt=0, **filters)
+        others = [dimension for dimension in self.dimensions if dimension != 'doctor_id']
+
+        by_doctor, by_date = Counter(), Counter()
+        by_dimension = {dimension: Counter() for dimension in others}
+        for doctor_id, first_name, last_name, date, count, *values in rows.values_list(
+            'doctor_id', 'doctor__user__first_name', 'doctor__user__last_name', 'date', 'count', *others
+        ):
+            by_doctor[f'{first_name} {last_name}'.strip() or str(doctor_id)] += count
+            by_date[date.isoformat()] += count
+            for dimension, value in zip(others, values):
+                by_dimension[dimension][value] += count
+
+        return {
+            'start_date': start_date.isoformat(),
+            'end_date': end_date.isoformat(),
+            'total_appointments': sum(by_date.values()),
+            'appointments_by_doctor': dict(by_doctor),
+            'appointments_by_date': dict(sorted(by_date.items())),
+            **{f'appointments_by_{dimension}': dict(counts) for dimension, counts in by_dimension.items()},
+        }
+
+    def rebuild(self, start_date=None, end_date=None, batch_size=5000):
+        """Recompute the counters from the appointments, optionally limited to a date range."""
+        model = apps.get_model(self.stats_model)
+        appointments = apps.get_model(self.source_model).objects.annotate(rollup_day=self.day)
+        counters = model.objects.all()
+        if start_date:
+            appointments = appointments.filter(rollup_day__gte=start_date)
+            counters = counters.filter(date__gte=start_date)
+        if end_date:
+            appointments = appointments.filter(rollup_day__lte=end_date)
+            counters = counters.filter(date__lte=end_date)
+
+        grouped = appointments.order_by().values('rollup_day', *self.dimensions).annotate(total=Count('id'))
+
+        created = 0
+        with transaction.atomic():
+            counters.delete()
+            batch = []
+            for row in grouped.iterator(chunk_size=batch_size):
+                batch.append(model(
+                    date=row['rollup_day'], count=row['total'],
+                    **{dimension: row[dimension] for dimension in self.dimensions}
+                ))
+                if len(batch) >= batch_size:
+                    model.objects.bulk_create(batch)
+                    created += len(batch)
+                    batch = []
+            if batch:
+                model.objects.bulk_create(batch)
+                created += len(batch)
+        return created
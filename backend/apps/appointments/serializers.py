@@ -1,5 +1,7 @@
 from rest_framework import serializers
+from . import availability
 from .models import Appointment, TimeSlot
+from apps.doctors.models import Doctor
 from apps.doctors.serializers import DoctorSerializer
 from apps.patients.serializers import PatientSerializer
 
@@ -36,11 +38,17 @@ class AppointmentSerializer(serializers.ModelSerializer):
                     'time_slot': 'This time slot does not belong to the selected doctor.'
                 })
 
-        # Check if the time slot is available
-        if data.get('time_slot') and not data['time_slot'].is_available:
-            raise serializers.ValidationError({
-                'time_slot': 'This time slot is not available.'
-            })
+        # Check if the time slot is free on the requested date
+        if data.get('time_slot') and data.get('appointment_date') and data.get('doctor') and not (
+            self.instance is not None
+            and self.instance.time_slot_id == data['time_slot'].id
+            and self.instance.appointment_date == data['appointment_date']
+        ):
+            free_ids = availability.get_available_slot_ids(data['doctor'].id, data['appointment_date'])
+            if data['time_slot'].id not in free_ids:
+                raise serializers.ValidationError({
+                    'time_slot': 'This time slot is not available.'
+                })
 
         return data
 
@@ -70,4 +78,22 @@ class AppointmentActionSerializer(serializers.Serializer):
                 raise serializers.ValidationError({
                     'new_time_slot': 'New time slot is required for rescheduling.'
                 })
-        return data 
\ No newline at end of file
+        return data
+
+class SlotHoldSerializer(serializers.Serializer):
+    doctor = serializers.PrimaryKeyRelatedField(queryset=Doctor.objects.all())
+    date = serializers.DateField()
+    time_slot = serializers.PrimaryKeyRelatedField(queryset=TimeSlot.objects.all())
+    seconds = serializers.IntegerField(required=False, min_value=1)
+    hold_token = serializers.CharField(required=False)
+
+    def validate(self, data):
+        if data['time_slot'].doctor_id != data['doctor'].id:
+            raise serializers.ValidationError({
+                'time_slot': 'This time slot does not belong to the selected doctor.'
+            })
+        if self.context.get('action') == 'release' and not data.get('hold_token'):
+            raise serializers.ValidationError({
+                'hold_token': 'Hold token is required to release a hold.'
+            })
+        return data
@@ -0,0 +1,52 @@
+"""
+Incrementally maintained appointment statistics.
+
+AppointmentDailyStat holds one counter per (date, doctor, status, priority).
+Appointment.save and delete move an appointment between buckets, and
+set-based updates report their changes through apply_bulk_status_change(), so
+reports read O(days) rollup rows instead of scanning appointments. The
+counters are kept by apps.appointments.rollup.
+"""
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import F
+
+from .rollup import DailyRollup
+
+ROLLUP = DailyRollup(
+    'appointments.AppointmentDailyStat', 'appointments.Appointment',
+    F('appointment_date'), ['doctor_id', 'status', 'priority'],
+)
+
+
+def _bucket(state):
+    if state is None or None in (state.date, state.doctor_id, state.status, state.priority):
+        return None
+    return (state.date, state.doctor_id, state.status, state.priority)
+
+
+def record_transition(old_state, new_state):
+    """Move an appointment between buckets once its transaction commits."""
+    old_bucket, new_bucket = _bucket(old_state), _bucket(new_state)
+    transaction.on_commit(lambda: ROLLUP.apply_transition(old_bucket, new_bucket))
+
+
+def apply_bulk_status_change(rows, new_status):
+    """Account for a set-based status update of (doctor_id, date, old_status, priority) rows."""
+    changes = Counter()
+    for doctor_id, date, old_status, priority in rows:
+        changes[(date, doctor_id, old_status, priority)] -= 1
+        changes[(date, doctor_id, new_status, priority)] += 1
+    ROLLUP.apply_changes(changes)
+
+
+def summarize(start_date, end_date, doctor_id=None):
+    """Totals for [start_date, end_date] grouped by doctor, date, status and priority."""
+    filters = {'doctor_id': doctor_id} if doctor_id is not None else {}
+    return ROLLUP.summarize(start_date, end_date, **filters)
+
+
+def rebuild(start_date=None, end_date=None, batch_size=5000):
+    """Recompute the rollup from appointments, optionally limited to a date range."""
+    return ROLLUP.rebuild(start_date, end_date, batch_size)
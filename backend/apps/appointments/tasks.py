@@ -1,40 +1,50 @@
 from celery import shared_task
 from django.core.mail import send_mail
 from django.conf import settings
-from django.template.loader import render_to_string
+from django.template.loader import get_template, render_to_string
 from django.utils import timezone
+from django.db import connection, transaction
 from datetime import timedelta
+import logging
+import time
 
+from . import availability, statistics
 from .models import Appointment
 
+logger = logging.getLogger(__name__)
+
 @shared_task
 def send_appointment_reminder():
     """Send email reminders for upcoming appointments."""
+    from hospital.reminders import send_reminders
+
     tomorrow = timezone.now().date() + timedelta(days=1)
     appointments = Appointment.objects.filter(
         appointment_date=tomorrow,
         status__in=['scheduled', 'confirmed']
-    ).select_related('patient__user', 'doctor__user')
+    ).select_related('patient__user', 'doctor__user', 'time_slot')
 
-    for appointment in appointments:
-        # Prepare email context
+    text_template = get_template('appointments/email/reminder.txt')
+    html_template = get_template('appointments/email/reminder.html')
+
+    def build_message(appointment):
+        patient_email = appointment.patient.user.email
+        if not patient_email:
+            return None
         context = {
             'patient_name': appointment.patient.user.get_full_name(),
             'doctor_name': appointment.doctor.user.get_full_name(),
             'appointment_date': appointment.appointment_date,
             'appointment_time': appointment.time_slot.start_time,
         }
+        return (
+            patient_email,
+            'Appointment Reminder',
+            text_template.render(context),
+            html_template.render(context),
+        )
 
-        # Send email to patient
-        patient_email = appointment.patient.user.email
-        if patient_email:
-            send_mail(
-                subject='Appointment Reminder',
-                message=render_to_string('appointments/email/reminder.txt', context),
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                recipient_list=[patient_email],
-                html_message=render_to_string('appointments/email/reminder.html', context)
-            )
+    return send_reminders(appointments, build_message, tomorrow)
 
 @shared_task
 def send_appointment_confirmation(appointment_id):
@@ -119,34 +129,97 @@ def send_cancellation_notification(appointment_id, cancelled_by_name, reason):
     except Appointment.DoesNotExist:
         pass
 
+NO_SHOW_BATCH_SIZE = 5000
+
+def _mark_no_show_batch(before, batch_size):
+    """
+    Flip one batch of past active appointments to no_show and return
+    (id, doctor_id, date, previous status, priority) rows.
+    """
+    now = timezone.now()
+    if connection.vendor == 'postgresql':
+        table = connection.ops.quote_name(Appointment._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                WITH batch AS (
+                    SELECT id, status FROM {table}
+                    WHERE appointment_date < %s AND status IN ('scheduled', 'confirmed')
+                    ORDER BY id LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                )
+                UPDATE {table} AS appointment SET status = 'no_show', updated_at = %s
+                FROM batch WHERE appointment.id = batch.id
+                RETURNING appointment.id, appointment.doctor_id, appointment.appointment_date,
+                          batch.status, appointment.priority
+                """,
+                [before, batch_size, now]
+            )
+            return cursor.fetchall()
+
+    # Backends without UPDATE ... RETURNING select the batch first
+    with transaction.atomic():
+        rows = list(Appointment.objects.select_for_update().filter(
+            appointment_date__lt=before,
+            status__in=['scheduled', 'confirmed']
+        ).order_by('id').values_list('id', 'doctor_id', 'appointment_date', 'status', 'priority')[:batch_size])
+        Appointment.objects.filter(id__in=[row[0] for row in rows]).update(status='no_show', updated_at=now)
+    return rows
+
 @shared_task
 def cleanup_expired_appointments():
     """Mark appointments as 'no_show' if they're past due and weren't completed."""
     today = timezone.now().date()
-    past_appointments = Appointment.objects.filter(
-        appointment_date__lt=today,
-        status__in=['scheduled', 'confirmed']
-    )
+    started = time.monotonic()
+    processed = batches = 0
+
+    while True:
+        rows = _mark_no_show_batch(today, NO_SHOW_BATCH_SIZE)
+        if not rows:
+            break
+        batches += 1
+        processed += len(rows)
+        availability.invalidate_dates({(row[1], row[2]) for row in rows})
+        statistics.apply_bulk_status_change([row[1:] for row in rows], 'no_show')
+        # Notify relevant parties from the mail stage, outside the update loop
+        send_no_show_notifications.delay([row[0] for row in rows])
+
+    elapsed = time.monotonic() - started
+    metrics = {
+        'processed': processed,
+        'batches': batches,
+        'seconds': round(elapsed, 3),
+        'rows_per_second': round(processed / elapsed, 1) if elapsed else 0.0,
+    }
+    logger.info('No-show sweep: %(processed)d rows in %(seconds).3fs (%(rows_per_second).1f rows/s)', metrics)
+    return metrics
 
-    for appointment in past_appointments:
-        appointment.status = 'no_show'
-        appointment.save()
+@shared_task
+def send_no_show_notifications(appointment_ids):
+    """Send missed-appointment emails for a batch of appointments."""
+    from hospital.reminders import send_reminders
 
-        # Notify relevant parties
+    appointments = Appointment.objects.filter(id__in=appointment_ids).select_related(
+        'patient__user', 'doctor__user', 'time_slot'
+    )
+    text_template = get_template('appointments/email/no_show.txt')
+    html_template = get_template('appointments/email/no_show.html')
+
+    def build_message(appointment):
+        patient_email = appointment.patient.user.email
+        if not patient_email:
+            return None
         context = {
             'patient_name': appointment.patient.user.get_full_name(),
             'doctor_name': appointment.doctor.user.get_full_name(),
             'appointment_date': appointment.appointment_date,
             'appointment_time': appointment.time_slot.start_time,
         }
-
-        # Send email to patient
-        patient_email = appointment.patient.user.email
-        if patient_email:
-            send_mail(
-                subject='Missed Appointment Notification',
-                message=render_to_string('appointments/email/no_show.txt', context),
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                recipient_list=[patient_email],
-                html_message=render_to_string('appointments/email/no_show.html', context)
-            ) 
\ No newline at end of file
+        return (
+            patient_email,
+            'Missed Appointment Notification',
+            text_template.render(context),
+            html_template.render(context),
+        )
+
+    return send_reminders(appointments, build_message, timezone.now().date(), kind='no_show')
@@ -1,21 +1,29 @@
-from rest_framework import viewsets, status, filters
+from rest_framework import viewsets, status, filters, serializers
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django_filters.rest_framework import DjangoFilterBackend
+from django.core.exceptions import ValidationError as DjangoValidationError
 from django.utils import timezone
 from django.db.models import Q
 from datetime import datetime, timedelta
 
+from apps.doctors.models import Doctor
+from hospital import metrics
+from hospital.prefetch import PrefetchPlanMixin
+from hospital.search import FullTextSearchFilter
+
+from . import availability, booking, statistics as appointment_statistics
 from .models import Appointment, TimeSlot
 from .serializers import (
     AppointmentSerializer,
     TimeSlotSerializer,
-    AppointmentActionSerializer
+    AppointmentActionSerializer,
+    SlotHoldSerializer
 )
 from .permissions import IsAppointmentParticipant
 
-class TimeSlotViewSet(viewsets.ModelViewSet):
+class TimeSlotViewSet(PrefetchPlanMixin, viewsets.ModelViewSet):
     queryset = TimeSlot.objects.all()
     serializer_class = TimeSlotSerializer
     permission_classes = [IsAuthenticated]
@@ -32,13 +40,18 @@ class TimeSlotViewSet(viewsets.ModelViewSet):
         if date:
             try:
                 date_obj = datetime.strptime(date, '%Y-%m-%d').date()
-                # Get appointments for the specified date
-                appointments = Appointment.objects.filter(
-                    appointment_date=date_obj,
-                    status__in=['scheduled', 'confirmed']
-                )
-                # Exclude time slots that are already booked
-                queryset = queryset.exclude(appointments__in=appointments)
+                if doctor_id:
+                    # Resolve free slots from the availability bitmap
+                    free_ids = availability.get_available_slot_ids(int(doctor_id), date_obj)
+                    queryset = queryset.filter(id__in=free_ids)
+                else:
+                    # Get appointments for the specified date
+                    appointments = Appointment.objects.filter(
+                        appointment_date=date_obj,
+                        status__in=['scheduled', 'confirmed']
+                    )
+                    # Exclude time slots that are already booked
+                    queryset = queryset.exclude(appointments__in=appointments)
             except ValueError:
                 pass
 
@@ -47,17 +60,16 @@ class TimeSlotViewSet(viewsets.ModelViewSet):
 
         return queryset
 
-class AppointmentViewSet(viewsets.ModelViewSet):
+class AppointmentViewSet(PrefetchPlanMixin, viewsets.ModelViewSet):
     serializer_class = AppointmentSerializer
     permission_classes = [IsAuthenticated, IsAppointmentParticipant]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, FullTextSearchFilter, filters.OrderingFilter]
     filterset_fields = ['status', 'priority', 'doctor', 'patient', 'appointment_date']
-    search_fields = [
-        'doctor__user__first_name', 'doctor__user__last_name',
-        'patient__user__first_name', 'patient__user__last_name',
-        'reason', 'symptoms'
-    ]
+    search_kind = 'clinic_appointment'
     ordering_fields = ['appointment_date', 'created_at', 'status']
+    cursor_ordering = ['-appointment_date', 'time_slot__start_time', 'id']
+    MAX_SEARCH_DAYS = 31
+    MAX_SEARCH_RESULTS = 100
 
     def get_queryset(self):
         user = self.request.user
@@ -70,19 +82,51 @@ class AppointmentViewSet(viewsets.ModelViewSet):
         return Appointment.objects.none()
 
     def perform_create(self, serializer):
-        # Check if the time slot is still available
-        time_slot = serializer.validated_data['time_slot']
-        if not time_slot.is_available:
-            raise serializers.ValidationError({
-                'time_slot': 'This time slot is no longer available.'
-            })
-        
-        # Create the appointment
-        appointment = serializer.save()
-        
-        # Mark the time slot as unavailable
-        time_slot.is_available = False
-        time_slot.save()
+        data = serializer.validated_data
+        try:
+            # The slot row stays locked until the appointment is written
+            booking.book_slot(
+                serializer.save,
+                data['doctor'].id,
+                data['appointment_date'],
+                data['time_slot'].id,
+                hold_token=self.request.data.get('hold_token')
+            )
+        except booking.SlotConflict as exc:
+            metrics.record_booking('clinic', 'conflict')
+            raise serializers.ValidationError({'time_slot': exc.messages})
+        except DjangoValidationError as exc:
+            raise serializers.ValidationError(exc.messages)
+        metrics.record_booking('clinic', 'success')
+
+    @action(detail=False, methods=['post'])
+    def hold(self, request):
+        """Reserve a slot for a short checkout window without locking rows."""
+        serializer = SlotHoldSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        try:
+            hold = booking.hold_slot(
+                data['doctor'].id,
+                data['date'],
+                data['time_slot'].id,
+                data.get('seconds', booking.DEFAULT_HOLD_SECONDS)
+            )
+        except booking.SlotConflict as exc:
+            metrics.record_booking('clinic_hold', 'conflict')
+            return Response({'time_slot': exc.messages}, status=status.HTTP_409_CONFLICT)
+        metrics.record_booking('clinic_hold', 'success')
+        return Response(hold, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['post'])
+    def release_hold(self, request):
+        serializer = SlotHoldSerializer(data=request.data, context={'action': 'release'})
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        released = booking.release_hold(
+            data['doctor'].id, data['date'], data['time_slot'].id, data['hold_token']
+        )
+        return Response({'released': released})
 
     @action(detail=True, methods=['post'])
     def cancel(self, request, pk=None):
@@ -154,7 +198,7 @@ class AppointmentViewSet(viewsets.ModelViewSet):
                 status__in=['scheduled', 'confirmed']
             )
 
-        serializer = self.get_serializer(appointments, many=True)
+        serializer = self.get_serializer(self.apply_prefetch_plan(appointments), many=True)
         return Response(serializer.data)
 
     @action(detail=False, methods=['get'])
@@ -177,20 +221,92 @@ class AppointmentViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Get all time slots for the doctor
-        time_slots = TimeSlot.objects.filter(
-            doctor_id=doctor_id,
-            is_available=True
-        )
+        try:
+            doctor_id = int(doctor_id)
+        except ValueError:
+            return Response(
+                {'error': 'Invalid doctor id'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
-        # Exclude time slots that are already booked
-        booked_slots = Appointment.objects.filter(
-            doctor_id=doctor_id,
-            appointment_date=date,
-            status__in=['scheduled', 'confirmed']
-        ).values_list('time_slot_id', flat=True)
+        # Slots booked on this date are cleared from the doctor's bitmap;
+        # slots held for checkout are not free either
+        slots = availability.get_available_slots(doctor_id, date)
+        return Response(booking.without_held(doctor_id, date, slots))
 
-        available_slots = time_slots.exclude(id__in=booked_slots)
-        serializer = TimeSlotSerializer(available_slots, many=True)
-        
-        return Response(serializer.data) 
\ No newline at end of file
+    @action(detail=False, methods=['get'], url_path='available-slots/search')
+    def search_slots(self, request):
+        """Earliest free slots across several doctors and dates."""
+        params = request.query_params
+        # Local date: find_free_slots also drops today's slots that have passed
+        today = timezone.localdate()
+
+        try:
+            start = datetime.strptime(params['start'], '%Y-%m-%d').date() if params.get('start') else today
+            end = datetime.strptime(params['end'], '%Y-%m-%d').date() if params.get('end') else start + timedelta(days=6)
+        except ValueError:
+            return Response(
+                {'error': 'Invalid date format. Use YYYY-MM-DD'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        start = max(start, today)
+        if end < start or (end - start).days >= self.MAX_SEARCH_DAYS:
+            return Response(
+                {'error': f'Date range must be between 1 and {self.MAX_SEARCH_DAYS} days'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            limit = min(int(params.get('limit', 10)), self.MAX_SEARCH_RESULTS)
+            doctor_ids = [int(pk) for pk in params['doctors'].split(',')] if params.get('doctors') else None
+        except ValueError:
+            return Response(
+                {'error': 'limit and doctors must be integers'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        doctors = Doctor.objects.filter(is_available=True)
+        if doctor_ids:
+            doctors = doctors.filter(id__in=doctor_ids)
+        specialization = params.get('specialization')
+        if specialization:
+            if specialization.isdigit():
+                doctors = doctors.filter(specializations__id=specialization)
+            else:
+                doctors = doctors.filter(specializations__name__iexact=specialization)
+        if not doctor_ids and not specialization:
+            return Response(
+                {'error': 'Either doctors or specialization is required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        doctor_days = {
+            doctor_id: {day.strip() for day in available_days.split(',')}
+            for doctor_id, available_days in doctors.values_list('id', 'available_days').distinct()
+        }
+        return Response(availability.find_free_slots(doctor_days, start, end, max(limit, 1)))
+
+    @action(detail=False, methods=['get'])
+    def statistics(self, request):
+        """Appointment counts for an arbitrary date range, read from the daily rollup."""
+        if request.user.user_type not in ['admin', 'staff']:
+            return Response(status=status.HTTP_403_FORBIDDEN)
+
+        today = timezone.now().date()
+        params = request.query_params
+        try:
+            end = datetime.strptime(params['end'], '%Y-%m-%d').date() if params.get('end') else today
+            start = datetime.strptime(params['start'], '%Y-%m-%d').date() if params.get('start') else end - timedelta(days=29)
+            doctor_id = int(params['doctor']) if params.get('doctor') else None
+        except ValueError:
+            return Response(
+                {'error': 'Use YYYY-MM-DD dates and an integer doctor id'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if end < start:
+            return Response(
+                {'error': 'end must not be before start'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        return Response(appointment_statistics.summarize(start, end, doctor_id=doctor_id))
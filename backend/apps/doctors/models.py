@@ -18,6 +18,7 @@ class Doctor(models.Model):
     available_days = models.CharField(max_length=100)  # Stored as comma-separated days
     available_time_start = models.TimeField()
     available_time_end = models.TimeField()
+    slot_duration_minutes = models.PositiveSmallIntegerField(default=30)
     max_appointments_per_day = models.PositiveIntegerField(default=20)
     is_available = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -0,0 +1,23 @@
+from rest_framework import serializers
+from .models import Doctor, Specialization
+
+class SpecializationSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Specialization
+        fields = ['id', 'name', 'description']
+
+class DoctorSerializer(serializers.ModelSerializer):
+    full_name = serializers.CharField(source='user.get_full_name', read_only=True)
+    email = serializers.EmailField(source='user.email', read_only=True)
+    specializations = SpecializationSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Doctor
+        fields = [
+            'id', 'user', 'full_name', 'email', 'specializations',
+            'license_number', 'qualification', 'experience_years',
+            'consultation_fee', 'available_days', 'available_time_start',
+            'available_time_end', 'slot_duration_minutes', 'max_appointments_per_day',
+            'is_available'
+        ]
+        select_related = ['user']
@@ -32,6 +32,10 @@ class MedicalRecord(models.Model):
 
     class Meta:
         ordering = ['-record_date']
+        indexes = [
+            models.Index(fields=['-record_date', 'id'], name='medical_record_record_date_idx'),
+            models.Index(fields=['patient', '-record_date'], name='medical_record_patient_idx'),
+        ]
         permissions = [
             ('view_confidential_records', 'Can view confidential medical records'),
         ]
@@ -0,0 +1,39 @@
+from rest_framework import serializers
+from .models import MedicalRecord, Prescription, LabResult, Vaccination
+
+class PrescriptionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Prescription
+        fields = ['id', 'medicine_name', 'dosage', 'frequency', 'duration', 'instructions', 'is_active']
+
+class LabResultSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = LabResult
+        fields = [
+            'id', 'test_name', 'test_date', 'result_value', 'normal_range', 'unit',
+            'is_abnormal', 'notes'
+        ]
+
+class VaccinationSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Vaccination
+        fields = [
+            'id', 'vaccine_name', 'dose_number', 'date_administered', 'administered_by',
+            'batch_number', 'next_due_date', 'notes'
+        ]
+
+class MedicalRecordSerializer(serializers.ModelSerializer):
+    patient_name = serializers.CharField(source='patient.user.get_full_name', read_only=True)
+    doctor_name = serializers.CharField(source='doctor.user.get_full_name', read_only=True)
+    prescriptions = PrescriptionSerializer(many=True, read_only=True)
+    lab_results = LabResultSerializer(many=True, read_only=True)
+    vaccinations = VaccinationSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = MedicalRecord
+        fields = [
+            'id', 'patient', 'patient_name', 'doctor', 'doctor_name', 'appointment',
+            'record_type', 'record_date', 'diagnosis', 'treatment', 'prescription', 'notes',
+            'is_confidential', 'prescriptions', 'lab_results', 'vaccinations'
+        ]
+        select_related = ['patient__user', 'doctor__user']
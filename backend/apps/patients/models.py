@@ -48,10 +48,55 @@ class Patient(models.Model):
             )
         return None
 
-    def get_medical_summary(self):
+    def get_medical_summary(self, cached=False, include_confidential=False):
+        """
+        Profile fields plus aggregates of the patient's appointments and records.
+        Confidential records, and their labs and prescriptions, only count with
+        include_confidential. cached=True serves it from the 'patient_summary'
+        cache, one entry per include_confidential, which saving the patient, an
+        appointment or a record purges (hospital.signals).
+        """
+        if cached:
+            from hospital import caching
+            key = f'patient_summary:{self.pk}:confidential' if include_confidential else f'patient_summary:{self.pk}'
+            return caching.get_or_compute(
+                key, lambda: self.get_medical_summary(include_confidential=include_confidential),
+                ttl=60 * 60, soft_ttl=60 * 15, family='patient_summary', tags=[f'patient_summary:{self.pk}']
+            )
+
+        from django.db.models import Count, Max, Q
+        from django.utils import timezone
+        from apps.appointments import availability
+        from apps.medical_records.models import LabResult, Prescription
+
+        today = timezone.localdate()
+        appointments = self.appointments.aggregate(
+            total=Count('id'),
+            completed=Count('id', filter=Q(status='completed')),
+            cancelled=Count('id', filter=Q(status='cancelled')),
+            last_visit=Max('appointment_date', filter=Q(status='completed')),
+        )
+        next_appointment = self.appointments.filter(
+            appointment_date__gte=today, status__in=availability.ACTIVE_STATUSES
+        ).order_by('appointment_date').values_list('appointment_date', flat=True).first()
+        visible = Q() if include_confidential else Q(medical_record__is_confidential=False)
+        records = self.medical_records.filter(
+            Q() if include_confidential else Q(is_confidential=False)
+        ).aggregate(total=Count('id'), last_record=Max('record_date'))
+        abnormal_labs = LabResult.objects.filter(
+            visible, medical_record__patient=self, is_abnormal=True
+        ).order_by('-test_date').values('test_name', 'result_value', 'unit', 'test_date')[:5]
+        active_prescriptions = Prescription.objects.filter(
+            visible, medical_record__patient=self, is_active=True
+        ).order_by('-medical_record__record_date').values('medicine_name', 'dosage', 'frequency')[:20]
+
         return {
             'blood_group': self.blood_group,
             'allergies': self.allergies.split(',') if self.allergies else [],
             'medical_conditions': self.medical_conditions.split(',') if self.medical_conditions else [],
             'current_medications': self.current_medications.split(',') if self.current_medications else [],
+            'appointments': {**appointments, 'next_appointment': next_appointment},
+            'medical_records': records,
+            'recent_abnormal_labs': list(abnormal_labs),
+            'active_prescriptions': list(active_prescriptions),
         } 
\ No newline at end of file
@@ -0,0 +1,15 @@
+from rest_framework import serializers
+from .models import Patient
+
+class PatientSerializer(serializers.ModelSerializer):
+    full_name = serializers.CharField(source='user.get_full_name', read_only=True)
+    email = serializers.EmailField(source='user.email', read_only=True)
+
+    class Meta:
+        model = Patient
+        fields = [
+            'id', 'user', 'full_name', 'email', 'blood_group', 'gender',
+            'allergies', 'medical_conditions', 'current_medications',
+            'insurance_provider', 'insurance_id'
+        ]
+        select_related = ['user']
@@ -1,8 +1,12 @@
-from rest_framework import viewsets, permissions
+from datetime import datetime
+
+from django.utils import timezone
+from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
 from ..models import Doctor, Patient, Appointment, Service
+from ..prefetch import PrefetchPlanMixin, apply_prefetch_plan
 from ..serializers import (
     DoctorSerializer,
     PatientSerializer,
@@ -10,7 +14,7 @@ from ..serializers import (
     ServiceSerializer
 )
 
-class DoctorViewSet(viewsets.ModelViewSet):
+class DoctorViewSet(PrefetchPlanMixin, viewsets.ModelViewSet):
     """
     API endpoint that allows doctors to be viewed or edited.
     """
@@ -21,19 +25,26 @@ class DoctorViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['get'])
     def appointments(self, request, pk=None):
         doctor = self.get_object()
-        appointments = doctor.appointments.all()
+        appointments = apply_prefetch_plan(doctor.appointments.all(), AppointmentSerializer)
         serializer = AppointmentSerializer(appointments, many=True)
         return Response(serializer.data)
 
     @action(detail=True, methods=['get'])
     def availability(self, request, pk=None):
+        """Free slots on ?date= (default: today) from the doctor's live profile page."""
         doctor = self.get_object()
+        try:
+            date = datetime.strptime(request.query_params['date'], '%Y-%m-%d').date() \
+                if request.query_params.get('date') else timezone.localdate()
+        except ValueError:
+            return Response({'error': 'Invalid date format. Use YYYY-MM-DD'}, status=status.HTTP_400_BAD_REQUEST)
+        page = doctor.profile_pages.live().first()
         return Response({
-            'available_slots': doctor.get_available_slots(),
-            'working_hours': doctor.working_hours
+            'date': date.isoformat(),
+            'available_slots': page.get_available_slots(date) if page else [],
         })
 
-class PatientViewSet(viewsets.ModelViewSet):
+class PatientViewSet(PrefetchPlanMixin, viewsets.ModelViewSet):
     """
     API endpoint that allows patients to be viewed or edited.
     """
@@ -54,17 +65,18 @@ class PatientViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['get'])
     def appointments(self, request, pk=None):
         patient = self.get_object()
-        appointments = patient.appointments.all()
+        appointments = apply_prefetch_plan(patient.appointments.all(), AppointmentSerializer)
         serializer = AppointmentSerializer(appointments, many=True)
         return Response(serializer.data)
 
-class AppointmentViewSet(viewsets.ModelViewSet):
+class AppointmentViewSet(PrefetchPlanMixin, viewsets.ModelViewSet):
     """
     API endpoint that allows appointments to be viewed or edited.
     """
     queryset = Appointment.objects.all()
     serializer_class = AppointmentSerializer
     permission_classes = [permissions.IsAuthenticated]
+    cursor_ordering = ['-date_time', 'id']
 
     def get_queryset(self):
         """
@@ -83,7 +95,7 @@ class AppointmentViewSet(viewsets.ModelViewSet):
         appointment.save()
         return Response({'status': 'appointment cancelled'})
 
-class ServiceViewSet(viewsets.ModelViewSet):
+class ServiceViewSet(PrefetchPlanMixin, viewsets.ModelViewSet):
     """
     API endpoint that allows services to be viewed or edited.
     """
@@ -94,6 +106,6 @@ class ServiceViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['get'])
     def doctors(self, request, pk=None):
         service = self.get_object()
-        doctors = service.doctors.all()
+        doctors = apply_prefetch_plan(service.doctors.all(), DoctorSerializer)
         serializer = DoctorSerializer(doctors, many=True)
         return Response(serializer.data) 
\ No newline at end of file
@@ -0,0 +1,44 @@
+"""
+Daily statistics rollup of hospital appointments.
+
+AppointmentDailyStat holds one counter per (local date, doctor, status), kept
+by the same apps.appointments.rollup counters as the clinic statistics.
+Saving or deleting an Appointment moves it between buckets once the
+transaction commits (hospital.signals), so the statistics page and the
+generate_appointment_statistics task read O(days) rollup rows. Bulk loads
+bypass the signals: `manage.py backfill_appointment_statistics` rebuilds.
+"""
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from apps.appointments.rollup import DailyRollup
+
+from . import invalidation
+
+ROLLUP = DailyRollup(
+    'hospital.AppointmentDailyStat', 'hospital.Appointment', TruncDate('date_time'), ['doctor_id', 'status'],
+)
+
+
+def state(date_time, doctor_id, status):
+    """The bucket of an appointment, or None when it is not complete enough to count."""
+    if None in (date_time, doctor_id, status):
+        return None
+    date = timezone.localdate(date_time) if timezone.is_aware(date_time) else date_time.date()
+    return (date, doctor_id, status)
+
+
+def apply_transition(old_bucket, new_bucket):
+    ROLLUP.apply_transition(old_bucket, new_bucket)
+
+
+def summarize(start_date, end_date):
+    """Totals for [start_date, end_date] grouped by doctor, date and status."""
+    return ROLLUP.summarize(start_date, end_date)
+
+
+def rebuild(start_date=None, end_date=None, batch_size=5000):
+    """Recompute the rollup from appointments, optionally limited to a date range."""
+    created = ROLLUP.rebuild(start_date, end_date, batch_size)
+    invalidation.purge(['appointment_statistics'])
+    return created
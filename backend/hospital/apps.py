@@ -0,0 +1,14 @@
+from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+class HospitalConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'hospital'
+
+    def ready(self):
+        # metrics connects the Celery task signals in web and worker processes
+        from . import metrics, search, signals  # noqa: F401
+
+        # The search tsvector column and its GIN index are not in the migrations
+        post_migrate.connect(search.ensure_search_index, sender=self, dispatch_uid='hospital_search_index')
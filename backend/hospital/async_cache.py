@@ -0,0 +1,158 @@
+"""
+Async counterpart of hospital.caching for ASGI views.
+
+Entries, recompute locks, counters and invalidation tags are built, keyed
+and encoded by the sync module's own helpers (caching.new_entry,
+caching.encode, caching.store_if_unchanged_command, ...), so sync and async
+views share one cache and the two paths cannot drift apart. Redis is reached with
+redis.asyncio on the running event loop instead of a thread hop per call.
+With a non-Redis cache backend the sync module is used through
+sync_to_async.
+"""
+import asyncio
+import logging
+import time
+import uuid
+import weakref
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+from . import caching, invalidation, profiling
+
+logger = logging.getLogger(__name__)
+
+_clients = weakref.WeakKeyDictionary()
+# Keeps background refresh tasks referenced until they finish
+_refreshes = set()
+
+
+def get_client():
+    """Return the redis.asyncio client of the running loop, or None without django_redis."""
+    if not hasattr(cache, 'client') or not hasattr(cache.client, 'get_client'):
+        return None
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        import redis.asyncio as aioredis
+
+        options = settings.CACHES['default'].get('OPTIONS', {})
+        client = aioredis.from_url(settings.CACHES['default']['LOCATION'], password=options.get('PASSWORD'))
+        _clients[loop] = client
+    return client
+
+
+async def count(client, family, field, amount=1):
+    profiling.note_cache(field, amount)
+    # django_redis stores integers unpickled, so INCRBY matches cache.incr
+    await client.incrby(cache.make_key(caching.stat_key(family, field)), amount)
+
+
+async def _get_versions(client, tags):
+    # django_redis stores integers unpickled, so the counters read back as digits
+    values = await client.mget([cache.make_key(invalidation.version_key(tag)) for tag in tags]) if tags else []
+    return tuple(int(value) if value is not None else 0 for value in values)
+
+
+async def _store(client, key, value, ttl, soft_ttl, jitter, tags, versions):
+    """caching.store(versions=...) on the event loop: skipped if a tag was purged since `versions`."""
+    entry = caching.new_entry(value, soft_ttl, jitter)
+    keys, args = caching.store_if_unchanged_command(key, entry, caching.jittered(ttl, jitter), tags, versions)
+    return bool(await client.eval(caching.STORE_IF_UNCHANGED_SCRIPT, len(keys), *keys, *args))
+
+
+async def _recompute(client, key, compute, ttl, soft_ttl, jitter, family, tags):
+    tags = list(tags)
+    versions = await _get_versions(client, tags)
+    started = time.perf_counter()
+    value = await compute()
+    await _store(client, key, value, ttl, soft_ttl, jitter, tags, versions)
+    await count(client, family, 'recomputes')
+    await count(client, family, 'recompute_ms', int((time.perf_counter() - started) * 1000))
+    return value
+
+
+async def _acquire(client, lock_key, timeout):
+    # Encoded like cache.add() values, so either side can read the other's locks
+    token = uuid.uuid4().hex
+    return token if await client.set(lock_key, caching.encode(token), nx=True, ex=timeout) else None
+
+
+async def _release(client, lock_key, token):
+    raw = await client.get(lock_key)
+    if raw is not None and caching.decode(raw) == token:
+        await client.delete(lock_key)
+
+
+async def _refresh(client, key, compute, ttl, soft_ttl, jitter, family, tags, lock_key, token):
+    try:
+        await _recompute(client, key, compute, ttl, soft_ttl, jitter, family, tags)
+    except Exception:
+        logger.exception('Background refresh of %s failed', key)
+    finally:
+        await _release(client, lock_key, token)
+
+
+async def _get_entry(client, key):
+    raw = await client.get(cache.make_key(key))
+    if raw is None:
+        return None
+    entry = caching.decode(raw)
+    return entry if isinstance(entry, caching.Entry) else None
+
+
+async def get_or_compute(key, compute, ttl, soft_ttl=None, family=None, tags=(), jitter=0.1,
+                         lock_timeout=30, wait_timeout=5.0):
+    """
+    Async caching.get_or_compute(); `compute` is a coroutine function.
+
+    Background refreshes run as tasks on the current loop.
+    """
+    client = get_client()
+    if client is None:
+        def compute_sync():
+            return asyncio.run_coroutine_threadsafe(compute(), loop).result()
+
+        loop = asyncio.get_running_loop()
+        return await sync_to_async(caching.get_or_compute, thread_sensitive=False)(
+            key, compute_sync, ttl, soft_ttl=soft_ttl, family=family, tags=tags, jitter=jitter,
+            lock_timeout=lock_timeout, wait_timeout=wait_timeout
+        )
+
+    family = family or key
+    soft_ttl = soft_ttl if soft_ttl is not None else ttl / 2
+    lock_key = cache.make_key(caching.recompute_lock_key(key))
+
+    entry = await _get_entry(client, key)
+    if entry is not None:
+        if entry.fresh_until > time.time():
+            await count(client, family, 'hits')
+            return entry.value
+        await count(client, family, 'stale')
+        token = await _acquire(client, lock_key, lock_timeout)
+        if token:
+            task = asyncio.create_task(
+                _refresh(client, key, compute, ttl, soft_ttl, jitter, family, tags, lock_key, token)
+            )
+            _refreshes.add(task)
+            task.add_done_callback(_refreshes.discard)
+        return entry.value
+
+    await count(client, family, 'misses')
+    token = await _acquire(client, lock_key, lock_timeout)
+    if token is None:
+        deadline = time.monotonic() + wait_timeout
+        delay = 0.02
+        while time.monotonic() < deadline:
+            await asyncio.sleep(delay)
+            entry = await _get_entry(client, key)
+            if entry is not None:
+                return entry.value
+            delay = min(delay * 2, 0.25)
+        return await _recompute(client, key, compute, ttl, soft_ttl, jitter, family, tags)
+
+    try:
+        return await _recompute(client, key, compute, ttl, soft_ttl, jitter, family, tags)
+    finally:
+        await _release(client, lock_key, token)
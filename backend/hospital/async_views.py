@@ -0,0 +1,164 @@
+"""
+Async versions of the hot public read endpoints, for ASGI deployments.
+
+They return the same payloads as their DRF counterparts in hospital.views but
+query through Django's async ORM and read the shared cache with redis.asyncio
+(hospital.async_cache), so a worker waiting on Postgres or Redis keeps serving
+other requests. Page listings need Wagtail's sync URL and rendition APIs, so
+only their cache misses run in a thread.
+"""
+from datetime import datetime
+
+from asgiref.sync import sync_to_async
+from django.core.paginator import InvalidPage, Paginator
+from django.http import JsonResponse
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from . import async_cache, slot_grid
+from .models import Appointment, Doctor, DoctorSchedule
+from .views import (
+    DepartmentListView, NewsListView, ServiceListView, open_schedule_windows,
+    page_list_payload
+)
+
+
+class DoctorNotFound(Exception):
+    pass
+
+
+def _method_not_allowed():
+    # Django's method decorators only wrap sync views before Django 5.0
+    response = JsonResponse({'detail': 'Method not allowed.'}, status=405)
+    response['Allow'] = 'GET'
+    return response
+
+
+def _authenticated_user(request):
+    # Runs DRF's configured authenticators (JWT, session) like the sync views
+    drf_request = Request(
+        request, authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES]
+    )
+    try:
+        user = drf_request.user
+    except APIException:
+        return None
+    return user if user.is_authenticated else None
+
+
+async def doctor_availability(request):
+    """Async DoctorAvailabilityView (single doctor and day)"""
+    if request.method != 'GET':
+        return _method_not_allowed()
+    doctor_id = request.GET.get('doctor')
+    date_str = request.GET.get('date')
+    if not doctor_id or not date_str:
+        return JsonResponse({"error": "Both doctor and date parameters are required"}, status=400)
+
+    try:
+        date = datetime.strptime(date_str, '%Y-%m-%d').date()
+        if not await Doctor.objects.filter(id=doctor_id).aexists():
+            return JsonResponse({"error": "Doctor not found"}, status=404)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    slots = await slot_grid.aload_free_slots([int(doctor_id)], date, date)
+    return JsonResponse({
+        'doctor_id': doctor_id,
+        'date': date_str,
+        'available_slots': slots.get(int(doctor_id), {}).get(date, [])
+    })
+
+
+async def available_slots(request):
+    """Async AvailableSlotsView, sharing its cache entries"""
+    if request.method != 'GET':
+        return _method_not_allowed()
+    if await sync_to_async(_authenticated_user)(request) is None:
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+
+    doctor_id = request.GET.get('doctor')
+    date = request.GET.get('date')
+    if not doctor_id or not date:
+        return JsonResponse({"error": "Both doctor and date parameters are required"}, status=400)
+    try:
+        day = datetime.strptime(date, '%Y-%m-%d').date()
+        day_start, day_end = slot_grid.day_bounds(day, day)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    async def load_slots():
+        if not await Doctor.objects.filter(id=doctor_id).aexists():
+            raise DoctorNotFound
+        schedules = [
+            window async for window in DoctorSchedule.objects.filter(
+                doctor_id=doctor_id,
+                date=date,
+                is_available=True
+            ).values_list('start_time', 'end_time')
+        ]
+        booked = [
+            date_time async for date_time in Appointment.objects.filter(
+                doctor_id=doctor_id, date_time__gte=day_start, date_time__lt=day_end
+            ).exclude(status='CANCELLED').values_list('date_time', flat=True)
+        ]
+        return open_schedule_windows(schedules, booked)
+
+    try:
+        slots = await async_cache.get_or_compute(
+            f'available_slots_{doctor_id}_{date}', load_slots,
+            ttl=60 * 60 * 3, soft_ttl=60 * 30, family='available_slots',
+            tags=[f'available_slots:{doctor_id}']
+        )
+    except (DoctorNotFound, ValueError):
+        return JsonResponse({'detail': 'Not found.'}, status=404)
+    return JsonResponse(slots, safe=False)
+
+
+def _paginate(request, payload):
+    """PageNumberPagination's response shape over a cached list"""
+    paginator = Paginator(payload, api_settings.PAGE_SIZE or len(payload) or 1)
+    try:
+        page = paginator.page(request.GET.get('page') or 1)
+    except InvalidPage:
+        return None
+    url = request.build_absolute_uri()
+    next_url = replace_query_param(url, 'page', page.next_page_number()) if page.has_next() else None
+    previous_url = None
+    if page.has_previous():
+        number = page.previous_page_number()
+        previous_url = remove_query_param(url, 'page') if number == 1 else replace_query_param(url, 'page', number)
+    return {
+        'count': paginator.count,
+        'next': next_url,
+        'previous': previous_url,
+        'results': list(page.object_list),
+    }
+
+
+def _page_list(view_class):
+    async def view(request):
+        if request.method != 'GET':
+            return _method_not_allowed()
+        compute = sync_to_async(
+            lambda: page_list_payload(view_class.queryset.all(), view_class.serializer_class)
+        )
+        payload = await async_cache.get_or_compute(
+            view_class.cache_key, compute,
+            ttl=60 * 60 * 6, soft_ttl=60 * 60, family='page_lists', tags=['pages']
+        )
+        body = _paginate(request, payload)
+        if body is None:
+            return JsonResponse({'detail': 'Invalid page.'}, status=404)
+        return JsonResponse(body)
+
+    view.__name__ = view.__qualname__ = f'{view_class.__name__}_async'
+    view.__doc__ = f'Async {view_class.__name__}'
+    return view
+
+
+department_list = _page_list(DepartmentListView)
+service_list = _page_list(ServiceListView)
+news_list = _page_list(NewsListView)
@@ -0,0 +1,239 @@
+"""
+Stampede-protected caching for hand-rolled cache keys.
+
+get_or_compute() stores values with a soft and a hard expiry:
+
+* before the soft expiry the value is served as a plain hit;
+* between soft and hard expiry the stale value is served while one request
+  refreshes it in a background thread;
+* on a miss only the request holding the recompute lock (an atomic
+  cache.add, i.e. SET NX on Redis) computes the value; the others wait
+  briefly for it instead of hammering the database.
+
+Expiries are jittered so keys written together do not expire together, and
+every key family keeps hit/miss/stale/recompute counters in the cache. Keys
+written with `tags` are purged by the model signals in hospital.signals, and
+a recompute that raced a purge of one of its tags is not stored, since it
+may hold what it read before the change.
+"""
+import logging
+import random
+import threading
+import time
+import uuid
+from collections import namedtuple
+
+from django.core.cache import cache
+from django.db import connections
+
+from . import invalidation, profiling
+
+logger = logging.getLogger(__name__)
+
+STAT_FIELDS = ('hits', 'misses', 'stale', 'recomputes', 'recompute_ms')
+
+# Write the entry and register it under its tags only if no tag version moved
+# since ARGV's versions were read, in one step so a purge cannot slip between
+# the check and the write. KEYS: entry, tag sets, tag versions. ARGV: tag
+# count, versions, encoded entry, ttl in ms, tag set ttl.
+STORE_IF_UNCHANGED_SCRIPT = """
+    local tags = tonumber(ARGV[1])
+    for i = 1, tags do
+        if (redis.call('get', KEYS[1 + tags + i]) or '0') ~= ARGV[1 + i] then
+            return 0
+        end
+    end
+    redis.call('set', KEYS[1], ARGV[tags + 2], 'PX', ARGV[tags + 3])
+    for i = 1, tags do
+        redis.call('sadd', KEYS[1 + i], KEYS[1])
+        redis.call('expire', KEYS[1 + i], ARGV[tags + 4])
+    end
+    return 1
+"""
+
+Entry = namedtuple('Entry', ['fresh_until', 'value'])
+
+
+def jittered(seconds, jitter):
+    return seconds * (1 + random.uniform(0, jitter))
+
+
+def new_entry(value, soft_ttl, jitter):
+    return Entry(time.time() + jittered(soft_ttl, jitter), value)
+
+
+def stat_key(family, field):
+    return f'cache_stats:{family}:{field}'
+
+
+def recompute_lock_key(key):
+    return f'{key}:recompute_lock'
+
+
+def encode(value):
+    """The bytes the django_redis backend stores for `value`, for clients talking to Redis directly."""
+    return cache.client.encode(value)
+
+
+def decode(raw):
+    """Inverse of encode()."""
+    return cache.client.decode(raw)
+
+
+def store_if_unchanged_command(key, entry, timeout, tags, versions):
+    """KEYS and ARGV of STORE_IF_UNCHANGED_SCRIPT; shared with hospital.async_cache."""
+    keys = [cache.make_key(key)]
+    keys += [cache.make_key(invalidation.tag_key(tag)) for tag in tags]
+    keys += [cache.make_key(invalidation.version_key(tag)) for tag in tags]
+    args = [len(tags), *versions, encode(entry), int(timeout * 1000), invalidation.TAG_TTL]
+    return keys, args
+
+
+def count(family, field, amount=1):
+    profiling.note_cache(field, amount)
+    key = stat_key(family, field)
+    try:
+        cache.incr(key, amount)
+    except ValueError:
+        # First increment for this family; add() keeps concurrent creators safe
+        if not cache.add(key, amount, timeout=None):
+            cache.incr(key, amount)
+
+
+def get_stats(families):
+    """Return {family: {field: value}} for the given key families."""
+    keys = {(family, field): stat_key(family, field) for family in families for field in STAT_FIELDS}
+    values = cache.get_many(list(keys.values()))
+    return {
+        family: {field: values.get(keys[(family, field)], 0) for field in STAT_FIELDS}
+        for family in families
+    }
+
+
+def _acquire(lock_key, timeout):
+    token = uuid.uuid4().hex
+    return token if cache.add(lock_key, token, timeout=timeout) else None
+
+
+def _release(lock_key, token):
+    if cache.get(lock_key) == token:
+        cache.delete(lock_key)
+
+
+def _recompute(key, compute, ttl, soft_ttl, jitter, family, tags):
+    versions = invalidation.get_versions(tags)
+    started = time.perf_counter()
+    value = compute()
+    elapsed_ms = int((time.perf_counter() - started) * 1000)
+    if versions is not None:
+        store(key, value, ttl, soft_ttl, jitter, tags, versions=versions)
+    count(family, 'recomputes')
+    count(family, 'recompute_ms', elapsed_ms)
+    return value
+
+
+def _refresh_in_background(key, compute, ttl, soft_ttl, jitter, family, tags, lock_key, token):
+    def run():
+        try:
+            _recompute(key, compute, ttl, soft_ttl, jitter, family, tags)
+        except Exception:
+            logger.exception('Background refresh of %s failed', key)
+        finally:
+            _release(lock_key, token)
+            connections.close_all()
+
+    threading.Thread(target=run, daemon=True).start()
+
+
+def store(key, value, ttl, soft_ttl=None, jitter=0.1, tags=(), versions=None):
+    """
+    Write a value computed elsewhere (e.g. by a warm-up task) in get_or_compute's format.
+
+    With `versions`, the invalidation.get_versions(tags) read before computing
+    the value, nothing is written if a tag was purged since; returns whether
+    the value was written.
+    """
+    tags = list(tags)
+    soft_ttl = soft_ttl if soft_ttl is not None else ttl / 2
+    entry, timeout = new_entry(value, soft_ttl, jitter), jittered(ttl, jitter)
+    if versions is None:
+        cache.set(key, entry, timeout=timeout)
+        invalidation.register(key, tags)
+        return True
+
+    connection = invalidation._redis()
+    if connection is not None:
+        keys, args = store_if_unchanged_command(key, entry, timeout, tags, versions)
+        return bool(connection.eval(STORE_IF_UNCHANGED_SCRIPT, len(keys), *keys, *args))
+    # Other backends check and write in two steps, which narrows the race
+    if invalidation.get_versions(tags) != tuple(versions):
+        return False
+    cache.set(key, entry, timeout=timeout)
+    invalidation.register(key, tags)
+    return True
+
+
+def get_or_compute(key, compute, ttl, soft_ttl=None, family=None, tags=(), jitter=0.1,
+                   lock_timeout=30, wait_timeout=5.0):
+    """
+    Return the cached value of `key`, computing it with `compute()` when needed.
+
+    `ttl` is the hard expiry in seconds and `soft_ttl` (default: half of ttl)
+    the age after which the value is refreshed in the background. `tags` name
+    the data the value depends on (see hospital.invalidation).
+    """
+    family = family or key
+    soft_ttl = soft_ttl if soft_ttl is not None else ttl / 2
+    lock_key = recompute_lock_key(key)
+
+    entry = cache.get(key)
+    if isinstance(entry, Entry):
+        if entry.fresh_until > time.time():
+            count(family, 'hits')
+            return entry.value
+        count(family, 'stale')
+        token = _acquire(lock_key, lock_timeout)
+        if token:
+            _refresh_in_background(key, compute, ttl, soft_ttl, jitter, family, tags, lock_key, token)
+        return entry.value
+
+    count(family, 'misses')
+    token = _acquire(lock_key, lock_timeout)
+    if token is None:
+        # Someone else is computing the value; wait for it before giving up
+        deadline = time.monotonic() + wait_timeout
+        delay = 0.02
+        while time.monotonic() < deadline:
+            time.sleep(delay)
+            entry = cache.get(key)
+            if isinstance(entry, Entry):
+                return entry.value
+            delay = min(delay * 2, 0.25)
+        return _recompute(key, compute, ttl, soft_ttl, jitter, family, tags)
+
+    try:
+        return _recompute(key, compute, ttl, soft_ttl, jitter, family, tags)
+    finally:
+        _release(lock_key, token)
+
+
+def read_versions(keys):
+    """
+    Return {key: value} for version counters. Missing counters start from the
+    clock, so a counter lost from the cache never goes back to an old value.
+    """
+    values = cache.get_many(keys)
+    missing = [key for key in keys if key not in values]
+    if missing:
+        for key in missing:
+            cache.add(key, int(time.time() * 1000), timeout=None)
+        values.update(cache.get_many(missing))
+    return values
+
+
+def bump_version(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Not started yet; the next read_versions() starts it from the clock
+        pass
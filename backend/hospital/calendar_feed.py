@@ -0,0 +1,160 @@
+"""
+Materialized calendar feed.
+
+Doctor schedules are materialized one calendar week (Monday-Sunday) at a
+time. Every week has a version counter that schedule changes bump, and a
+global generation covers changes that touch every week (doctor names). A
+week's events are cached under its current version, so they never need to
+be purged, and the versions of the visible weeks make a strong ETag for the
+feed: clients revalidating an unchanged window get a 304 without any week
+being loaded.
+"""
+import hashlib
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.core.cache import cache
+
+from . import caching
+
+WEEK_TTL = 60 * 60 * 24
+MAX_WEEKS = 26
+
+GENERATION_KEY = 'calendar_generation'
+GENERATION_MODIFIED_KEY = 'calendar_generation_modified'
+
+
+def week_start(day):
+    return day - timedelta(days=day.weekday())
+
+
+def weeks_between(start, end):
+    """The weeks overlapping [start, end), end exclusive like FullCalendar's."""
+    week = week_start(start)
+    while week < end:
+        yield week
+        week += timedelta(days=7)
+
+
+def _version_key(week):
+    return f'calendar_week_version:{week.isoformat()}'
+
+
+def _modified_key(week):
+    return f'calendar_week_modified:{week.isoformat()}'
+
+
+def _initial_version():
+    # Versions start from the clock, so a counter lost from the cache never
+    # restarts at a value an old ETag was built from
+    return int(time.time() * 1000)
+
+
+def _read_counters(counters):
+    """
+    Return {version_key: version} for (version_key, modified_key) pairs,
+    initializing missing counters together with their modification time.
+    """
+    version_keys = [version_key for version_key, _ in counters]
+    values = cache.get_many(version_keys)
+    missing = [(version_key, modified_key) for version_key, modified_key in counters
+               if version_key not in values]
+    if missing:
+        now = time.time()
+        for version_key, modified_key in missing:
+            if cache.add(version_key, _initial_version(), timeout=None):
+                cache.set(modified_key, now, timeout=None)
+        values.update(cache.get_many([version_key for version_key, _ in missing]))
+    return values
+
+
+def get_versions(weeks):
+    """Return (generation, {week: version}, last_modified timestamp) for the weeks."""
+    weeks = list(weeks)
+    counters = [(GENERATION_KEY, GENERATION_MODIFIED_KEY)] + [
+        (_version_key(week), _modified_key(week)) for week in weeks
+    ]
+    values = _read_counters(counters)
+    modified = cache.get_many([modified_key for _, modified_key in counters])
+    last_modified = max(modified.values(), default=time.time())
+    versions = {week: values.get(_version_key(week), 0) for week in weeks}
+    return values.get(GENERATION_KEY, 0), versions, last_modified
+
+
+def _bump(version_key, modified_key):
+    try:
+        cache.incr(version_key)
+    except ValueError:
+        # Not initialized yet; the next read starts it from the clock
+        pass
+    cache.set(modified_key, time.time(), timeout=None)
+
+
+def bump_weeks(days):
+    """Invalidate the weeks containing `days`."""
+    for week in {week_start(day) for day in days if day}:
+        _bump(_version_key(week), _modified_key(week))
+
+
+def bump_generation():
+    """Invalidate every week at once."""
+    _bump(GENERATION_KEY, GENERATION_MODIFIED_KEY)
+
+
+def materialize_week(week):
+    from .models import DoctorSchedule
+
+    schedules = DoctorSchedule.objects.filter(
+        date__range=(week, week + timedelta(days=6))
+    ).select_related('doctor__user').order_by('date', 'start_time')
+    return [
+        {
+            'title': f'Dr. {schedule.doctor.user.get_full_name()}',
+            'start': f'{schedule.date.isoformat()}T{schedule.start_time.isoformat()}',
+            'end': f'{schedule.date.isoformat()}T{schedule.end_time.isoformat()}',
+            'doctor': schedule.doctor_id,
+        }
+        for schedule in schedules
+    ]
+
+
+def get_week_events(week, generation, version):
+    # A versioned key never changes content, so it is never refreshed early
+    return caching.get_or_compute(
+        f'calendar_week:{week.isoformat()}:{generation}:{version}',
+        lambda: materialize_week(week),
+        ttl=WEEK_TTL, soft_ttl=WEEK_TTL, family='calendar_week'
+    )
+
+
+class CalendarFeed:
+    """The events of [start, end), optionally limited to some doctors."""
+
+    def __init__(self, start, end, doctor_ids=None):
+        self.start = start
+        self.end = end
+        self.doctor_ids = set(doctor_ids) if doctor_ids else None
+        self.weeks = list(weeks_between(start, end))
+        self.generation, self.versions, modified = get_versions(self.weeks)
+        self.last_modified = datetime.fromtimestamp(int(modified), tz=dt_timezone.utc)
+
+    @property
+    def etag(self):
+        parts = [
+            self.start.isoformat(), self.end.isoformat(),
+            ','.join(str(doctor_id) for doctor_id in sorted(self.doctor_ids or ())),
+            str(self.generation),
+        ] + [f'{week.isoformat()}={self.versions[week]}' for week in self.weeks]
+        return '"%s"' % hashlib.sha1('|'.join(parts).encode()).hexdigest()
+
+    def events(self):
+        start, end = self.start.isoformat(), self.end.isoformat()
+        events = []
+        for week in self.weeks:
+            for event in get_week_events(week, self.generation, self.versions[week]):
+                if not start <= event['start'][:10] < end:
+                    continue
+                if self.doctor_ids is not None and event['doctor'] not in self.doctor_ids:
+                    continue
+                events.append(event)
+        return events
@@ -0,0 +1,209 @@
+"""
+Clinical search over the clinic's medical records.
+
+Every apps.medical_records MedicalRecord is indexed as ClinicalEntry rows:
+one for the record (diagnosis, treatment, prescription and notes text) and
+one per prescription, lab result and vaccination. Each entry carries its
+record's patient, record_type and is_confidential along with its own date,
+normalized name and is_abnormal flag. Saving or deleting a record or one of
+its children rewrites the record's entries once the transaction commits
+(hospital.signals); `manage.py reindex_clinical_search` rebuilds them after
+bulk loads.
+
+A search is a list of conditions a record, or with group=patients a
+patient, has to meet; each is met by one of its entries:
+
+- q: every term in the text of an entry (tsvector prefix match on Postgres)
+- drug, lab, vaccine: a prescription, lab result or vaccination whose name
+  starts with the text; `abnormal` applies to the lab condition
+- record_type, date_from and date_to narrow every condition
+
+so "patients on drug X with an abnormal lab Y" is
+`?group=patients&drug=X&lab=Y&abnormal=true`. The conditions become nested
+IN subqueries over the entry indexes, and confidential entries are excluded
+in the same SQL unless the user may view confidential records.
+"""
+from django.db import connections, transaction
+from django.db.models import Count, Q
+from rest_framework import serializers
+
+from apps.medical_records.models import LabResult, MedicalRecord as ClinicRecord, Prescription, Vaccination
+
+from . import search
+from .models import ClinicalEntry
+from .slot_grid import day_bounds
+
+CLINICAL_USER_TYPES = ('admin', 'staff', 'doctor')
+CONFIDENTIAL_PERMISSION = 'medical_records.view_confidential_records'
+GROUP_FIELDS = {'records': 'record_id', 'patients': 'patient_id'}
+RECORD_TEXT = ['diagnosis', 'treatment', 'prescription', 'notes']
+
+
+class Child:
+    """A record child model and how its entry is built."""
+
+    def __init__(self, entry_type, model, name_field, text_fields, date_field=None, abnormal_field=None):
+        self.entry_type = entry_type
+        self.model = model
+        self.name_field = name_field
+        self.text_fields = text_fields
+        # Entries without a date of their own use the record's
+        self.date_field = date_field
+        self.abnormal_field = abnormal_field
+
+    def fields(self):
+        return [
+            field for field in ('id', 'medical_record_id', self.name_field, self.date_field, self.abnormal_field)
+            if field
+        ] + self.text_fields
+
+
+CHILDREN = [
+    Child('prescription', Prescription, 'medicine_name', ['dosage', 'frequency', 'duration', 'instructions']),
+    Child('lab_result', LabResult, 'test_name', ['result_value', 'unit', 'notes'],
+          date_field='test_date', abnormal_field='is_abnormal'),
+    Child('vaccination', Vaccination, 'vaccine_name', ['administered_by', 'batch_number', 'notes'],
+          date_field='date_administered'),
+]
+
+
+# Indexing
+
+def build_entries(record_ids):
+    records = {
+        row['id']: row for row in ClinicRecord.objects.filter(id__in=record_ids).values(
+            'id', 'patient_id', 'record_type', 'record_date', 'is_confidential', *RECORD_TEXT
+        )
+    }
+
+    def entry(record, entry_type, entry_id, date, name, text, is_abnormal=False):
+        return ClinicalEntry(
+            record_id=record['id'], patient_id=record['patient_id'], record_type=record['record_type'],
+            is_confidential=record['is_confidential'], entry_type=entry_type, entry_id=entry_id,
+            entry_date=date or record['record_date'], is_abnormal=is_abnormal, name=search.normalize([name])[:200],
+            body=search.normalize([name] + text),
+        )
+
+    entries = [
+        entry(record, 'record', record['id'], None, '', [record[field] for field in RECORD_TEXT])
+        for record in records.values()
+    ]
+    for child in CHILDREN:
+        for row in child.model.objects.filter(medical_record_id__in=records).values(*child.fields()):
+            entries.append(entry(
+                records[row['medical_record_id']], child.entry_type, row['id'],
+                row[child.date_field] if child.date_field else None,
+                row[child.name_field],
+                [row[field] for field in child.text_fields],
+                bool(row[child.abnormal_field]) if child.abnormal_field else False,
+            ))
+    return entries
+
+
+def sync_records(record_ids):
+    """Rewrite the entries of the given records; deleted records lose theirs."""
+    record_ids = list(record_ids)
+    entries = build_entries(record_ids)
+    with transaction.atomic():
+        ClinicalEntry.objects.filter(record_id__in=record_ids).delete()
+        ClinicalEntry.objects.bulk_create(entries, batch_size=search.BATCH_SIZE)
+
+
+def sync_on_commit(record_id):
+    transaction.on_commit(lambda: sync_records([record_id]))
+
+
+# Querying
+
+class ClinicalSearchParams(serializers.Serializer):
+    q = serializers.CharField(required=False, allow_blank=True)
+    drug = serializers.CharField(required=False, allow_blank=True)
+    lab = serializers.CharField(required=False, allow_blank=True)
+    vaccine = serializers.CharField(required=False, allow_blank=True)
+    abnormal = serializers.BooleanField(required=False, allow_null=True, default=None)
+    record_type = serializers.MultipleChoiceField(choices=ClinicRecord.RECORD_TYPE_CHOICES, required=False)
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+    patient = serializers.IntegerField(required=False)
+    group = serializers.ChoiceField(choices=sorted(GROUP_FIELDS), default='records')
+    facets = serializers.BooleanField(required=False, default=False)
+
+    def validate(self, data):
+        if data.get('date_from') and data.get('date_to') and data['date_from'] > data['date_to']:
+            raise serializers.ValidationError({'date_to': 'Must not be before date_from.'})
+        return data
+
+
+def can_view_confidential(user):
+    return user.has_perm(CONFIDENTIAL_PERMISSION)
+
+
+def visible_entries(user):
+    entries = ClinicalEntry.objects.all()
+    if user.user_type == 'patient':
+        entries = entries.filter(patient__user=user)
+    elif user.user_type not in CLINICAL_USER_TYPES and not user.is_superuser:
+        return entries.none()
+    if not can_view_confidential(user):
+        entries = entries.filter(is_confidential=False)
+    return entries
+
+
+def narrowing(params):
+    query = Q()
+    if params.get('record_type'):
+        query &= Q(record_type__in=params['record_type'])
+    if params.get('date_from'):
+        query &= Q(entry_date__gte=day_bounds(params['date_from'], params['date_from'])[0])
+    if params.get('date_to'):
+        query &= Q(entry_date__lt=day_bounds(params['date_to'], params['date_to'])[1])
+    if params.get('patient'):
+        query &= Q(patient_id=params['patient'])
+    return query
+
+
+def name_prefix(text):
+    return search.normalize([text])
+
+
+def conditions(params, vendor):
+    """One Q per condition; a result needs an entry matching each."""
+    found = []
+    terms = search.parse(params.get('q'))
+    if terms:
+        found.append(search.match_terms(terms, vendor))
+    if params.get('drug'):
+        found.append(Q(entry_type='prescription', name__startswith=name_prefix(params['drug'])))
+    if params.get('lab') or params.get('abnormal') is not None:
+        lab = Q(entry_type='lab_result')
+        if params.get('lab'):
+            lab &= Q(name__startswith=name_prefix(params['lab']))
+        if params.get('abnormal') is not None:
+            lab &= Q(is_abnormal=params['abnormal'])
+        found.append(lab)
+    if params.get('vaccine'):
+        found.append(Q(entry_type='vaccination', name__startswith=name_prefix(params['vaccine'])))
+    return found
+
+
+def matching_keys(user, params):
+    """Subquery of the record or patient ids meeting every condition."""
+    entries = visible_entries(user).filter(narrowing(params))
+    field = GROUP_FIELDS[params['group']]
+    keys = None
+    for condition in conditions(params, connections[entries.db].vendor) or [Q()]:
+        matched = entries.filter(condition).values(field)
+        keys = matched if keys is None else keys.filter(**{f'{field}__in': matched})
+    return keys
+
+
+def facet_counts(user, params, keys):
+    """Records per record_type and lab results per is_abnormal within the results."""
+    field = GROUP_FIELDS[params['group']]
+    entries = visible_entries(user).filter(narrowing(params)).filter(**{f'{field}__in': keys}).order_by()
+    record_types = entries.values_list('record_type').annotate(total=Count('record_id', distinct=True))
+    abnormal = entries.filter(entry_type='lab_result').values_list('is_abnormal').annotate(total=Count('id'))
+    return {
+        'record_type': dict(record_types),
+        'is_abnormal': {str(value).lower(): total for value, total in abnormal},
+    }
@@ -0,0 +1,252 @@
+"""
+Constant-memory encoders for large exports.
+
+Rows are plain dicts (usually from QuerySet.values().iterator()) and every
+encoder yields byte chunks, so responses and export files never hold more
+than one batch of rows in memory.
+"""
+import csv
+import json
+import zlib
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+ROWS_PER_CHUNK = 500
+
+
+class Echo:
+    """File-like object whose write() returns the value, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def iter_csv(rows, header, to_row, rows_per_chunk=ROWS_PER_CHUNK):
+    writer = csv.writer(Echo())
+    yield writer.writerow(header).encode()
+    batch = []
+    for row in rows:
+        batch.append(writer.writerow(to_row(row)))
+        if len(batch) >= rows_per_chunk:
+            yield ''.join(batch).encode()
+            batch = []
+    if batch:
+        yield ''.join(batch).encode()
+
+
+def iter_ndjson(rows, to_dict=None, rows_per_chunk=ROWS_PER_CHUNK):
+    batch = []
+    for row in rows:
+        batch.append(json.dumps(to_dict(row) if to_dict else row, default=_json_default))
+        if len(batch) >= rows_per_chunk:
+            yield ('\n'.join(batch) + '\n').encode()
+            batch = []
+    if batch:
+        yield ('\n'.join(batch) + '\n').encode()
+
+
+def gzip_stream(chunks, level=6):
+    """Compress a stream of byte chunks into a single gzip member."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+# Background export jobs
+
+EXPORT_BATCH_SIZE = 1000
+EXPORT_CHUNKS = 8
+# A running chunk that has not checkpointed for this long lost its worker
+EXPORT_LEASE = timedelta(minutes=10)
+
+
+def export_storage():
+    """Private storage of export files; they have no public URL (see ExportJobViewSet.download)."""
+    from django.conf import settings
+    from django.core.files.storage import FileSystemStorage
+
+    return FileSystemStorage(location=settings.EXPORT_ROOT, base_url=None)
+
+
+def _medical_record_queryset(parameters):
+    from apps.medical_records.models import MedicalRecord
+
+    queryset = MedicalRecord.objects.all()
+    if parameters.get('start'):
+        queryset = queryset.filter(record_date__date__gte=parameters['start'])
+    if parameters.get('end'):
+        queryset = queryset.filter(record_date__date__lte=parameters['end'])
+    if parameters.get('patient'):
+        queryset = queryset.filter(patient_id=parameters['patient'])
+    return queryset
+
+
+def _medical_record_batch(queryset):
+    records = queryset.prefetch_related('prescriptions', 'lab_results', 'vaccinations')
+    for record in records:
+        yield {
+            'id': record.id,
+            'patient': record.patient_id,
+            'doctor': record.doctor_id,
+            'appointment': record.appointment_id,
+            'record_type': record.record_type,
+            'record_date': record.record_date,
+            'diagnosis': record.diagnosis,
+            'treatment': record.treatment,
+            'prescription': record.prescription,
+            'notes': record.notes,
+            'is_confidential': record.is_confidential,
+            'prescriptions': [
+                {
+                    'medicine_name': item.medicine_name,
+                    'dosage': item.dosage,
+                    'frequency': item.frequency,
+                    'duration': item.duration,
+                    'instructions': item.instructions,
+                    'is_active': item.is_active,
+                }
+                for item in record.prescriptions.all()
+            ],
+            'lab_results': [
+                {
+                    'test_name': item.test_name,
+                    'test_date': item.test_date,
+                    'result_value': item.result_value,
+                    'normal_range': item.normal_range,
+                    'unit': item.unit,
+                    'is_abnormal': item.is_abnormal,
+                }
+                for item in record.lab_results.all()
+            ],
+            'vaccinations': [
+                {
+                    'vaccine_name': item.vaccine_name,
+                    'dose_number': item.dose_number,
+                    'date_administered': item.date_administered,
+                    'batch_number': item.batch_number,
+                    'next_due_date': item.next_due_date,
+                }
+                for item in record.vaccinations.all()
+            ],
+        }
+
+
+EXPORT_SOURCES = {
+    'medical_records': (_medical_record_queryset, _medical_record_batch),
+}
+
+
+def plan_export_job(job, chunks=EXPORT_CHUNKS):
+    """
+    Split the job's id range into chunks and return the job's chunks.
+
+    Planning twice (a resume racing the queued start) returns the chunks of
+    the first plan instead of planning again.
+    """
+    from django.db.models import Count, Max, Min
+    from .models import ExportChunk
+
+    existing = list(ExportChunk.objects.filter(job=job))
+    if existing:
+        return existing
+
+    get_queryset, _ = EXPORT_SOURCES[job.export_type]
+    bounds = get_queryset(job.parameters).aggregate(low=Min('id'), high=Max('id'), total=Count('id'))
+    job.total_rows = bounds['total']
+    if not bounds['total']:
+        return []
+
+    step = max(1, (bounds['high'] - bounds['low'] + chunks) // chunks)
+    planned = []
+    start = bounds['low']
+    index = 0
+    while start <= bounds['high']:
+        end = min(start + step - 1, bounds['high'])
+        planned.append(ExportChunk(job=job, index=index, start_id=start, end_id=end, last_id=start - 1))
+        start = end + 1
+        index += 1
+    ExportChunk.objects.bulk_create(planned, ignore_conflicts=True)
+    return list(ExportChunk.objects.filter(job=job))
+
+
+def claimable_chunks(chunks):
+    """The chunks no worker holds: pending, failed, or running past their lease."""
+    from django.db.models import Q
+    from django.utils import timezone
+
+    return chunks.filter(
+        Q(status__in=['pending', 'failed']) | Q(status='running', updated_at__lt=timezone.now() - EXPORT_LEASE)
+    )
+
+
+def claim_export_chunk(chunk):
+    """Mark the chunk running for this worker; False when another worker holds it or it is done."""
+    from django.utils import timezone
+    from .models import ExportChunk
+
+    claimed = claimable_chunks(ExportChunk.objects.filter(pk=chunk.pk)).update(
+        status='running', updated_at=timezone.now()
+    )
+    if claimed:
+        # Resume from the checkpoint of the worker that held it before
+        chunk.refresh_from_db()
+    return bool(claimed)
+
+
+def run_export_chunk(chunk, batch_size=EXPORT_BATCH_SIZE):
+    """
+    Export a chunk in keyset-paginated batches, one gzip part file per batch.
+
+    Progress is checkpointed after every part, so a restarted worker resumes
+    after the last committed part and overwrites any half-written one.
+    """
+    from django.core.files.base import ContentFile
+    from django.db.models import F
+    from django.utils import timezone
+    from .models import ExportChunk
+
+    get_queryset, serialize = EXPORT_SOURCES[chunk.job.export_type]
+    queryset = get_queryset(chunk.job.parameters).filter(id__lte=chunk.end_id).order_by('id')
+
+    while True:
+        batch = list(serialize(queryset.filter(id__gt=chunk.last_id)[:batch_size]))
+        if not batch:
+            break
+
+        storage = export_storage()
+        path = chunk.part_path(chunk.parts)
+        if storage.exists(path):
+            storage.delete(path)
+        storage.save(path, ContentFile(b''.join(gzip_stream(iter_ndjson(batch)))))
+
+        chunk.last_id = batch[-1]['id']
+        chunk.parts += 1
+        chunk.rows += len(batch)
+        # updated_at doubles as the heartbeat of the chunk's lease
+        ExportChunk.objects.filter(pk=chunk.pk).update(
+            last_id=chunk.last_id, parts=F('parts') + 1, rows=F('rows') + len(batch), updated_at=timezone.now()
+        )
+
+    chunk.status = 'completed'
+    chunk.save(update_fields=['status', 'updated_at'])
+
+
+def export_job_files(job):
+    from .models import ExportChunk
+
+    return [
+        chunk.part_path(part)
+        for chunk in ExportChunk.objects.filter(job=job).only('job_id', 'index', 'parts')
+        for part in range(chunk.parts)
+    ]
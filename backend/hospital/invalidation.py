@@ -0,0 +1,131 @@
+"""
+Tag-based cache invalidation.
+
+Cached values are registered under one or more tags when they are written
+(see caching.get_or_compute(tags=...)); model signals then purge every key of
+a tag at once instead of waiting for the TTL. On Redis each tag is a set of
+cache keys and a purge is a single scripted round trip; other cache backends
+keep the tag's key list in the cache itself.
+
+Every purge also bumps the tag's version. A value computed while one of its
+tags was purged may hold what was read before the change, so
+caching.get_or_compute reads the versions before computing and skips the
+write when they moved (caching.store(versions=...)).
+"""
+import logging
+
+from django.core.cache import cache
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+# Tag sets outlive the longest TTL of the keys they track
+TAG_TTL = 60 * 60 * 24
+
+
+# Read the tag sets, delete their keys and bump the tag versions in one
+# round trip. KEYS are the tag sets followed by their version counters.
+PURGE_SCRIPT = """
+    local purged = 0
+    local tags = #KEYS / 2
+    for t = 1, tags do
+        local members = redis.call('smembers', KEYS[t])
+        for i = 1, #members, 500 do
+            redis.call('del', unpack(members, i, math.min(i + 499, #members)))
+        end
+        purged = purged + #members
+        redis.call('del', KEYS[t])
+        redis.call('incr', KEYS[tags + t])
+        redis.call('expire', KEYS[tags + t], ARGV[1])
+    end
+    return purged
+"""
+
+
+def tag_key(tag):
+    return f'cache_tag:{tag}'
+
+
+def version_key(tag):
+    return f'cache_tag_version:{tag}'
+
+
+def _redis():
+    try:
+        from django_redis import get_redis_connection
+        return get_redis_connection('default')
+    except (ImportError, NotImplementedError):
+        return None
+
+
+def register(key, tags):
+    """Record that cache `key` depends on each of `tags`."""
+    if not tags:
+        return
+    connection = _redis()
+    try:
+        if connection is not None:
+            pipe = connection.pipeline(transaction=False)
+            for tag in tags:
+                redis_key = cache.make_key(tag_key(tag))
+                pipe.sadd(redis_key, cache.make_key(key))
+                pipe.expire(redis_key, TAG_TTL)
+            pipe.execute()
+            return
+        for tag in tags:
+            keys = set(cache.get(tag_key(tag), ()))
+            keys.add(key)
+            cache.set(tag_key(tag), keys, TAG_TTL)
+    except Exception:
+        # Mirror the cache's IGNORE_EXCEPTIONS: an unregistered key still expires by TTL
+        logger.exception('Could not register cache key %s under %s', key, tags)
+
+
+def get_versions(tags):
+    """The current versions of `tags`, to compare after a compute; None when unreadable."""
+    keys = [version_key(tag) for tag in tags]
+    try:
+        values = cache.get_many(keys)
+    except Exception:
+        logger.exception('Could not read the versions of cache tags %s', tags)
+        return None
+    return tuple(int(values.get(key, 0)) for key in keys)
+
+
+def _bump_version(tag):
+    key = version_key(tag)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # First purge of this tag; add() keeps concurrent purges safe
+        if not cache.add(key, 1, timeout=TAG_TTL):
+            cache.incr(key)
+
+
+def purge(tags):
+    """Delete every key registered under `tags`; returns the number of keys purged."""
+    tags = list(dict.fromkeys(tags))
+    if not tags:
+        return 0
+    connection = _redis()
+    try:
+        if connection is not None:
+            redis_keys = [cache.make_key(tag_key(tag)) for tag in tags]
+            redis_keys += [cache.make_key(version_key(tag)) for tag in tags]
+            return connection.eval(PURGE_SCRIPT, len(redis_keys), *redis_keys, TAG_TTL)
+        keys = set()
+        for tag in tags:
+            keys.update(cache.get(tag_key(tag), ()))
+        cache.delete_many(list(keys) + [tag_key(tag) for tag in tags])
+        for tag in tags:
+            _bump_version(tag)
+        return len(keys)
+    except Exception:
+        logger.exception('Could not purge cache tags %s', tags)
+        return 0
+
+
+def purge_on_commit(tags):
+    """Purge once the surrounding transaction commits, so readers never re-cache old rows."""
+    tags = list(tags)
+    transaction.on_commit(lambda: purge(tags))
@@ -0,0 +1,91 @@
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils.module_loading import import_string
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from hospital.pagination import encode_cursor, get_cursor_ordering, ordering_values
+
+ENDPOINTS = [
+    'hospital.api.views.AppointmentViewSet',
+    'hospital.views.MedicalRecordViewSet',
+    'apps.appointments.views.AppointmentViewSet',
+]
+
+
+def timed_list(view, user, params, repeat):
+    """Median milliseconds and query count of the list action with the given query params."""
+    timings = []
+    for _ in range(repeat):
+        request = APIRequestFactory().get('/', params)
+        force_authenticate(request, user=user)
+        with CaptureQueriesContext(connection) as context:
+            started = time.perf_counter()
+            response = view(request)
+            response.render()
+            timings.append((time.perf_counter() - started) * 1000)
+        if response.status_code != 200:
+            raise CommandError(f'{params} returned {response.status_code}')
+    return statistics.median(timings), len(context.captured_queries)
+
+
+def cursor_at(viewset, depth):
+    """Cursor of the page starting after `depth` rows, seeded outside the timed requests."""
+    ordering = get_cursor_ordering(viewset)
+    if depth == 0:
+        return ''
+    model = viewset.serializer_class.Meta.model
+    instance = model._default_manager.order_by(*ordering)[depth - 1]
+    return encode_cursor(ordering_values(instance, ordering))
+
+
+class Command(BaseCommand):
+    help = 'Compare page-number and keyset pagination latency at increasing page depths'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Email of the user to authenticate as (defaults to a superuser)')
+        parser.add_argument('--depths', default='0,1000,10000,100000,1000000',
+                            help='Comma-separated row offsets to measure')
+        parser.add_argument('--repeat', type=int, default=5, help='Requests per measurement')
+        parser.add_argument('--endpoint', action='append', dest='endpoints',
+                            help='Dotted path of a viewset to benchmark (repeatable)')
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        if options['user']:
+            user = User.objects.filter(email=options['user']).first()
+        else:
+            user = User.objects.filter(is_superuser=True).first()
+        if user is None:
+            raise CommandError('No user to authenticate as')
+
+        depths = [int(depth) for depth in options['depths'].split(',')]
+        for path in options['endpoints'] or ENDPOINTS:
+            viewset = import_string(path)
+            if not get_cursor_ordering(viewset):
+                raise CommandError(f'{path} declares no cursor_ordering')
+            view = viewset.as_view({'get': 'list'})
+            page_size = viewset.pagination_class.page_size
+            total = viewset.serializer_class.Meta.model._default_manager.count()
+            self.stdout.write(f'{path} ({total} rows, page_size={page_size})')
+
+            # Warm up content types, permissions and other per-process caches
+            timed_list(view, user, {}, 1)
+            for depth in depths:
+                if depth >= total:
+                    self.stdout.write(f'  depth {depth}: skipped, table has {total} rows')
+                    continue
+                page_ms, page_queries = timed_list(
+                    view, user, {'page': depth // page_size + 1}, options['repeat']
+                )
+                cursor_ms, cursor_queries = timed_list(
+                    view, user, {'cursor': cursor_at(viewset, depth)}, options['repeat']
+                )
+                self.stdout.write(
+                    f'  depth {depth}: page {page_ms:.1f} ms ({page_queries} queries), '
+                    f'cursor {cursor_ms:.1f} ms ({cursor_queries} queries)'
+                )
@@ -0,0 +1,169 @@
+import asyncio
+import socket
+import subprocess
+import sys
+import time
+from datetime import date as date_cls
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# name: (sync path served under WSGI, async path served under ASGI)
+ENDPOINTS = {
+    'doctor-availability': ('/api/v1/doctor-availability/', '/api/v1/async/doctor-availability/'),
+    'available-slots': ('/api/v1/available-slots/', '/api/v1/async/available-slots/'),
+    'departments': ('/api/v1/departments/', '/api/v1/async/departments/'),
+    'service-pages': ('/api/v1/service-pages/', '/api/v1/async/service-pages/'),
+    'news': ('/api/v1/news/', '/api/v1/async/news/'),
+}
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def wait_for_port(host, port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise CommandError(f'Server on {host}:{port} did not start within {timeout}s')
+
+
+async def fetch(host, port, request):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(request)
+        await writer.drain()
+        status_line = await reader.readline()
+        await reader.read()
+    finally:
+        writer.close()
+    parts = status_line.split()
+    return int(parts[1]) if len(parts) > 1 else 0
+
+
+async def load(url, path, concurrency, duration, headers):
+    """Hit url+path from `concurrency` clients for `duration` seconds."""
+    parsed = urlsplit(url)
+    host, port = parsed.hostname, parsed.port or 80
+    request = (
+        f'GET {path} HTTP/1.1\r\nHost: {parsed.netloc}\r\nConnection: close\r\n'
+        + ''.join(f'{name}: {value}\r\n' for name, value in headers.items())
+        + '\r\n'
+    ).encode()
+
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + duration
+
+    async def client():
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                status = await fetch(host, port, request)
+            except OSError:
+                errors += 1
+                continue
+            if status != 200:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': len(latencies) / elapsed,
+        'p50': percentile(latencies, 0.5) * 1000,
+        'p99': percentile(latencies, 0.99) * 1000,
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare requests/sec and p99 latency of the sync public endpoints under WSGI '
+        'with their async variants under ASGI. Run it on the machine under test, against '
+        'the same local Postgres and Redis, ideally with --spawn so both servers get the '
+        'same worker count. DRF throttling applies to the sync views only, so raise the '
+        'anon/user throttle rates for the run or WSGI errors will be 429s.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--spawn', action='store_true',
+                            help='Start gunicorn and uvicorn locally instead of using running servers')
+        parser.add_argument('--wsgi-url', default='http://127.0.0.1:8001')
+        parser.add_argument('--asgi-url', default='http://127.0.0.1:8002')
+        parser.add_argument('--workers', type=int, default=2)
+        parser.add_argument('--threads', type=int, default=8, help='gunicorn gthread threads per worker')
+        parser.add_argument('--concurrency', type=int, default=64)
+        parser.add_argument('--duration', type=float, default=15.0)
+        parser.add_argument('--warmup', type=float, default=3.0)
+        parser.add_argument('--endpoint', action='append', choices=sorted(ENDPOINTS),
+                            help='Endpoints to run (default: all)')
+        parser.add_argument('--doctor', type=int, default=1)
+        parser.add_argument('--date', default=None, help='Date for the availability endpoints (default: today)')
+        parser.add_argument('--token', default=None, help='JWT access token for available-slots')
+
+    def handle(self, *args, **options):
+        endpoints = options['endpoint'] or list(ENDPOINTS)
+        if 'available-slots' in endpoints and not options['token']:
+            self.stdout.write(self.style.WARNING('Skipping available-slots: it needs --token'))
+            endpoints.remove('available-slots')
+
+        query = f"?doctor={options['doctor']}&date={options['date'] or date_cls.today().isoformat()}"
+        headers = {'Authorization': f"Bearer {options['token']}"} if options['token'] else {}
+
+        servers = self.spawn_servers(options) if options['spawn'] else []
+        try:
+            rows = []
+            for name in endpoints:
+                sync_path, async_path = ENDPOINTS[name]
+                if name in ('doctor-availability', 'available-slots'):
+                    sync_path, async_path = sync_path + query, async_path + query
+                for server, url, path in (('wsgi', options['wsgi_url'], sync_path),
+                                          ('asgi', options['asgi_url'], async_path)):
+                    asyncio.run(load(url, path, options['concurrency'], options['warmup'], headers))
+                    result = asyncio.run(load(url, path, options['concurrency'], options['duration'], headers))
+                    rows.append((name, server, result))
+        finally:
+            for process in servers:
+                process.terminate()
+            for process in servers:
+                process.wait(timeout=10)
+
+        self.stdout.write(f"{'endpoint':<22}{'server':<8}{'requests':>10}{'errors':>8}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+        for name, server, result in rows:
+            self.stdout.write(
+                f"{name:<22}{server:<8}{result['requests']:>10}{result['errors']:>8}"
+                f"{result['rps']:>10.1f}{result['p50']:>10.1f}{result['p99']:>10.1f}"
+            )
+
+    def spawn_servers(self, options):
+        wsgi, asgi = urlsplit(options['wsgi_url']), urlsplit(options['asgi_url'])
+        commands = [
+            [sys.executable, '-m', 'gunicorn', 'hospital_website.wsgi:application',
+             '--bind', f'{wsgi.hostname}:{wsgi.port}', '--workers', str(options['workers']),
+             '--worker-class', 'gthread', '--threads', str(options['threads']), '--log-level', 'warning'],
+            [sys.executable, '-m', 'uvicorn', 'hospital_website.asgi:application',
+             '--host', asgi.hostname, '--port', str(asgi.port), '--workers', str(options['workers']),
+             '--no-access-log', '--log-level', 'warning'],
+        ]
+        processes = [subprocess.Popen(command, cwd=settings.BASE_DIR) for command in commands]
+        try:
+            wait_for_port(wsgi.hostname, wsgi.port)
+            wait_for_port(asgi.hostname, asgi.port)
+        except CommandError:
+            for process in processes:
+                process.terminate()
+            raise
+        return processes
@@ -0,0 +1,95 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils.module_loading import import_string
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+# List endpoints whose query count must not grow with the page size
+ENDPOINTS = [
+    'hospital.views.PatientViewSet',
+    'hospital.views.DoctorViewSet',
+    'hospital.views.AppointmentViewSet',
+    'hospital.views.MedicalRecordViewSet',
+    'hospital.views.DoctorScheduleViewSet',
+    'hospital.api.views.DoctorViewSet',
+    'hospital.api.views.PatientViewSet',
+    'hospital.api.views.AppointmentViewSet',
+    'hospital.api.views.ServiceViewSet',
+    'apps.appointments.views.TimeSlotViewSet',
+    'apps.appointments.views.AppointmentViewSet',
+]
+
+
+def count_queries(viewset, user, page_size):
+    """Run the list action of a viewset with the given page size; return (queries, rows listed)."""
+    attrs = {}
+    if viewset.pagination_class is not None:
+        attrs['pagination_class'] = type(
+            'SizedPagination', (viewset.pagination_class,), {'page_size': page_size}
+        )
+    view = type(viewset.__name__, (viewset,), attrs).as_view({'get': 'list'})
+
+    request = APIRequestFactory().get('/')
+    force_authenticate(request, user=user)
+    with CaptureQueriesContext(connection) as context:
+        response = view(request)
+        response.render()
+    if response.status_code != 200:
+        raise CommandError(f'{viewset.__module__}.{viewset.__name__} returned {response.status_code}')
+    data = response.data
+    rows = data.get('results', []) if isinstance(data, dict) else data
+    return len(context.captured_queries), len(rows)
+
+
+class Command(BaseCommand):
+    help = 'Assert that list endpoints run a fixed number of queries regardless of page size'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Email of the user to authenticate as (defaults to a superuser)')
+        parser.add_argument('--sizes', default='1,20', help='Comma-separated page sizes to compare')
+        parser.add_argument('--endpoint', action='append', dest='endpoints',
+                            help='Dotted path of a viewset to check (repeatable)')
+        parser.add_argument('--skip-short', action='store_true',
+                            help='Only warn about endpoints listing fewer rows than the page sizes')
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        if options['user']:
+            user = User.objects.filter(email=options['user']).first()
+        else:
+            user = User.objects.filter(is_superuser=True).first()
+        if user is None:
+            raise CommandError('No user to authenticate as')
+
+        sizes = [int(size) for size in options['sizes'].split(',')]
+        failures = short = 0
+        for path in options['endpoints'] or ENDPOINTS:
+            viewset = import_string(path)
+            # Warm up content types, permissions and other per-process caches
+            count_queries(viewset, user, sizes[0])
+            results = [count_queries(viewset, user, size) for size in sizes]
+            counts = [count for count, _ in results]
+            summary = ', '.join(f'page_size={size}: {count}' for size, count in zip(sizes, counts))
+            # A page shorter than its size cannot show an N+1, so equal counts prove nothing
+            listed = [rows for _, rows in results]
+            if any(rows < size for size, rows in zip(sizes, listed)):
+                short += 1
+                rows = ', '.join(f'page_size={size}: {rows} rows' for size, rows in zip(sizes, listed))
+                style = self.style.WARNING if options['skip_short'] else self.style.ERROR
+                self.stdout.write(style(f'{path}: not enough rows to compare ({rows})'))
+                continue
+            if len(set(counts)) == 1:
+                self.stdout.write(f'{path}: {summary}')
+            else:
+                failures += 1
+                self.stdout.write(self.style.ERROR(f'{path}: {summary}'))
+
+        if failures:
+            raise CommandError(f'{failures} endpoints scale their queries with the page size')
+        if short and not options['skip_short']:
+            raise CommandError(
+                f'{short} endpoints listed fewer rows than the page sizes; seed data first '
+                '(manage.py generate_load_data) or pass --skip-short'
+            )
+        self.stdout.write(self.style.SUCCESS('All endpoints run a constant number of queries'))
@@ -0,0 +1,129 @@
+import re
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from apps.appointments import availability
+from apps.appointments.models import Appointment as ClinicAppointment, TimeSlot
+from apps.medical_records.models import MedicalRecord as ClinicRecord
+from hospital.models import Appointment, DoctorSchedule, MedicalRecord
+from hospital.slot_grid import day_bounds
+
+SEQ_SCAN = re.compile(r'Seq Scan on (\w+)|\bSCAN (\w+)$')
+
+
+def first_id(queryset, field='id'):
+    return queryset.values_list(field, flat=True).first() or 0
+
+
+def sample_values():
+    """Ids of real rows, so the plans use the seeded data distribution."""
+    from apps.doctors.models import Doctor as ClinicDoctor
+    from apps.patients.models import Patient as ClinicPatient
+    from hospital.models import Doctor, Patient
+
+    today = timezone.localdate()
+    tomorrow = today + timedelta(days=1)
+    return {
+        'today': today,
+        'today_bounds': day_bounds(today, today),
+        'tomorrow_bounds': day_bounds(tomorrow, tomorrow),
+        'clinic_doctor': first_id(ClinicDoctor.objects.all()),
+        'clinic_patient_user': first_id(ClinicPatient.objects.all(), 'user_id'),
+        'clinic_patient': first_id(ClinicPatient.objects.all()),
+        'doctor': first_id(Doctor.objects.all()),
+        'patient': first_id(Patient.objects.all()),
+        'patient_user': first_id(Patient.objects.all(), 'user_id'),
+    }
+
+
+# (name, where the shape comes from, queryset builder)
+HOT_QUERIES = [
+    ('clinic_upcoming', 'AppointmentViewSet.upcoming', lambda s: ClinicAppointment.objects.filter(
+        patient__user_id=s['clinic_patient_user'], appointment_date__gte=s['today'],
+        status__in=availability.ACTIVE_STATUSES)),
+    ('clinic_doctor_list', 'AppointmentViewSet.get_queryset', lambda s: ClinicAppointment.objects.filter(
+        doctor_id=s['clinic_doctor']).order_by('-appointment_date', 'time_slot__start_time')[:20]),
+    ('clinic_keyset_page', 'HybridPagination', lambda s: ClinicAppointment.objects.order_by(
+        '-appointment_date', 'time_slot__start_time', 'id')[:21]),
+    ('clinic_booked_slots', 'availability.get_bitmaps', lambda s: ClinicAppointment.objects.filter(
+        doctor_id__in=[s['clinic_doctor']], appointment_date__range=(s['today'], s['today'] + timedelta(days=30)),
+        status__in=availability.ACTIVE_STATUSES).values_list('doctor_id', 'appointment_date', 'time_slot_id')),
+    ('clinic_reminders', 'send_appointment_reminder', lambda s: ClinicAppointment.objects.filter(
+        appointment_date=s['today'] + timedelta(days=1), status__in=availability.ACTIVE_STATUSES)),
+    ('clinic_no_show_sweep', 'cleanup_expired_appointments', lambda s: ClinicAppointment.objects.filter(
+        appointment_date__lt=s['today'], status__in=availability.ACTIVE_STATUSES).order_by('id')[:500]),
+    ('clinic_slot_layout', 'availability.get_layouts', lambda s: TimeSlot.objects.filter(
+        doctor_id__in=[s['clinic_doctor']]).order_by('doctor_id', 'start_time', 'id')),
+    ('clinic_patient_records', 'MedicalRecord by patient', lambda s: ClinicRecord.objects.filter(
+        patient_id=s['clinic_patient']).order_by('-record_date')[:20]),
+    ('clinic_patient_timeline', 'timeline.get_page', lambda s: ClinicAppointment.objects.filter(
+        patient_id=s['clinic_patient']).order_by('-appointment_date', '-time_slot__start_time', '-id')[:21]),
+    ('available_slots', 'AvailableSlotsView', lambda s: Appointment.objects.filter(
+        doctor_id=s['doctor'], date_time__gte=s['today_bounds'][0],
+        date_time__lt=s['today_bounds'][1]).exclude(status='CANCELLED')),
+    ('doctor_schedule', 'AvailableSlotsView', lambda s: DoctorSchedule.objects.filter(
+        doctor_id=s['doctor'], date=s['today'], is_available=True)),
+    ('reminders', 'check_and_send_appointment_reminders', lambda s: Appointment.objects.filter(
+        date_time__gte=s['tomorrow_bounds'][0], date_time__lt=s['tomorrow_bounds'][1])),
+    ('patient_appointments', 'api AppointmentViewSet.get_queryset', lambda s: Appointment.objects.filter(
+        patient__user_id=s['patient_user']).order_by('-date_time')[:20]),
+    ('keyset_page', 'HybridPagination', lambda s: Appointment.objects.order_by('-date_time', 'id')[:21]),
+    ('patient_records', 'MedicalRecordViewSet', lambda s: MedicalRecord.objects.filter(
+        patient_id=s['patient']).order_by('-date')[:20]),
+]
+
+
+def explain(queryset):
+    if connection.vendor == 'postgresql':
+        return queryset.explain(analyze=True, buffers=True)
+    return queryset.explain()
+
+
+def sequential_scans(plan):
+    tables = []
+    for line in plan.splitlines():
+        match = SEQ_SCAN.search(line.strip())
+        if match:
+            tables.append(match.group(1) or match.group(2))
+    return tables
+
+
+class Command(BaseCommand):
+    help = 'Run EXPLAIN (ANALYZE on PostgreSQL) on the hot queries and flag sequential scans'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--query', action='append', dest='queries',
+                            help='Name of a query to explain (repeatable)')
+        parser.add_argument('--strict', action='store_true',
+                            help='Exit with an error when any query scans a table sequentially')
+
+    def handle(self, *args, **options):
+        names = {name for name, _, _ in HOT_QUERIES}
+        unknown = set(options['queries'] or ()) - names
+        if unknown:
+            raise CommandError(f'Unknown queries: {", ".join(sorted(unknown))}')
+
+        values = sample_values()
+        flagged = 0
+        for name, source, build in HOT_QUERIES:
+            if options['queries'] and name not in options['queries']:
+                continue
+            plan = explain(build(values))
+            scans = sequential_scans(plan)
+            if scans:
+                flagged += 1
+                self.stdout.write(self.style.WARNING(
+                    f'{name} ({source}): sequential scan on {", ".join(scans)}'
+                ))
+            else:
+                self.stdout.write(f'{name} ({source}): ok')
+            if options['verbosity'] > 1 or scans:
+                self.stdout.write(plan)
+
+        if flagged and options['strict']:
+            raise CommandError(f'{flagged} hot queries scan tables sequentially')
+        if not flagged:
+            self.stdout.write(self.style.SUCCESS('No sequential scans'))
@@ -0,0 +1,322 @@
+import multiprocessing
+import random
+from datetime import date, datetime, time, timedelta
+from time import monotonic
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+from django.utils import timezone
+
+from apps.appointments.models import Appointment, TimeSlot
+from apps.doctors.models import Doctor, Specialization
+from apps.medical_records.models import LabResult, MedicalRecord, Prescription, Vaccination
+from apps.patients.models import Patient
+
+EMAIL_DOMAIN = 'loadtest.example'
+PASSWORD = 'loadtest'
+
+FIRST_NAMES = [
+    'Aisha', 'Ben', 'Carlos', 'Dana', 'Elif', 'Farid', 'Grace', 'Hiro', 'Ines', 'Jonas', 'Kemi', 'Liam',
+    'Maya', 'Nikhil', 'Olga', 'Pablo', 'Quinn', 'Rosa', 'Sven', 'Tara', 'Umar', 'Vera', 'Wei', 'Yara', 'Zoe',
+]
+LAST_NAMES = [
+    'Adams', 'Bauer', 'Chen', 'Diallo', 'Evans', 'Fischer', 'Garcia', 'Haddad', 'Ivanova', 'Jensen', 'Kowalski',
+    'Lopez', 'Moreau', 'Nakamura', 'Okafor', 'Patel', 'Rossi', 'Silva', 'Tanaka', 'Novak', 'Weber', 'Yilmaz',
+]
+SPECIALIZATIONS = [
+    'Cardiology', 'Dermatology', 'Endocrinology', 'Gastroenterology', 'General Practice', 'Neurology',
+    'Obstetrics', 'Oncology', 'Ophthalmology', 'Orthopedics', 'Pediatrics', 'Psychiatry', 'Pulmonology',
+    'Radiology', 'Urology',
+]
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+REASONS = [
+    'Routine check-up', 'Follow-up visit', 'Persistent cough', 'Back pain', 'Headaches', 'Skin rash',
+    'Chest pain', 'Blood pressure review', 'Vaccination', 'Lab results review', 'Fatigue', 'Joint pain',
+]
+MEDICINES = ['Amoxicillin', 'Ibuprofen', 'Metformin', 'Lisinopril', 'Atorvastatin', 'Omeprazole', 'Salbutamol']
+LAB_TESTS = [
+    ('Hemoglobin', 'g/dL', 12.0, 17.5), ('Glucose', 'mg/dL', 70, 100), ('Cholesterol', 'mg/dL', 125, 200),
+    ('TSH', 'mIU/L', 0.4, 4.0), ('Creatinine', 'mg/dL', 0.6, 1.3),
+]
+VACCINES = ['Influenza', 'Tetanus', 'Hepatitis B', 'MMR', 'COVID-19']
+
+# Relative weights, like a clinic a few months after go-live
+PAST_STATUSES = [('completed', 78), ('cancelled', 10), ('no_show', 7), ('confirmed', 3), ('scheduled', 2)]
+FUTURE_STATUSES = [('scheduled', 70), ('confirmed', 22), ('cancelled', 8)]
+PRIORITIES = [('normal', 90), ('urgent', 8), ('emergency', 2)]
+RECORD_TYPES = [
+    ('diagnosis', 30), ('treatment', 20), ('lab_result', 20), ('prescription', 20), ('vaccination', 6),
+    ('allergy', 2), ('surgery', 1), ('other', 1),
+]
+
+
+def shard_rng(seed, kind, shard):
+    # String seeds are hashed deterministically, unlike hash() of a tuple
+    return random.Random(f'{seed}:{kind}:{shard}')
+
+
+def weighted(rng, choices):
+    values, weights = zip(*choices)
+    return rng.choices(values, weights)[0]
+
+
+def shards(total, size):
+    return [(start, min(start + size, total)) for start in range(0, total, size)]
+
+
+def create_users(rng, kind, indexes, user_type, password, batch_size):
+    User = get_user_model()
+    users = []
+    for index in indexes:
+        first_name, last_name = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        users.append(User(
+            email=f'{kind}{index}@{EMAIL_DOMAIN}', username=f'{kind}{index}.{EMAIL_DOMAIN}',
+            first_name=first_name, last_name=last_name, user_type=user_type, password=password,
+            date_of_birth=date(1940, 1, 1) + timedelta(days=rng.randrange(365 * 65)),
+        ))
+    return User.objects.bulk_create(users, batch_size=batch_size)
+
+
+def generate_doctors(options, shard, bounds, password):
+    rng = shard_rng(options['seed'], 'doctors', shard)
+    specializations = list(Specialization.objects.filter(name__in=SPECIALIZATIONS).order_by('id'))
+    with transaction.atomic():
+        users = create_users(rng, 'doctor', range(*bounds), 'doctor', password, options['batch_size'])
+        doctors = []
+        for index, user in zip(range(*bounds), users):
+            start_hour = rng.choice([7, 8, 8, 9, 9, 10])
+            days = WEEKDAYS[:5] if rng.random() < 0.8 else WEEKDAYS[:6]
+            doctors.append(Doctor(
+                user=user, license_number=f'LT-{index:07d}', qualification='MD',
+                experience_years=rng.randint(1, 35), consultation_fee=rng.choice([50, 75, 100, 150, 200]),
+                available_days=','.join(days),
+                available_time_start=time(start_hour),
+                available_time_end=time(start_hour + rng.choice([6, 8, 8, 9])),
+                slot_duration_minutes=rng.choice([15, 20, 30, 30, 30]),
+            ))
+        doctors = Doctor.objects.bulk_create(doctors, batch_size=options['batch_size'])
+
+        Doctor.specializations.through.objects.bulk_create([
+            Doctor.specializations.through(doctor_id=doctor.id, specialization_id=specialization.id)
+            for doctor in doctors
+            for specialization in rng.sample(specializations, rng.choice([1, 1, 2]))
+        ], batch_size=options['batch_size'])
+
+        slots = []
+        for doctor in doctors:
+            minute = doctor.available_time_start.hour * 60
+            end = doctor.available_time_end.hour * 60
+            while minute + doctor.slot_duration_minutes <= end:
+                slots.append(TimeSlot(
+                    doctor=doctor,
+                    start_time=time(*divmod(minute, 60)),
+                    end_time=time(*divmod(minute + doctor.slot_duration_minutes, 60)),
+                ))
+                minute += doctor.slot_duration_minutes
+        TimeSlot.objects.bulk_create(slots, batch_size=options['batch_size'])
+    return len(users) + len(doctors) + len(slots)
+
+
+def generate_patients(options, shard, bounds, password):
+    rng = shard_rng(options['seed'], 'patients', shard)
+    with transaction.atomic():
+        users = create_users(rng, 'patient', range(*bounds), 'patient', password, options['batch_size'])
+        patients = Patient.objects.bulk_create([
+            Patient(
+                user=user, blood_group=rng.choice(Patient.BLOOD_GROUP_CHOICES)[0],
+                gender='O' if rng.random() < 0.02 else rng.choice('MF'),
+                emergency_contact_name=f'{rng.choice(FIRST_NAMES)} {user.last_name}',
+                emergency_contact_phone=f'+1555{rng.randrange(10 ** 7):07d}',
+                emergency_contact_relationship=rng.choice(['Spouse', 'Parent', 'Sibling', 'Friend']),
+                allergies='Penicillin' if rng.random() < 0.08 else '',
+                insurance_provider=rng.choice(['', 'Acme Health', 'CarePlus', 'MediShield']),
+            )
+            for user in users
+        ], batch_size=options['batch_size'])
+    return len(users) + len(patients)
+
+
+def build_children(rng, record):
+    """Child rows of a record, by record type."""
+    when = record.record_date
+    if record.record_type == 'lab_result':
+        children = []
+        for test_name, unit, low, high in rng.sample(LAB_TESTS, rng.randint(1, 3)):
+            value = rng.uniform(low * 0.7, high * 1.3)
+            children.append(LabResult(
+                medical_record=record, test_name=test_name, test_date=when, result_value=f'{value:.1f}',
+                normal_range=f'{low}-{high}', unit=unit, is_abnormal=not low <= value <= high,
+            ))
+        return children
+    if record.record_type in ('prescription', 'treatment'):
+        return [
+            Prescription(
+                medical_record=record, medicine_name=medicine, dosage=f'{rng.choice([5, 10, 20, 250, 500])} mg',
+                frequency=rng.choice(['Once daily', 'Twice daily', 'Every 8 hours']),
+                duration=f'{rng.choice([5, 7, 10, 30])} days', instructions='Take with water.',
+                is_active=when > timezone.now() - timedelta(days=30),
+            )
+            for medicine in rng.sample(MEDICINES, rng.randint(1, 3))
+        ]
+    if record.record_type == 'vaccination':
+        return [Vaccination(
+            medical_record=record, vaccine_name=rng.choice(VACCINES), dose_number=rng.randint(1, 3),
+            date_administered=when, administered_by='Clinic nurse', batch_number=f'B{rng.randrange(10 ** 6):06d}',
+        )]
+    return []
+
+
+def generate_appointments(options, shard, doctor_ids):
+    """Appointments of a group of doctors, with records for part of the completed ones."""
+    rng = shard_rng(options['seed'], 'appointments', shard)
+    # Parallel shards assign ids in any order; the seeded emails keep the choice stable
+    patient_ids = list(
+        Patient.objects.filter(user__email__endswith=f'@{EMAIL_DOMAIN}')
+        .order_by('user__email').values_list('id', flat=True)
+    )
+    if not patient_ids:
+        return 0
+    doctors = {doctor.id: doctor for doctor in Doctor.objects.filter(id__in=doctor_ids).select_related('user')}
+    slots = {}
+    for slot in TimeSlot.objects.filter(doctor_id__in=doctor_ids).order_by('doctor_id', 'start_time', 'id'):
+        slots.setdefault(slot.doctor_id, []).append(slot)
+
+    today = timezone.localdate()
+    first_day = today - timedelta(days=int(365 * options['years']))
+    days = (today - first_day).days + options['future_days']
+    created = 0
+    for doctor_id in doctor_ids:
+        doctor, doctor_slots = doctors[doctor_id], slots.get(doctor_id, [])
+        working = {WEEKDAYS.index(day) for day in doctor.get_available_days_list() if day in WEEKDAYS}
+        appointments = []
+        for offset in range(days):
+            day = first_day + timedelta(days=offset)
+            if day.weekday() not in working or not doctor_slots:
+                continue
+            booked = min(len(doctor_slots), max(0, int(rng.gauss(options['per_day'], options['per_day'] / 4))))
+            past = day < today
+            for slot in rng.sample(doctor_slots, booked):
+                appointments.append(Appointment(
+                    patient_id=rng.choice(patient_ids), doctor_id=doctor_id, appointment_date=day, time_slot=slot,
+                    status=weighted(rng, PAST_STATUSES if past else FUTURE_STATUSES),
+                    priority=weighted(rng, PRIORITIES), reason=rng.choice(REASONS),
+                ))
+
+        with transaction.atomic():
+            appointments = Appointment.objects.bulk_create(appointments, batch_size=options['batch_size'])
+            records = []
+            for appointment in appointments:
+                if appointment.status != 'completed' or rng.random() >= options['record_rate']:
+                    continue
+                record_date = timezone.make_aware(
+                    datetime.combine(appointment.appointment_date, appointment.time_slot.start_time)
+                )
+                records.append(MedicalRecord(
+                    patient_id=appointment.patient_id, doctor_id=doctor_id, appointment=appointment,
+                    record_type=weighted(rng, RECORD_TYPES), record_date=record_date,
+                    diagnosis=appointment.reason, notes='Generated for load testing.',
+                    is_confidential=rng.random() < 0.05, created_by_id=doctor.user_id,
+                ))
+            records = MedicalRecord.objects.bulk_create(records, batch_size=options['batch_size'])
+            children = {LabResult: [], Prescription: [], Vaccination: []}
+            for record in records:
+                for child in build_children(rng, record):
+                    children[type(child)].append(child)
+            for model, rows in children.items():
+                model.objects.bulk_create(rows, batch_size=options['batch_size'])
+        created += len(appointments) + len(records) + sum(len(rows) for rows in children.values())
+    return created
+
+
+def run_task(task):
+    function, args = task
+    try:
+        return function(*args)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Generate a deterministic, production-sized clinic dataset for load testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--doctors', type=int, default=200)
+        parser.add_argument('--patients', type=int, default=20000)
+        parser.add_argument('--years', type=float, default=2, help='Years of appointment history')
+        parser.add_argument('--future-days', type=int, default=60, help='Days of upcoming appointments')
+        parser.add_argument('--per-day', type=float, default=12,
+                            help='Average appointments per doctor and working day')
+        parser.add_argument('--record-rate', type=float, default=0.6,
+                            help='Share of completed appointments with a medical record')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count())
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--purge', action='store_true',
+                            help=f'Delete previously generated data (users @{EMAIL_DOMAIN}) and exit')
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        generated = User.objects.filter(email__endswith=f'@{EMAIL_DOMAIN}')
+        if options['purge']:
+            deleted, _ = generated.delete()
+            self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} rows'))
+            return
+        if generated.exists():
+            raise CommandError('Generated data already exists; run with --purge first')
+
+        workers = max(1, options['workers'])
+        if connection.vendor == 'sqlite' and workers > 1:
+            # SQLite allows a single writer
+            self.stdout.write('SQLite database: using one worker')
+            workers = 1
+
+        Specialization.objects.bulk_create([
+            Specialization(name=name) for name in SPECIALIZATIONS
+            if not Specialization.objects.filter(name=name).exists()
+        ])
+        # Hashing once keeps user creation at bulk_create speed
+        password = make_password(PASSWORD)
+        chunk = max(1, options['batch_size'])
+        # Only plain values go to the worker processes
+        settings = {key: options[key] for key in (
+            'seed', 'batch_size', 'years', 'future_days', 'per_day', 'record_rate'
+        )}
+
+        started = monotonic()
+        self.run_phase('doctors', workers, [
+            (generate_doctors, (settings, shard, bounds, password))
+            for shard, bounds in enumerate(shards(options['doctors'], max(1, chunk // 50)))
+        ])
+        self.run_phase('patients', workers, [
+            (generate_patients, (settings, shard, bounds, password))
+            for shard, bounds in enumerate(shards(options['patients'], chunk))
+        ])
+        # Grouped by license number, not id, so the same seed gives the same shards
+        doctor_ids = list(
+            Doctor.objects.filter(user__email__endswith=f'@{EMAIL_DOMAIN}')
+            .order_by('license_number').values_list('id', flat=True)
+        )
+        self.run_phase('appointments and records', workers, [
+            (generate_appointments, (settings, shard, doctor_ids[start:end]))
+            for shard, (start, end) in enumerate(shards(len(doctor_ids), 4))
+        ])
+
+        self.stdout.write(self.style.SUCCESS(f'Done in {monotonic() - started:.0f}s'))
+        self.stdout.write(
+            'Rows were bulk inserted without signals: run backfill_appointment_statistics, '
+            'check_slot_availability --repair, reindex_search and reindex_clinical_search '
+            'before benchmarking.'
+        )
+
+    def run_phase(self, name, workers, tasks):
+        started = monotonic()
+        if workers == 1:
+            rows = sum(run_task(task) for task in tasks)
+        else:
+            # Children must not inherit the parent's open connections
+            connections.close_all()
+            with multiprocessing.get_context('fork').Pool(workers) as pool:
+                rows = sum(pool.imap_unordered(run_task, tasks))
+        self.stdout.write(f'{name}: {rows} rows in {monotonic() - started:.1f}s')
@@ -0,0 +1,125 @@
+import asyncio
+import json
+import time
+from datetime import date as date_cls
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from hospital import realtime
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class Command(BaseCommand):
+    help = (
+        'Open many concurrent slot event streams against a running ASGI server, '
+        'publish events and report delivery and latency'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help='Base URL of the ASGI server')
+        parser.add_argument('--subscribers', type=int, default=2000)
+        parser.add_argument('--events', type=int, default=50)
+        parser.add_argument('--interval', type=float, default=0.05, help='Seconds between published events')
+        parser.add_argument('--doctor', type=int, default=1)
+        parser.add_argument('--date', default=None, help='Subscribed date, defaults to today')
+        parser.add_argument('--connect-concurrency', type=int, default=200)
+        parser.add_argument('--timeout', type=float, default=30.0, help='Seconds to wait for deliveries')
+
+    def handle(self, *args, **options):
+        if getattr(settings, 'REALTIME_BACKEND', 'redis') == 'memory':
+            raise CommandError('The memory backend only reaches subscribers in the publishing process; use redis')
+        options['date'] = options['date'] or date_cls.today().isoformat()
+        results = asyncio.run(self.run(options))
+
+        latencies = results['latencies']
+        expected = results['connected'] * options['events']
+        self.stdout.write(f"Subscribers connected: {results['connected']} (failed: {results['failed']})")
+        self.stdout.write(f"Connect time: {results['connect_seconds']:.2f}s")
+        self.stdout.write(f'Events delivered: {len(latencies)} / {expected}')
+        for label, fraction in (('p50', 0.5), ('p95', 0.95), ('p99', 0.99)):
+            self.stdout.write(f'Latency {label}: {percentile(latencies, fraction) * 1000:.1f} ms')
+        if latencies:
+            self.stdout.write(f'Latency max: {max(latencies) * 1000:.1f} ms')
+        if len(latencies) < expected:
+            self.stdout.write(self.style.WARNING('Some events were not delivered before the timeout'))
+        else:
+            self.stdout.write(self.style.SUCCESS('All events delivered'))
+
+    async def run(self, options):
+        url = urlsplit(options['url'])
+        host, port = url.hostname, url.port or 80
+        path = f"/realtime/slots/?doctor={options['doctor']}&date={options['date']}"
+        request = (
+            f'GET {path} HTTP/1.1\r\nHost: {url.netloc}\r\n'
+            'Accept: text/event-stream\r\n\r\n'
+        ).encode()
+
+        latencies = []
+        ready = []
+        failed = 0
+        semaphore = asyncio.Semaphore(options['connect_concurrency'])
+
+        async def subscribe():
+            nonlocal failed
+            async with semaphore:
+                try:
+                    reader, writer = await asyncio.open_connection(host, port)
+                    writer.write(request)
+                    await writer.drain()
+                    status = await reader.readline()
+                    if b' 200 ' not in status:
+                        raise ConnectionError(status.decode(errors='replace').strip())
+                    while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                        pass
+                except (OSError, ConnectionError):
+                    failed += 1
+                    return
+            ready.append(writer)
+            try:
+                while True:
+                    line = await reader.readline()
+                    if not line:
+                        break
+                    if line.startswith(b'data: '):
+                        data = json.loads(line[6:])
+                        if 'sent_at' in data:
+                            latencies.append(time.time() - data['sent_at'])
+            except (OSError, asyncio.CancelledError):
+                pass
+
+        started = time.perf_counter()
+        tasks = [asyncio.create_task(subscribe()) for _ in range(options['subscribers'])]
+        while len(ready) + failed < options['subscribers']:
+            await asyncio.sleep(0.05)
+        connect_seconds = time.perf_counter() - started
+
+        expected = len(ready) * options['events']
+        for index in range(options['events']):
+            event = 'slot_taken' if index % 2 == 0 else 'slot_freed'
+            await asyncio.to_thread(realtime.publish, options['doctor'], options['date'], event, index)
+            await asyncio.sleep(options['interval'])
+
+        deadline = time.monotonic() + options['timeout']
+        while len(latencies) < expected and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+
+        for writer in ready:
+            writer.close()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        return {
+            'connected': len(ready),
+            'failed': failed,
+            'connect_seconds': connect_seconds,
+            'latencies': latencies,
+        }
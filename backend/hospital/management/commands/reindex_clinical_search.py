@@ -0,0 +1,35 @@
+from time import monotonic
+
+from django.core.management.base import BaseCommand
+
+from apps.medical_records.models import MedicalRecord as ClinicRecord
+from hospital import clinical_search, search
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild the clinical search entries of the clinic medical records. '
+        'Run after bulk loads, which bypass the incremental updates.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Records per batch')
+
+    def handle(self, *args, **options):
+        # Creates the Postgres column and index when migrate has not yet
+        search.ensure_search_index()
+        started = monotonic()
+        batch_size = max(1, options['batch_size'])
+        ids = ClinicRecord.objects.order_by('id').values_list('id', flat=True)
+        total, last = 0, 0
+        while True:
+            batch = list(ids.filter(id__gt=last)[:batch_size])
+            if not batch:
+                break
+            clinical_search.sync_records(batch)
+            total += len(batch)
+            last = batch[-1]
+            self.stdout.write(f'{total} records indexed', ending='\r')
+        self.stdout.write(self.style.SUCCESS(
+            f'Clinical search entries of {total} records rebuilt in {monotonic() - started:.1f}s'
+        ))
@@ -0,0 +1,42 @@
+from time import monotonic
+
+from django.core.management.base import BaseCommand
+
+from hospital import search
+from hospital.models import SearchDocument
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild the full-text search documents of patients and appointments. '
+        'Run after bulk loads, which bypass the incremental updates.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kind', action='append', dest='kinds', choices=sorted(search.SOURCES),
+                            help='Document kind to rebuild (repeatable, defaults to all)')
+        parser.add_argument('--batch-size', type=int, default=search.BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        # Creates the Postgres column and index when migrate has not yet
+        search.ensure_search_index()
+        batch_size = max(1, options['batch_size'])
+        for kind in options['kinds'] or search.SOURCES:
+            started = monotonic()
+            ids = search.SOURCES[kind].model.objects.order_by('pk').values_list('pk', flat=True)
+            total, last = 0, 0
+            while True:
+                batch = list(ids.filter(pk__gt=last)[:batch_size])
+                if not batch:
+                    break
+                search.reindex(kind, batch)
+                total += len(batch)
+                last = batch[-1]
+
+            orphans, _ = SearchDocument.objects.filter(kind=kind).exclude(
+                object_id__in=search.SOURCES[kind].model.objects.values('pk')
+            ).delete()
+            self.stdout.write(
+                f'{kind}: {total} documents written, {orphans} orphans removed in {monotonic() - started:.1f}s'
+            )
+        self.stdout.write(self.style.SUCCESS('Search index rebuilt'))
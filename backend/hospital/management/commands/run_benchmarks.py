@@ -0,0 +1,286 @@
+import json
+import math
+from datetime import timedelta
+from itertools import count
+from pathlib import Path
+from time import perf_counter
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+from wagtail.models import Site
+
+from apps.appointments.models import Appointment as ClinicAppointment, TimeSlot
+from apps.appointments.views import AppointmentViewSet as ClinicAppointmentViewSet
+from apps.doctors.models import Doctor as ClinicDoctor
+from apps.patients.models import Patient as ClinicPatient
+from hospital.models import Appointment, Doctor
+from hospital.views import AppointmentViewSet
+
+DEFAULT_BASELINE = Path(settings.BASE_DIR) / 'benchmarks' / 'baseline.json'
+BENCHMARK_EMAIL = 'benchmark-admin@loadtest.example'
+
+
+class Context:
+    """Users and rows the scenarios run against."""
+
+    def __init__(self):
+        User = get_user_model()
+        self.staff = User.objects.filter(is_superuser=True).order_by('id').first()
+        if self.staff is None:
+            self.staff = User.objects.create_superuser(
+                email=BENCHMARK_EMAIL, username=BENCHMARK_EMAIL, password='benchmark',
+                first_name='Benchmark', last_name='Admin', user_type='admin',
+            )
+        self.clinic_doctor = ClinicDoctor.objects.annotate(
+            slot_count=Count('time_slots')
+        ).filter(slot_count__gt=0).order_by('id').first()
+        self.clinic_patient = ClinicPatient.objects.select_related('user').order_by('id').first()
+        self.doctor = Doctor.objects.order_by('id').first()
+        site = Site.objects.filter(is_default_site=True).select_related('root_page').first()
+        self.page_url = site.root_page.url if site else None
+
+        self.factory = APIRequestFactory()
+        self.client = Client()
+        self.client.force_login(self.staff)
+
+
+def api_call(ctx, view, method, path, data=None, user=None, **extra):
+    if method == 'post':
+        request = ctx.factory.post(path, data, format='json', **extra)
+    else:
+        request = ctx.factory.get(path, data, **extra)
+    force_authenticate(request, user=user or ctx.staff)
+    response = view(request)
+    if hasattr(response, 'render'):
+        response.render()
+    return response
+
+
+# Each scenario returns (run, cleanup) or None when the database lacks the rows or tables it needs
+
+def booking(ctx):
+    """AppointmentViewSet.perform_create, one fresh slot per request"""
+    if ctx.clinic_doctor is None or ctx.clinic_patient is None:
+        return None
+    doctor = ctx.clinic_doctor
+    slot_ids = list(TimeSlot.objects.filter(doctor=doctor).order_by('start_time').values_list('id', flat=True))
+    working = set(doctor.get_available_days_list())
+    # Far enough ahead to stay clear of generated and earlier bookings
+    first_day = timezone.localdate() + timedelta(days=400)
+    days = (
+        day for day in (first_day + timedelta(days=offset) for offset in count())
+        if day.strftime('%A') in working or not working
+    )
+    positions = ((day, slot_id) for day in days for slot_id in slot_ids)
+    view = ClinicAppointmentViewSet.as_view({'post': 'create'})
+    created = []
+
+    def run():
+        day, slot_id = next(positions)
+        response = api_call(ctx, view, 'post', '/', {
+            'patient': ctx.clinic_patient.id, 'doctor': doctor.id, 'appointment_date': day.isoformat(),
+            'time_slot': slot_id, 'reason': 'Benchmark booking',
+        })
+        if response.status_code == 201:
+            created.append(response.data['id'])
+        return response
+
+    def cleanup():
+        ClinicAppointment.objects.filter(id__in=created).delete()
+
+    return run, cleanup
+
+
+def available_slots(ctx):
+    """AppointmentViewSet.available_slots"""
+    if ctx.clinic_doctor is None:
+        return None
+    view = ClinicAppointmentViewSet.as_view({'get': 'available_slots'})
+    params = {'doctor': ctx.clinic_doctor.id, 'date': (timezone.localdate() + timedelta(days=1)).isoformat()}
+    return (lambda: api_call(ctx, view, 'get', '/', params)), None
+
+
+def available_slots_api(ctx):
+    """GET /api/v1/available-slots/"""
+    if ctx.doctor is None:
+        return None
+    params = {'doctor': ctx.doctor.id, 'date': timezone.localdate().isoformat()}
+    return (lambda: ctx.client.get('/api/v1/available-slots/', params)), None
+
+
+def upcoming(ctx):
+    """AppointmentViewSet.upcoming as the benchmarked doctor"""
+    if ctx.clinic_doctor is None:
+        return None
+    view = ClinicAppointmentViewSet.as_view({'get': 'upcoming'})
+    user = ctx.clinic_doctor.user
+    return (lambda: api_call(ctx, view, 'get', '/', user=user)), None
+
+
+def export_csv(ctx):
+    """hospital AppointmentViewSet.export_csv over the last 30 days"""
+    try:
+        # hospital.Patient and Doctor point at auth.User, whose table is
+        # missing where the custom user model replaced it
+        Appointment.objects.values_list('patient__user__email', 'doctor__user__email').first()
+    except DatabaseError:
+        return None
+    view = AppointmentViewSet.as_view({'get': 'export_csv'})
+    params = {'start': (timezone.localdate() - timedelta(days=30)).isoformat()}
+    return (lambda: api_call(ctx, view, 'get', '/', params)), None
+
+
+def calendar_feed(ctx):
+    """GET /hospital/calendar/events/ for the next four weeks"""
+    today = timezone.localdate()
+    params = {'start': today.isoformat(), 'end': (today + timedelta(days=28)).isoformat()}
+    return (lambda: ctx.client.get('/hospital/calendar/events/', params)), None
+
+
+def wagtail_page(ctx):
+    """Serving the default site's root page"""
+    if ctx.page_url is None:
+        return None
+    return (lambda: ctx.client.get(ctx.page_url)), None
+
+
+def wagtail_pages_api(ctx):
+    """GET /api/v1/wagtail/pages/"""
+    return (lambda: ctx.client.get('/api/v1/wagtail/pages/')), None
+
+
+SCENARIOS = {
+    'booking': booking,
+    'available_slots': available_slots,
+    'available_slots_api': available_slots_api,
+    'upcoming': upcoming,
+    'export_csv': export_csv,
+    'calendar_feed': calendar_feed,
+    'wagtail_page': wagtail_page,
+    'wagtail_pages_api': wagtail_pages_api,
+}
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def measure(run, iterations, warmup):
+    """Latency percentiles, throughput and the highest query count of `iterations` calls."""
+    for _ in range(warmup):
+        consume(run())
+    timings, queries = [], 0
+    for _ in range(iterations):
+        with CaptureQueriesContext(connection) as context:
+            started = perf_counter()
+            response = run()
+            consume(response)
+            timings.append((perf_counter() - started) * 1000)
+        # Redirects and errors would time something other than the view
+        if not (200 <= response.status_code < 300 or response.status_code == 304):
+            raise CommandError(f'returned {response.status_code}: {getattr(response, "content", b"")[:200]!r}')
+        queries = max(queries, len(context.captured_queries))
+    return {
+        'p50_ms': round(percentile(timings, 0.5), 2),
+        'p95_ms': round(percentile(timings, 0.95), 2),
+        'rps': round(len(timings) / (sum(timings) / 1000), 1),
+        'queries': queries,
+    }
+
+
+def consume(response):
+    # Streaming responses do their work while they are iterated
+    if getattr(response, 'streaming', False):
+        for _ in response.streaming_content:
+            pass
+
+
+def regressions(results, baseline, latency_threshold, query_threshold):
+    found = []
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if reference is None:
+            continue
+        if result['p95_ms'] > reference['p95_ms'] * (1 + latency_threshold):
+            found.append(f"{name}: p95 {result['p95_ms']} ms vs baseline {reference['p95_ms']} ms")
+        if result['queries'] > reference['queries'] + query_threshold:
+            found.append(f"{name}: {result['queries']} queries vs baseline {reference['queries']}")
+    return found
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark the key endpoints and compare p95 latency and query counts with a JSON baseline. '
+        'Latency baselines only compare on the machine and database they were recorded on.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenario', action='append', dest='scenarios', choices=sorted(SCENARIOS),
+                            help='Scenario to run (repeatable, defaults to all)')
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--baseline', default=str(DEFAULT_BASELINE), help='Baseline JSON file')
+        parser.add_argument('--update-baseline', action='store_true',
+                            help='Write the results as the new baseline instead of comparing')
+        parser.add_argument('--latency-threshold', type=float, default=0.25,
+                            help='Allowed p95 growth as a fraction of the baseline')
+        parser.add_argument('--query-threshold', type=int, default=0,
+                            help='Allowed extra queries per request over the baseline')
+        parser.add_argument('--setup', action='store_true',
+                            help='Generate a small dataset first when the database has no generated data')
+
+    def handle(self, *args, **options):
+        if options['setup'] and not ClinicAppointment.objects.exists():
+            call_command('generate_load_data', doctors=20, patients=2000, years=0.5, workers=1,
+                         stdout=self.stdout)
+
+        ctx = Context()
+        results = {}
+        for name in options['scenarios'] or SCENARIOS:
+            scenario = SCENARIOS[name](ctx)
+            if scenario is None:
+                self.stdout.write(f'{name}: skipped, the database lacks the rows or tables it needs')
+                continue
+            run, cleanup = scenario
+            try:
+                results[name] = measure(run, max(1, options['iterations']), options['warmup'])
+            except CommandError as e:
+                raise CommandError(f'{name} {e}')
+            finally:
+                if cleanup is not None:
+                    cleanup()
+            result = results[name]
+            self.stdout.write(
+                f"{name}: p50 {result['p50_ms']} ms, p95 {result['p95_ms']} ms, "
+                f"{result['rps']} req/s, {result['queries']} queries"
+            )
+
+        path = Path(options['baseline'])
+        if options['update_baseline']:
+            baseline = json.loads(path.read_text()) if path.exists() else {}
+            baseline.update(results)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(json.dumps(baseline, indent=2, sort_keys=True) + '\n')
+            self.stdout.write(self.style.SUCCESS(f'Baseline written to {path}'))
+            return
+        if not path.exists():
+            self.stdout.write(f'No baseline at {path}; run with --update-baseline to record one')
+            return
+
+        found = regressions(
+            results, json.loads(path.read_text()), options['latency_threshold'], options['query_threshold']
+        )
+        if found:
+            for line in found:
+                self.stdout.write(self.style.ERROR(line))
+            raise CommandError(f'{len(found)} regressions against {path}')
+        self.stdout.write(self.style.SUCCESS('No regressions against the baseline'))
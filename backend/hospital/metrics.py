@@ -0,0 +1,264 @@
+"""
+Prometheus metrics shared by every web and Celery process.
+
+Counters and histograms are buffered per process and flushed to Redis
+hashes every FLUSH_SECONDS by a background thread (HINCRBYFLOAT, so all
+gunicorn workers and Celery children add to the same series); /metrics
+renders the hashes in the Prometheus text format. Without django_redis the
+series stay in process memory.
+
+Reported:
+
+- http_request_duration_seconds{view, method, status}: MetricsMiddleware
+- appointment_bookings_total{path, outcome}: the booking endpoints
+- cache_requests_total / cache_hit_ratio{family}: hospital.caching counters
+- celery_task_duration_seconds{task, state} and
+  celery_task_queue_lag_seconds{task}: tasks of hospital.tasks and
+  apps.appointments.tasks, from Celery's publish and run signals
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+
+from celery.signals import before_task_publish, task_postrun, task_prerun
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseForbidden
+
+from . import caching
+from .invalidation import _redis
+
+logger = logging.getLogger(__name__)
+
+FLUSH_SECONDS = 1.0
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+TASK_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 300.0, 900.0)
+CACHE_FAMILIES = (
+    'all_doctors', 'available_slots', 'appointment_statistics', 'calendar_week', 'page_lists', 'patient_summary'
+)
+TASK_MODULES = ('hospital.tasks.', 'apps.appointments.tasks.')
+PUBLISHED_HEADER = 'published_at'
+
+_lock = threading.Lock()
+_pending = defaultdict(float)
+_local = defaultdict(float)
+_flusher_pid = None
+_metrics = []
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values):
+    return ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+
+
+def _add(metric, field, amount):
+    global _flusher_pid
+    with _lock:
+        _pending[(metric, field)] += amount
+        # Threads do not survive a fork, so every worker starts its own
+        if _flusher_pid != os.getpid():
+            _flusher_pid = os.getpid()
+            threading.Thread(target=_flush_forever, name='metrics-flush', daemon=True).start()
+
+
+def _storage_key(metric):
+    return cache.make_key(f'metrics:{metric}')
+
+
+def flush():
+    with _lock:
+        pending = dict(_pending)
+        _pending.clear()
+    if not pending:
+        return
+    connection = _redis()
+    if connection is None:
+        with _lock:
+            for key, amount in pending.items():
+                _local[key] += amount
+        return
+    pipe = connection.pipeline(transaction=False)
+    for (metric, field), amount in pending.items():
+        pipe.hincrbyfloat(_storage_key(metric), field, amount)
+    pipe.execute()
+
+
+def _flush_forever():
+    while True:
+        time.sleep(FLUSH_SECONDS)
+        try:
+            flush()
+        except Exception:
+            logger.exception('Could not flush metrics')
+
+
+atexit.register(flush)
+
+
+def _read(metric):
+    connection = _redis()
+    if connection is None:
+        with _lock:
+            return {field: value for (name, field), value in _local.items() if name == metric}
+    return {field.decode(): float(value) for field, value in connection.hgetall(_storage_key(metric)).items()}
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        _metrics.append(self)
+
+    def inc(self, *labelvalues, amount=1):
+        _add(self.name, _labels(self.labelnames, labelvalues), amount)
+
+    def samples(self):
+        for labels, value in sorted(_read(self.name).items()):
+            yield f'{self.name}{{{labels}}}' if labels else self.name, value
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        _metrics.append(self)
+
+    def observe(self, value, *labelvalues):
+        labels = _labels(self.labelnames, labelvalues)
+        # Only the bucket the value falls in is stored; rendering accumulates
+        bucket = next((bound for bound in self.buckets if value <= bound), '+Inf')
+        _add(self.name, f'{labels}|bucket|{bucket}', 1)
+        _add(self.name, f'{labels}|sum', value)
+        _add(self.name, f'{labels}|count', 1)
+
+    def samples(self):
+        series = defaultdict(dict)
+        for field, value in _read(self.name).items():
+            labels, _, part = field.partition('|')
+            series[labels][part] = value
+        for labels, parts in sorted(series.items()):
+            prefix = f'{labels},' if labels else ''
+            running = 0
+            for bound in self.buckets + ('+Inf',):
+                running += parts.get(f'bucket|{bound}', 0)
+                yield f'{self.name}_bucket{{{prefix}le="{bound}"}}', running
+            suffix = f'{{{labels}}}' if labels else ''
+            yield f'{self.name}_sum{suffix}', parts.get('sum', 0)
+            yield f'{self.name}_count{suffix}', parts.get('count', 0)
+
+
+request_duration = Histogram(
+    'http_request_duration_seconds', 'Request latency by view', ['view', 'method', 'status']
+)
+bookings = Counter(
+    'appointment_bookings_total', 'Booking attempts by endpoint and outcome', ['path', 'outcome']
+)
+task_duration = Histogram(
+    'celery_task_duration_seconds', 'Celery task run time', ['task', 'state'], buckets=TASK_BUCKETS
+)
+task_queue_lag = Histogram(
+    'celery_task_queue_lag_seconds', 'Time between publishing a task and a worker starting it', ['task'],
+    buckets=TASK_BUCKETS
+)
+
+
+def record_booking(path, outcome):
+    """outcome is 'success' or 'conflict'."""
+    bookings.inc(path, outcome)
+
+
+def _format(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def render():
+    lines = []
+    for metric in _metrics:
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        lines.extend(f'{sample} {_format(value)}' for sample, value in metric.samples())
+
+    stats = caching.get_stats(CACHE_FAMILIES)
+    lines.append('# HELP cache_requests_total Named cache lookups by result')
+    lines.append('# TYPE cache_requests_total counter')
+    for family, fields in stats.items():
+        for result in ('hits', 'stale', 'misses'):
+            lines.append(f'cache_requests_total{{family="{family}",result="{result}"}} {fields[result]}')
+    lines.append('# HELP cache_hit_ratio Share of named cache lookups served from the cache (stale included)')
+    lines.append('# TYPE cache_hit_ratio gauge')
+    for family, fields in stats.items():
+        lookups = fields['hits'] + fields['stale'] + fields['misses']
+        if lookups:
+            ratio = (fields['hits'] + fields['stale']) / lookups
+            lines.append(f'cache_hit_ratio{{family="{family}"}} {ratio:.4f}')
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if token and request.META.get('HTTP_AUTHORIZATION') != f'Bearer {token}':
+        return HttpResponseForbidden()
+    return HttpResponse(render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        response = self.get_response(request)
+        match = request.resolver_match
+        request_duration.observe(
+            time.perf_counter() - started,
+            match.view_name if match else 'unresolved',
+            request.method,
+            f'{response.status_code // 100}xx',
+        )
+        return response
+
+
+# Celery
+
+def _tracked(task_name):
+    return bool(task_name) and task_name.startswith(TASK_MODULES)
+
+
+@before_task_publish.connect(dispatch_uid='metrics_task_published')
+def stamp_published(sender=None, headers=None, **kwargs):
+    if headers is not None and _tracked(sender):
+        headers[PUBLISHED_HEADER] = time.time()
+
+
+@task_prerun.connect(dispatch_uid='metrics_task_started')
+def task_started(sender=None, task=None, **kwargs):
+    if task is None or not _tracked(task.name):
+        return
+    published_at = task.request.get(PUBLISHED_HEADER)
+    if published_at is None:
+        published_at = (getattr(task.request, 'headers', None) or {}).get(PUBLISHED_HEADER)
+    if published_at is not None:
+        task_queue_lag.observe(max(0.0, time.time() - float(published_at)), task.name)
+    task.request.metrics_started = time.perf_counter()
+
+
+@task_postrun.connect(dispatch_uid='metrics_task_finished')
+def task_finished(sender=None, task=None, state=None, **kwargs):
+    if task is None or not _tracked(task.name):
+        return
+    started = getattr(task.request, 'metrics_started', None)
+    if started is not None:
+        task_duration.observe(time.perf_counter() - started, task.name, state or 'UNKNOWN')
@@ -1,4 +1,6 @@
 from django.db import models
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
 from wagtail.models import Page
 from wagtail.fields import RichTextField, StreamField
 from wagtail.admin.panels import FieldPanel, MultiFieldPanel, InlinePanel
@@ -126,6 +128,17 @@ class Appointment(models.Model):
 
     class Meta:
         ordering = ['-date_time']
+        indexes = [
+            # Keyset pages of the appointment lists
+            models.Index(fields=['-date_time', 'id'], name='appointment_date_time_id_idx'),
+            models.Index(fields=['patient', '-date_time'], name='appointment_patient_time_idx'),
+            # Slot and calendar reads skip cancelled appointments
+            models.Index(
+                fields=['doctor', 'date_time'],
+                condition=~models.Q(status='CANCELLED'),
+                name='appointment_doctor_active_idx',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.patient} - {self.doctor} - {self.date_time}"
@@ -153,6 +166,10 @@ class MedicalRecord(models.Model):
 
     class Meta:
         ordering = ['-date']
+        indexes = [
+            models.Index(fields=['-date', 'id'], name='medical_record_date_id_idx'),
+            models.Index(fields=['patient', '-date'], name='medrecord_patient_date_idx'),
+        ]
 
     def __str__(self):
         return f"{self.patient} - {self.date} - {self.diagnosis[:50]}"
@@ -182,6 +199,180 @@ class DoctorSchedule(models.Model):
         return f"{self.doctor.user.get_full_name()} - {self.date} ({self.start_time}-{self.end_time})"
 
 
+class ExportJob(models.Model):
+    """A background export split into chunks that workers process in parallel."""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+
+    EXPORT_TYPE_CHOICES = [
+        ('medical_records', 'Medical records with prescriptions, lab results and vaccinations'),
+    ]
+
+    export_type = models.CharField(max_length=50, choices=EXPORT_TYPE_CHOICES)
+    parameters = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    total_rows = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL,
+                                   null=True, blank=True, related_name='export_jobs')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.get_export_type_display()} export #{self.pk} ({self.status})"
+
+
+class ExportChunk(models.Model):
+    """
+    A keyset range of an export job; last_id is the resume checkpoint.
+
+    A worker claims the chunk by switching it to running, and updated_at is
+    its lease (see exports.claim_export_chunk).
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+
+    job = models.ForeignKey(ExportJob, on_delete=models.CASCADE, related_name='chunks')
+    index = models.PositiveIntegerField()
+    start_id = models.BigIntegerField()
+    end_id = models.BigIntegerField()
+    last_id = models.BigIntegerField()
+    rows = models.PositiveIntegerField(default=0)
+    parts = models.PositiveIntegerField(default=0)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['job', 'index']
+        unique_together = ['job', 'index']
+
+    def __str__(self):
+        return f"Chunk {self.index} of export #{self.job_id}"
+
+    def part_path(self, part):
+        return f"{self.job_id}/chunk-{self.index:04d}-part-{part:05d}.ndjson.gz"
+
+
+class ReminderDelivery(models.Model):
+    """Delivery state of one notification email for one appointment and day."""
+    KIND_CHOICES = [
+        ('reminder', 'Appointment reminder'),
+        ('no_show', 'Missed appointment'),
+    ]
+
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.PositiveBigIntegerField()
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, default='reminder')
+    reminder_date = models.DateField()
+    recipient = models.EmailField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    error = models.TextField(blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ['content_type', 'object_id', 'kind', 'reminder_date', 'recipient']
+        verbose_name_plural = 'Reminder deliveries'
+
+    def __str__(self):
+        return f"{self.get_kind_display()} to {self.recipient} for {self.reminder_date} ({self.status})"
+
+
+class AppointmentDailyStat(models.Model):
+    """Appointment counts per local day, doctor and status (see hospital.appointment_stats)."""
+    date = models.DateField()
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='daily_stats')
+    status = models.CharField(max_length=20, choices=Appointment.STATUS_CHOICES)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ['date']
+        unique_together = ['date', 'doctor', 'status']
+
+    def __str__(self):
+        return f"{self.date} {self.doctor_id} {self.status}: {self.count}"
+
+
+class SearchDocument(models.Model):
+    """Denormalized search text of one patient or appointment (see hospital.search)."""
+    kind = models.CharField(max_length=30)
+    object_id = models.PositiveBigIntegerField()
+    body = models.TextField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['kind', 'object_id']
+
+    def __str__(self):
+        return f"{self.kind} #{self.object_id}"
+
+
+class ClinicalEntry(models.Model):
+    """
+    One searchable line of a clinic medical record: the record itself or one of
+    its prescriptions, lab results or vaccinations (see hospital.clinical_search).
+    """
+    ENTRY_TYPE_CHOICES = [
+        ('record', 'Medical record'),
+        ('prescription', 'Prescription'),
+        ('lab_result', 'Lab result'),
+        ('vaccination', 'Vaccination'),
+    ]
+
+    record = models.ForeignKey('medical_records.MedicalRecord', on_delete=models.CASCADE, related_name='+')
+    patient = models.ForeignKey('patients.Patient', on_delete=models.CASCADE, related_name='+')
+    entry_type = models.CharField(max_length=20, choices=ENTRY_TYPE_CHOICES)
+    entry_id = models.PositiveBigIntegerField()
+    record_type = models.CharField(max_length=20)
+    is_confidential = models.BooleanField(default=False)
+    is_abnormal = models.BooleanField(default=False)
+    entry_date = models.DateTimeField()
+    # Medicine, test or vaccine name, normalized like the body
+    name = models.CharField(max_length=200, blank=True)
+    body = models.TextField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['entry_type', 'entry_id']
+        verbose_name_plural = 'Clinical entries'
+        indexes = [
+            # Name prefix lookups (LIKE 'name%') per entry type
+            models.Index(
+                fields=['entry_type', 'name'],
+                opclasses=['varchar_pattern_ops', 'varchar_pattern_ops'],
+                name='clinical_entry_name_idx',
+            ),
+            models.Index(fields=['patient', '-entry_date'], name='clinical_entry_patient_idx'),
+            models.Index(fields=['record_type', 'entry_date'], name='clinical_entry_type_date_idx'),
+            models.Index(
+                fields=['entry_date'],
+                condition=models.Q(entry_type='lab_result', is_abnormal=True),
+                name='clinical_abnormal_lab_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.get_entry_type_display()} #{self.entry_id} of record #{self.record_id}"
+
+
 # Wagtail CMS models
 class CustomHTMLBlock(StructBlock):
     html_code = RawHTMLBlock(label='HTML Code')
@@ -467,9 +658,18 @@ class DoctorPage(Page):
         ('content_block', ContentStreamBlock()),
     ], use_json_field=True, blank=True)
     is_active = models.BooleanField(default=True)
+    doctor = models.ForeignKey(
+        'hospital.Doctor',
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name='profile_pages',
+        help_text="Doctor whose appointments are subtracted from the weekly schedule"
+    )
 
     content_panels = Page.content_panels + [
         MultiFieldPanel([
+            FieldPanel('doctor'),
             FieldPanel('specialization'),
             FieldPanel('qualification'),
             FieldPanel('experience_years'),
@@ -491,21 +691,9 @@ class DoctorPage(Page):
         verbose_name_plural = "Doctor Profiles"
 
     def get_available_slots(self, date):
-        day_of_week = date.weekday()
-        schedules = self.weekly_schedules.filter(
-            day_of_week=day_of_week,
-            is_available=True
-        )
-        available_slots = []
-        for schedule in schedules:
-            # Add logic here to check against appointments and return available time slots
-            available_slots.append({
-                'start_time': schedule.start_time,
-                'end_time': schedule.end_time,
-                'location': schedule.location,
-                'clinic_type': schedule.clinic_type
-            })
-        return available_slots
+        """Free slots on a date from the weekly schedule, minus booked appointments"""
+        from .schedule_expansion import get_available_slots
+        return get_available_slots(self, date)
 
 
 class DoctorWeeklySchedule(models.Model):
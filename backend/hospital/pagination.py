@@ -0,0 +1,178 @@
+"""
+Page-number pagination with an opt-in keyset (cursor) mode.
+
+Lists keep the `?page=N` shape by default. A request that passes `cursor`
+(empty for the first page) on a view declaring `cursor_ordering` is paged by
+keyset instead: the queryset is ordered by those fields and the next page is
+the rows strictly after the last row of this one, compared lexicographically
+on the ordering values. That is an index range scan with a LIMIT at any
+depth, and the response skips the COUNT(*):
+
+    {"next": "...?cursor=...", "previous": "...?cursor=...", "results": [...]}
+
+The last ordering field must be unique; `id` is appended when it is not.
+"""
+import base64
+import binascii
+import json
+from datetime import date, datetime, time
+from decimal import Decimal
+from uuid import UUID
+
+from django.db.models import Q
+from django.template import loader
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+def _json_default(value):
+    # Full precision: DjangoJSONEncoder cuts datetimes to milliseconds
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, (Decimal, UUID)):
+        return str(value)
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def get_cursor_ordering(view):
+    ordering = list(getattr(view, 'cursor_ordering', None) or ())
+    if ordering and ordering[-1].lstrip('-') not in ('id', 'pk'):
+        ordering.append('id')
+    return ordering
+
+
+def keyset_filter(ordering, values, reverse=False):
+    """Q for rows after `values` in `ordering` (before them when reverse)."""
+    condition = Q()
+    equal = Q()
+    for field, value in zip(ordering, values):
+        name = field.lstrip('-')
+        descending = field.startswith('-') != reverse
+        condition |= equal & Q(**{f'{name}__{"lt" if descending else "gt"}': value})
+        equal &= Q(**{name: value})
+    return condition
+
+
+def ordering_values(instance, ordering):
+    values = []
+    for field in ordering:
+        value = instance
+        for attribute in field.lstrip('-').split('__'):
+            value = getattr(value, attribute)
+        values.append(value)
+    return values
+
+
+def encode_cursor(values, reverse=False):
+    payload = json.dumps({'v': values, 'r': int(reverse)}, default=_json_default, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(encoded):
+    """Return (values, reverse); raises ValueError on a malformed cursor."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(encoded + '=' * (-len(encoded) % 4)))
+        return list(payload['v']), bool(payload['r'])
+    except (binascii.Error, UnicodeDecodeError, KeyError, TypeError) as e:
+        raise ValueError(str(e))
+
+
+class HybridPagination(PageNumberPagination):
+    cursor_query_param = 'cursor'
+    cursor_template = 'rest_framework/pagination/previous_and_next.html'
+    invalid_cursor_message = _('Invalid cursor')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.ordering = get_cursor_ordering(view)
+        self.cursor_mode = bool(self.ordering) and self.cursor_query_param in request.query_params
+        if not self.cursor_mode:
+            return super().paginate_queryset(queryset, request, view)
+
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+
+        encoded = request.query_params[self.cursor_query_param]
+        position, reverse = None, False
+        if encoded:
+            try:
+                position, reverse = decode_cursor(encoded)
+            except ValueError:
+                raise NotFound(self.invalid_cursor_message)
+            if len(position) != len(self.ordering):
+                raise NotFound(self.invalid_cursor_message)
+
+        ordering = self.ordering
+        if reverse:
+            ordering = [field[1:] if field.startswith('-') else f'-{field}' for field in ordering]
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(keyset_filter(self.ordering, position, reverse))
+
+        # One extra row tells whether there is another page, instead of a COUNT
+        rows = list(queryset[:page_size + 1])
+        more = len(rows) > page_size
+        rows = rows[:page_size]
+        if reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = position is not None, more
+        else:
+            self.has_next, self.has_previous = more, position is not None
+
+        self.page_rows = rows
+        self.display_page_controls = self.template is not None and (self.has_next or self.has_previous)
+        return rows
+
+    def get_next_link(self):
+        if not self.cursor_mode:
+            return super().get_next_link()
+        if not self.has_next or not self.page_rows:
+            return None
+        cursor = encode_cursor(ordering_values(self.page_rows[-1], self.ordering))
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def get_previous_link(self):
+        if not self.cursor_mode:
+            return super().get_previous_link()
+        if not self.has_previous or not self.page_rows:
+            return None
+        cursor = encode_cursor(ordering_values(self.page_rows[0], self.ordering), reverse=True)
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_schema_operation_parameters(self, view):
+        parameters = super().get_schema_operation_parameters(view)
+        if get_cursor_ordering(view):
+            parameters.append({
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Keyset cursor; pass it empty for the first page. Replaces page.',
+                'schema': {'type': 'string'},
+            })
+        return parameters
+
+    def get_html_context(self):
+        if not self.cursor_mode:
+            return super().get_html_context()
+        return {
+            'previous_url': self.get_previous_link(),
+            'next_url': self.get_next_link(),
+        }
+
+    def to_html(self):
+        template = self.cursor_template if self.cursor_mode else self.template
+        return loader.get_template(template).render(self.get_html_context())
@@ -0,0 +1,82 @@
+"""
+Declarative prefetch plans for DRF serializers.
+
+A serializer lists the relations it reads in its Meta:
+
+    class Meta:
+        select_related = ['user']
+        prefetch_related = ['specializations']
+
+Nested serializers contribute their own plans under the field's source, so
+AppointmentSerializer(doctor=DoctorSerializer()) automatically selects
+`doctor__user` and prefetches `doctor__specializations`. Viewsets that mix
+in PrefetchPlanMixin apply the plan of their serializer to every queryset
+they list or retrieve, which keeps the query count of a page constant.
+"""
+from functools import lru_cache
+
+from rest_framework import serializers
+
+from . import profiling
+
+
+def _nested_source(name, field):
+    source = field.source or name
+    if source == '*':
+        return None
+    return source.replace('.', '__')
+
+
+@lru_cache(maxsize=None)
+def get_prefetch_plan(serializer_class):
+    """Return (select_related, prefetch_related) tuples for a serializer class."""
+    meta = getattr(serializer_class, 'Meta', None)
+    select = list(getattr(meta, 'select_related', ()))
+    prefetch = list(getattr(meta, 'prefetch_related', ()))
+
+    # Declared fields are enough: nested serializers are always declared, and
+    # this avoids building the model fields of every serializer
+    for name, field in serializer_class._declared_fields.items():
+        many = isinstance(field, serializers.ListSerializer)
+        child = field.child if many else field
+        if not isinstance(child, serializers.BaseSerializer):
+            continue
+        source = _nested_source(name, field)
+        if source is None:
+            continue
+
+        child_select, child_prefetch = get_prefetch_plan(type(child))
+        if many:
+            # Everything below a to-many relation has to be prefetched
+            prefetch.append(source)
+            prefetch.extend(f'{source}__{path}' for path in child_select + child_prefetch)
+        else:
+            select.append(source)
+            select.extend(f'{source}__{path}' for path in child_select)
+            prefetch.extend(f'{source}__{path}' for path in child_prefetch)
+
+    return tuple(dict.fromkeys(select)), tuple(dict.fromkeys(prefetch))
+
+
+def apply_prefetch_plan(queryset, serializer_class):
+    select, prefetch = get_prefetch_plan(serializer_class)
+    if select:
+        queryset = queryset.select_related(*select)
+    if prefetch:
+        queryset = queryset.prefetch_related(*prefetch)
+    return queryset
+
+
+class PrefetchPlanMixin:
+    """Apply the serializer's prefetch plan to list and detail querysets."""
+
+    def filter_queryset(self, queryset):
+        return self.apply_prefetch_plan(super().filter_queryset(queryset))
+
+    def apply_prefetch_plan(self, queryset, serializer_class=None):
+        return apply_prefetch_plan(queryset, serializer_class or self.get_serializer_class())
+
+    def get_serializer_class(self):
+        serializer_class = super().get_serializer_class()
+        # Sampled requests time their serialization (hospital.profiling)
+        return profiling.timed_serializer(serializer_class) if profiling.active() else serializer_class
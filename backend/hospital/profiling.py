@@ -0,0 +1,241 @@
+"""
+Sampled request profiling for production.
+
+ProfilingMiddleware profiles a PROFILING_SAMPLE_RATE fraction of requests
+(0 disables it). For a sampled request it records, per URL name:
+
+- total latency,
+- database query count and time, through connection.execute_wrapper(),
+- hits and misses of the named caches in hospital.caching,
+- time spent serializing in the viewsets' serializers (PrefetchPlanMixin),
+- N+1 patterns: one SQL shape (placeholders, IN lists collapsed) executed
+  PROFILING_N_PLUS_ONE_THRESHOLD or more times in the request.
+
+Aggregates are summed in Redis hashes, so every worker adds to the same
+numbers; without django_redis they stay in process memory. Staff read them
+at /api/v1/admin/profiling/ (DELETE clears them). Queries run while a
+streaming response is iterated happen after the middleware returns and are
+not counted.
+"""
+import logging
+import random
+import re
+import threading
+from collections import Counter, defaultdict
+from contextlib import ExitStack
+from contextvars import ContextVar
+from functools import lru_cache
+from time import perf_counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+from .invalidation import _redis
+
+logger = logging.getLogger(__name__)
+
+MAX_SHAPE_LENGTH = 500
+
+_current = ContextVar('profiling_current', default=None)
+_local = defaultdict(Counter)
+_local_shapes = defaultdict(Counter)
+_local_lock = threading.Lock()
+
+IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+
+
+def sql_shape(sql):
+    return IN_LIST.sub('IN (...)', sql)
+
+
+class Profile:
+    __slots__ = ('queries', 'query_ms', 'shapes', 'cache_hits', 'cache_misses', 'serializer_ms', 'serializing')
+
+    def __init__(self):
+        self.queries = 0
+        self.query_ms = 0.0
+        self.shapes = Counter()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.serializer_ms = 0.0
+        self.serializing = False
+
+    def __call__(self, execute, sql, params, many, context):
+        started = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.query_ms += (perf_counter() - started) * 1000
+            self.queries += 1
+            self.shapes[sql_shape(sql)] += 1
+
+    def repeated_shapes(self):
+        threshold = getattr(settings, 'PROFILING_N_PLUS_ONE_THRESHOLD', 5)
+        return {shape: total for shape, total in self.shapes.items() if total >= threshold}
+
+
+def active():
+    return _current.get() is not None
+
+
+def note_cache(field, amount=1):
+    """Called by hospital.caching for every counted hit or miss."""
+    profile = _current.get()
+    if profile is None:
+        return
+    if field in ('hits', 'stale'):
+        profile.cache_hits += amount
+    elif field == 'misses':
+        profile.cache_misses += amount
+
+
+@lru_cache(maxsize=None)
+def timed_serializer(serializer_class):
+    """Subclass of serializer_class adding its to_representation() time to the profile."""
+    def to_representation(self, instance):
+        profile = _current.get()
+        if profile is None or profile.serializing:
+            return super(timed, self).to_representation(instance)
+        profile.serializing = True
+        started = perf_counter()
+        try:
+            return super(timed, self).to_representation(instance)
+        finally:
+            profile.serializer_ms += (perf_counter() - started) * 1000
+            profile.serializing = False
+
+    timed = type(serializer_class.__name__, (serializer_class,), {
+        '__module__': serializer_class.__module__,
+        'to_representation': to_representation,
+    })
+    return timed
+
+
+def _key(*parts):
+    return cache.make_key(':'.join(('profiling',) + parts))
+
+
+def record(view_name, profile, total_ms):
+    repeated = profile.repeated_shapes()
+    counters = {
+        'requests': 1,
+        'queries': profile.queries,
+        'cache_hits': profile.cache_hits,
+        'cache_misses': profile.cache_misses,
+        'n_plus_one': 1 if repeated else 0,
+    }
+    timers = {'total_ms': total_ms, 'query_ms': profile.query_ms, 'serializer_ms': profile.serializer_ms}
+
+    connection = _redis()
+    if connection is None:
+        with _local_lock:
+            _local[view_name].update(counters)
+            _local[view_name].update(timers)
+            _local_shapes[view_name].update({shape[:MAX_SHAPE_LENGTH]: total for shape, total in repeated.items()})
+        return
+
+    pipe = connection.pipeline(transaction=False)
+    pipe.sadd(_key('views'), view_name)
+    key = _key('view', view_name)
+    for field, value in counters.items():
+        pipe.hincrby(key, field, value)
+    for field, value in timers.items():
+        pipe.hincrbyfloat(key, field, round(value, 3))
+    for shape, total in repeated.items():
+        pipe.hincrby(_key('shapes', view_name), shape[:MAX_SHAPE_LENGTH], total)
+    pipe.execute()
+
+
+def _read():
+    """{view_name: (totals, shapes)} from Redis or the process."""
+    connection = _redis()
+    if connection is None:
+        with _local_lock:
+            return {name: (dict(_local[name]), dict(_local_shapes[name])) for name in _local}
+
+    names = sorted(name.decode() for name in connection.smembers(_key('views')))
+    pipe = connection.pipeline(transaction=False)
+    for name in names:
+        pipe.hgetall(_key('view', name))
+        pipe.hgetall(_key('shapes', name))
+    rows = pipe.execute()
+    data = {}
+    for index, name in enumerate(names):
+        totals, shapes = rows[index * 2], rows[index * 2 + 1]
+        data[name] = (
+            {field.decode(): float(value) for field, value in totals.items()},
+            {shape.decode(): int(value) for shape, value in shapes.items()},
+        )
+    return data
+
+
+def get_report(top_shapes=5):
+    """Per-view averages, slowest total time first."""
+    report = []
+    for name, (totals, shapes) in _read().items():
+        requests = totals.get('requests', 0)
+        if not requests:
+            continue
+        lookups = totals.get('cache_hits', 0) + totals.get('cache_misses', 0)
+        report.append({
+            'view': name,
+            'sampled_requests': int(requests),
+            'avg_ms': round(totals.get('total_ms', 0) / requests, 2),
+            'total_ms': round(totals.get('total_ms', 0), 2),
+            'avg_queries': round(totals.get('queries', 0) / requests, 2),
+            'avg_query_ms': round(totals.get('query_ms', 0) / requests, 2),
+            'avg_serializer_ms': round(totals.get('serializer_ms', 0) / requests, 2),
+            'cache_hit_ratio': round(totals.get('cache_hits', 0) / lookups, 3) if lookups else None,
+            'n_plus_one_requests': int(totals.get('n_plus_one', 0)),
+            'repeated_queries': [
+                {'sql': shape, 'executions': total}
+                for shape, total in Counter(shapes).most_common(top_shapes)
+            ],
+        })
+    report.sort(key=lambda row: row['total_ms'], reverse=True)
+    return report
+
+
+def reset():
+    connection = _redis()
+    if connection is None:
+        with _local_lock:
+            _local.clear()
+            _local_shapes.clear()
+        return
+    names = [name.decode() for name in connection.smembers(_key('views'))]
+    keys = [_key('views')]
+    for name in names:
+        keys.extend((_key('view', name), _key('shapes', name)))
+    connection.delete(*keys)
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        rate = getattr(settings, 'PROFILING_SAMPLE_RATE', 0)
+        if rate <= 0 or random.random() >= rate:
+            return self.get_response(request)
+
+        profile = Profile()
+        token = _current.set(profile)
+        started = perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(profile))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        total_ms = (perf_counter() - started) * 1000
+
+        match = request.resolver_match
+        try:
+            record(match.view_name if match else 'unresolved', profile, total_ms)
+        except Exception:
+            # Profiling must never fail the request it measured
+            logger.exception('Could not record the profile of %s', request.path)
+        return response
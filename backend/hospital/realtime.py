@@ -0,0 +1,283 @@
+"""
+Server-sent events for slot availability.
+
+Booking pages subscribe to a doctor's dates at /realtime/slots/ and receive
+`slot_taken` / `slot_freed` events instead of polling the availability
+endpoints. Appointment transitions publish events once their transaction
+commits; with the 'redis' backend they go through Redis pub/sub so every
+ASGI process sees them, with 'memory' they stay in the publishing process.
+
+Each ASGI process holds a single Redis subscription (a pattern over all slot
+channels) and fans messages out to its local subscribers. A message is
+encoded once per channel, and each subscriber only gets a reference to the
+encoded frame in its bounded queue, so thousands of idle connections cost a
+queue and a coroutine each. Subscribers that fall behind get a `resync` event
+and should refetch availability.
+
+The endpoint sits outside Django's middleware, so it authenticates the
+request itself like the REST availability endpoints: a session cookie or a
+JWT bearer token. Anonymous clients get a 401.
+
+Run the push endpoint under ASGI (hospital_website.asgi), e.g.
+    uvicorn hospital_website.asgi:application
+"""
+import asyncio
+import json
+import logging
+import time
+from collections import defaultdict
+from http.cookies import SimpleCookie
+from importlib import import_module
+from types import SimpleNamespace
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.db import close_old_connections, transaction
+
+logger = logging.getLogger(__name__)
+
+CHANNEL_PREFIX = 'slots:'
+HEARTBEAT_SECONDS = 15
+QUEUE_SIZE = 64
+MAX_DATES_PER_SUBSCRIPTION = 31
+
+
+def channel_name(doctor_id, date):
+    return f'{CHANNEL_PREFIX}{doctor_id}:{date}'
+
+
+def _backend():
+    return getattr(settings, 'REALTIME_BACKEND', 'redis')
+
+
+def encode_event(event, data):
+    return f'event: {event}\ndata: {json.dumps(data, separators=(",", ":"))}\n\n'.encode()
+
+
+# Publishing (sync, called from model code)
+
+def publish(doctor_id, date, event, time_slot_id):
+    date = date.isoformat() if hasattr(date, 'isoformat') else date
+    message = json.dumps({
+        'event': event,
+        'doctor': doctor_id,
+        'date': date,
+        'time_slot': time_slot_id,
+        'sent_at': time.time(),
+    })
+    channel = channel_name(doctor_id, date)
+    if _backend() == 'memory':
+        broker.publish_threadsafe(channel, message)
+        return
+    try:
+        from django_redis import get_redis_connection
+        get_redis_connection('default').publish(channel, message)
+    except Exception:
+        # Push is best effort; clients still see the change on their next fetch
+        logger.exception('Could not publish %s on %s', event, channel)
+
+
+def publish_transition(old_state, new_state):
+    from apps.appointments.availability import slot_changes
+
+    freed, taken = slot_changes(old_state, new_state)
+    if freed:
+        publish(freed.doctor_id, freed.date, 'slot_freed', freed.time_slot_id)
+    if taken:
+        publish(taken.doctor_id, taken.date, 'slot_taken', taken.time_slot_id)
+
+
+def record_transition(old_state, new_state):
+    """Publish slot events for an appointment transition after commit."""
+    transaction.on_commit(lambda: publish_transition(old_state, new_state))
+
+
+# Subscribing (async, inside the ASGI process)
+
+class Subscription:
+    __slots__ = ('channels', 'queue', 'overflowed')
+
+    def __init__(self, channels):
+        self.channels = channels
+        self.queue = asyncio.Queue(QUEUE_SIZE)
+        self.overflowed = False
+
+    def push(self, frame):
+        try:
+            self.queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+
+class Broker:
+    """Per-process fan-out from channels to local subscriptions."""
+
+    def __init__(self):
+        self.subscriptions = defaultdict(set)
+        self.loop = None
+        self._listener = None
+
+    def subscribe(self, channels):
+        self.loop = asyncio.get_running_loop()
+        subscription = Subscription(channels)
+        for channel in channels:
+            self.subscriptions[channel].add(subscription)
+        if _backend() != 'memory' and (self._listener is None or self._listener.done()):
+            self._listener = asyncio.create_task(self._listen())
+        return subscription
+
+    def unsubscribe(self, subscription):
+        for channel in subscription.channels:
+            subscribers = self.subscriptions.get(channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self.subscriptions[channel]
+
+    def dispatch(self, channel, message):
+        subscribers = self.subscriptions.get(channel)
+        if not subscribers:
+            return
+        data = json.loads(message)
+        frame = encode_event(data.pop('event'), data)
+        for subscription in list(subscribers):
+            subscription.push(frame)
+
+    def publish_threadsafe(self, channel, message):
+        if self.loop is not None and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.dispatch, channel, message)
+
+    async def _listen(self):
+        import redis.asyncio as aioredis
+
+        while True:
+            client = aioredis.from_url(
+                settings.CACHES['default']['LOCATION'],
+                password=settings.CACHES['default'].get('OPTIONS', {}).get('PASSWORD'),
+            )
+            try:
+                pubsub = client.pubsub()
+                await pubsub.psubscribe(f'{CHANNEL_PREFIX}*')
+                async for message in pubsub.listen():
+                    if message['type'] != 'pmessage':
+                        continue
+                    channel, data = message['channel'], message['data']
+                    self.dispatch(
+                        channel.decode() if isinstance(channel, bytes) else channel,
+                        data.decode() if isinstance(data, bytes) else data,
+                    )
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception('Slot event subscription failed; reconnecting')
+                await asyncio.sleep(1)
+            finally:
+                await client.aclose()
+
+
+broker = Broker()
+
+
+def _parse_channels(query_string):
+    params = parse_qs(query_string.decode())
+    doctor_id = int(params['doctor'][0])
+    dates = [date for value in params.get('date', []) for date in value.split(',') if date]
+    if not dates or len(dates) > MAX_DATES_PER_SUBSCRIPTION:
+        raise ValueError('between 1 and %d dates are required' % MAX_DATES_PER_SUBSCRIPTION)
+    for date in dates:
+        time.strptime(date, '%Y-%m-%d')
+    return [channel_name(doctor_id, date) for date in dates]
+
+
+async def _send_error(send, status, message):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json')],
+    })
+    await send({'type': 'http.response.body', 'body': json.dumps({'error': message}).encode()})
+
+
+def _authenticate(scope):
+    """The active user behind the session cookie or bearer token of scope, or None."""
+    from rest_framework_simplejwt.authentication import JWTAuthentication
+    from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+
+    close_old_connections()
+    headers = {name.decode('latin1').lower(): value.decode('latin1') for name, value in scope.get('headers', [])}
+    try:
+        authorization = headers.get('authorization', '').split()
+        if len(authorization) == 2 and authorization[0] == 'Bearer':
+            authentication = JWTAuthentication()
+            try:
+                user = authentication.get_user(authentication.get_validated_token(authorization[1]))
+            except (InvalidToken, TokenError):
+                return None
+            return user if user.is_active else None
+
+        cookie = SimpleCookie(headers.get('cookie', '')).get(settings.SESSION_COOKIE_NAME)
+        if cookie is None:
+            return None
+        session = import_module(settings.SESSION_ENGINE).SessionStore(cookie.value)
+        # get_user() checks the session hash, so logged out sessions do not count
+        user = get_user(SimpleNamespace(session=session))
+        return user if user.is_authenticated else None
+    finally:
+        close_old_connections()
+
+
+async def slot_events(scope, receive, send):
+    """ASGI app: GET /realtime/slots/?doctor=<id>&date=YYYY-MM-DD[,YYYY-MM-DD...]"""
+    if scope['method'] != 'GET':
+        await _send_error(send, 405, 'Method not allowed')
+        return
+    if await sync_to_async(_authenticate)(scope) is None:
+        await _send_error(send, 401, 'Authentication credentials were not provided')
+        return
+    try:
+        channels = _parse_channels(scope.get('query_string', b''))
+    except (KeyError, ValueError) as exc:
+        await _send_error(send, 400, f'Invalid subscription: {exc}')
+        return
+
+    subscription = broker.subscribe(channels)
+    disconnected = asyncio.Event()
+
+    async def watch_disconnect():
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+        disconnected.set()
+        # Wake the sender; a full queue wakes it anyway
+        subscription.push(b'')
+
+    watcher = asyncio.create_task(watch_disconnect())
+    try:
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+            ],
+        })
+        await send({'type': 'http.response.body', 'body': b'retry: 3000\n\n', 'more_body': True})
+
+        while not disconnected.is_set():
+            try:
+                frame = await asyncio.wait_for(subscription.queue.get(), HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                frame = b': keep-alive\n\n'
+            if disconnected.is_set():
+                break
+            if subscription.overflowed:
+                subscription.overflowed = False
+                frame += encode_event('resync', {})
+            await send({'type': 'http.response.body', 'body': frame, 'more_body': True})
+    except OSError:
+        pass
+    finally:
+        broker.unsubscribe(subscription)
+        watcher.cancel()
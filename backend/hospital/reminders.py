@@ -0,0 +1,102 @@
+"""
+Batched reminder delivery.
+
+Appointments are read in keyset-paginated chunks with their joins resolved,
+every message goes through one reused mail connection, and the outcome for
+each recipient is stored in ReminderDelivery. Rerunning a day's reminders
+skips recipients that were already sent to.
+"""
+import logging
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.conf import settings
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 500
+
+
+def iter_chunks(queryset, chunk_size=CHUNK_SIZE):
+    """Yield lists of objects ordered by primary key without OFFSET scans."""
+    last_pk = 0
+    while True:
+        chunk = list(queryset.filter(pk__gt=last_pk).order_by('pk')[:chunk_size])
+        if not chunk:
+            return
+        yield chunk
+        last_pk = chunk[-1].pk
+
+
+def send_reminders(queryset, build_message, reminder_date, kind='reminder', chunk_size=CHUNK_SIZE,
+                   connection=None):
+    """
+    Send one reminder per object in `queryset`.
+
+    build_message(obj) returns (recipient, subject, text_body, html_body) or
+    None to skip the object. Returns a dict with sent/failed/skipped counts.
+    """
+    from .models import ReminderDelivery
+
+    content_type = ContentType.objects.get_for_model(queryset.model)
+    stats = {'sent': 0, 'failed': 0, 'skipped': 0}
+    connection = connection or get_connection(fail_silently=False)
+    connection.open()
+    try:
+        for chunk in iter_chunks(queryset, chunk_size):
+            already_sent = set(ReminderDelivery.objects.filter(
+                content_type=content_type,
+                object_id__in=[obj.pk for obj in chunk],
+                kind=kind,
+                reminder_date=reminder_date,
+                status='sent'
+            ).values_list('object_id', 'recipient'))
+
+            outgoing = []
+            for obj in chunk:
+                message = build_message(obj)
+                if message is None or (obj.pk, message[0]) in already_sent:
+                    stats['skipped'] += 1
+                    continue
+                recipient, subject, text_body, html_body = message
+                email = EmailMultiAlternatives(
+                    subject, text_body, settings.DEFAULT_FROM_EMAIL, [recipient], connection=connection
+                )
+                if html_body:
+                    email.attach_alternative(html_body, 'text/html')
+                outgoing.append((obj.pk, recipient, email))
+
+            ReminderDelivery.objects.bulk_create([
+                ReminderDelivery(
+                    content_type=content_type, object_id=pk, kind=kind,
+                    reminder_date=reminder_date, recipient=recipient
+                )
+                for pk, recipient, _ in outgoing
+            ], ignore_conflicts=True)
+
+            sent, failed = [], {}
+            for pk, recipient, email in outgoing:
+                try:
+                    connection.send_messages([email])
+                    sent.append(pk)
+                except Exception as e:
+                    logger.warning('Reminder to %s failed: %s', recipient, e)
+                    failed.setdefault(str(e), []).append(pk)
+
+            deliveries = ReminderDelivery.objects.filter(
+                content_type=content_type, kind=kind, reminder_date=reminder_date
+            )
+            if sent:
+                deliveries.filter(object_id__in=sent).update(
+                    status='sent', sent_at=timezone.now(), error=''
+                )
+            for error, pks in failed.items():
+                deliveries.filter(object_id__in=pks).update(status='failed', error=error)
+
+            stats['sent'] += len(sent)
+            stats['failed'] += sum(len(pks) for pks in failed.values())
+    finally:
+        connection.close()
+
+    return stats
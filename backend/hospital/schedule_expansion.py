@@ -0,0 +1,172 @@
+"""
+Precomputed slot expansion for DoctorPage weekly schedules.
+
+A page's DoctorWeeklySchedule rows are expanded into dated slots for a
+rolling horizon of HORIZON_DAYS, stored per page in packed arrays: slot start
+and end minutes (array('H')), a per-day offset index (array('I')) and one
+free/booked byte per slot. Booked appointments of the page's doctor are
+subtracted, and get_available_slots(date) is a slice of the arrays.
+
+Expansions live in process memory and are checked against two version
+counters in the cache: a schedule change (weekly rows or the page) rebuilds
+the expansion, a booking change only re-subtracts the doctor's bookings.
+"""
+import threading
+from array import array
+from bisect import bisect_right
+from datetime import time, timedelta
+
+from django.utils import timezone
+
+from . import caching
+from .slot_grid import booking_minutes, day_bounds, to_minutes
+
+HORIZON_DAYS = 90
+SLOT_MINUTES = 30
+
+_expansions = {}
+_lock = threading.Lock()
+
+
+def schedule_version_key(page_id):
+    return f'doctor_page_schedule_version:{page_id}'
+
+
+def bookings_version_key(doctor_id):
+    return f'doctor_bookings_version:{doctor_id}'
+
+
+def _split(start, end):
+    """Cut a window into SLOT_MINUTES slots; a shorter window is a single slot."""
+    slots = [(minute, minute + SLOT_MINUTES) for minute in range(start, end - SLOT_MINUTES + 1, SLOT_MINUTES)]
+    return slots or ([(start, end)] if end > start else [])
+
+
+class ScheduleExpansion:
+    """Dated slots of one DoctorPage from start_date for `days` days."""
+
+    __slots__ = (
+        'page_id', 'doctor_id', 'start_date', 'days', 'versions',
+        'day_offsets', 'starts', 'ends', 'window_ids', 'windows', 'free',
+    )
+
+    def __init__(self, page_id, doctor_id, start_date, days, rows, versions=None):
+        """`rows` are (day_of_week, start_time, end_time, location, clinic_type) of available windows."""
+        self.page_id = page_id
+        self.doctor_id = doctor_id
+        self.start_date = start_date
+        self.days = days
+        self.versions = versions
+
+        # Expand each weekday once, then lay the templates out day by day
+        self.windows = []
+        templates = [[] for _ in range(7)]
+        for day_of_week, start_time, end_time, location, clinic_type in sorted(rows, key=lambda row: (row[0], row[1])):
+            window_id = len(self.windows)
+            self.windows.append((location, clinic_type))
+            templates[day_of_week].extend(
+                (start, end, window_id) for start, end in _split(to_minutes(start_time), to_minutes(end_time))
+            )
+
+        self.day_offsets = array('I', [0])
+        self.starts, self.ends, self.window_ids = array('H'), array('H'), array('H')
+        for offset in range(days):
+            for start, end, window_id in templates[(start_date + timedelta(days=offset)).weekday()]:
+                self.starts.append(start)
+                self.ends.append(end)
+                self.window_ids.append(window_id)
+            self.day_offsets.append(len(self.starts))
+        self.free = bytearray(b'\x01') * len(self.starts)
+
+    def covers(self, date):
+        return 0 <= (date - self.start_date).days < self.days
+
+    def subtract(self, bookings):
+        """Mark the slots containing (date, minute_of_day) bookings as taken."""
+        free = bytearray(b'\x01') * len(self.starts)
+        for date, minute in bookings:
+            offset = (date - self.start_date).days
+            if not 0 <= offset < self.days:
+                continue
+            low, high = self.day_offsets[offset], self.day_offsets[offset + 1]
+            index = bisect_right(self.starts, minute, low, high) - 1
+            if index >= low and minute < self.ends[index]:
+                free[index] = 0
+        # Swap in one step, so concurrent readers see either state
+        self.free = free
+
+    def slots(self, date):
+        offset = (date - self.start_date).days
+        free = self.free
+        result = []
+        for index in range(self.day_offsets[offset], self.day_offsets[offset + 1]):
+            if not free[index]:
+                continue
+            location, clinic_type = self.windows[self.window_ids[index]]
+            result.append({
+                'start_time': time(*divmod(self.starts[index], 60)),
+                'end_time': time(*divmod(self.ends[index], 60)) if self.ends[index] < 24 * 60 else time.max,
+                'location': location,
+                'clinic_type': clinic_type,
+            })
+        return result
+
+
+def _schedule_rows(page):
+    return list(page.weekly_schedules.filter(is_available=True).values_list(
+        'day_of_week', 'start_time', 'end_time', 'location', 'clinic_type'
+    ))
+
+
+def _bookings(doctor_id, start_date, days):
+    from .models import Appointment
+
+    if doctor_id is None:
+        return []
+    start, end = day_bounds(start_date, start_date + timedelta(days=days - 1))
+    rows = Appointment.objects.filter(
+        doctor_id=doctor_id, date_time__gte=start, date_time__lt=end
+    ).exclude(status='CANCELLED').values_list('doctor_id', 'date_time')
+    return [(date, minute) for _, date, minute in booking_minutes(rows)]
+
+
+def expand(page, start_date, days, versions=None):
+    expansion = ScheduleExpansion(page.pk, page.doctor_id, start_date, days, _schedule_rows(page), versions)
+    expansion.subtract(_bookings(page.doctor_id, start_date, days))
+    return expansion
+
+
+def get_expansion(page):
+    """The page's expansion from today, rebuilt or refreshed when its versions moved."""
+    today = timezone.localdate()
+    schedule_key = schedule_version_key(page.pk)
+    bookings_key = bookings_version_key(page.doctor_id)
+    versions = caching.read_versions([schedule_key, bookings_key])
+    current = (versions.get(schedule_key), versions.get(bookings_key))
+
+    expansion = _expansions.get(page.pk)
+    if (expansion is None or expansion.start_date != today or expansion.doctor_id != page.doctor_id
+            or expansion.versions[0] != current[0]):
+        expansion = expand(page, today, HORIZON_DAYS, current)
+        with _lock:
+            _expansions[page.pk] = expansion
+    elif expansion.versions[1] != current[1]:
+        expansion.subtract(_bookings(page.doctor_id, today, HORIZON_DAYS))
+        expansion.versions = current
+    return expansion
+
+
+def get_available_slots(page, date):
+    expansion = get_expansion(page)
+    if not expansion.covers(date):
+        # Outside the horizon: expand just that day
+        expansion = expand(page, date, 1)
+    return expansion.slots(date)
+
+
+def schedule_changed(page_id):
+    caching.bump_version(schedule_version_key(page_id))
+
+
+def bookings_changed(doctor_id):
+    caching.bump_version(bookings_version_key(doctor_id))
@@ -0,0 +1,209 @@
+"""
+Full-text search over patients and appointments.
+
+Every searchable row has one SearchDocument holding the text it is found by
+(names and email of the people involved, reason, symptoms, notes), lower
+cased with punctuation turned into spaces. Saving or deleting a source row
+rewrites its document once the transaction commits (hospital.signals); a
+changed user name or email rewrites the documents embedding it from a Celery
+task. Bulk loads bypass the signals: `manage.py reindex_search` rebuilds.
+
+On Postgres the documents get a generated `search_vector` tsvector column
+with a GIN index (ensure_search_index, run after migrate). Every query term
+is matched as a prefix (`term:*`), all terms must match, and results are
+ranked by ts_rank. Other databases fall back to AND-ed substring matches,
+newest first, which is what the tests and the benchmark settings use.
+hospital.clinical_search matches its entries through the same column.
+
+Views opt in with `search_kind` and FullTextSearchFilter in place of
+SearchFilter; at most MAX_RESULTS matches are returned.
+"""
+import re
+
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import BooleanField, Case, FloatField, IntegerField, Q, When
+from django.db.models.expressions import RawSQL
+from rest_framework import filters
+from rest_framework.settings import api_settings
+
+from apps.appointments.models import Appointment as ClinicAppointment
+
+from .models import Appointment, ClinicalEntry, Patient, SearchDocument
+
+MAX_RESULTS = 1000
+MAX_TERMS = 8
+BATCH_SIZE = 2000
+# Models with a text `body` that get a search_vector column
+VECTOR_INDEXES = [
+    (SearchDocument, 'searchdocument_vector_idx'),
+    (ClinicalEntry, 'clinicalentry_vector_idx'),
+]
+
+NON_WORD = re.compile(r'[\W_]+')
+TERM = re.compile(r'[^\W_]+')
+
+
+class Source:
+    """A model and the fields its search document is built from."""
+
+    def __init__(self, model, fields, user_paths):
+        self.model = model
+        self.fields = fields
+        # Relations to the users whose names and emails are in `fields`
+        self.user_paths = user_paths
+
+    def documents(self, queryset):
+        for pk, *values in queryset.values_list('pk', *self.fields).iterator(chunk_size=BATCH_SIZE):
+            yield SearchDocument(object_id=pk, body=normalize(values))
+
+    def for_user(self, user_id):
+        query = Q()
+        for path in self.user_paths:
+            query |= Q(**{f'{path}_id': user_id})
+        return self.model.objects.filter(query)
+
+
+PEOPLE = [
+    'patient__user__first_name', 'patient__user__last_name', 'patient__user__email',
+    'doctor__user__first_name', 'doctor__user__last_name',
+]
+
+SOURCES = {
+    'patient': Source(
+        Patient, ['user__first_name', 'user__last_name', 'user__email', 'phone_number'], ['user']
+    ),
+    'appointment': Source(Appointment, PEOPLE + ['reason', 'notes'], ['patient__user', 'doctor__user']),
+    'clinic_appointment': Source(
+        ClinicAppointment, PEOPLE + ['reason', 'symptoms', 'notes'], ['patient__user', 'doctor__user']
+    ),
+}
+
+
+def normalize(values):
+    return ' '.join(NON_WORD.sub(' ', value or '').strip() for value in values if value).lower()
+
+
+def parse(query):
+    return TERM.findall((query or '').lower())[:MAX_TERMS]
+
+
+# Indexing
+
+def reindex(kind, ids):
+    """Rewrite the documents of `ids`, dropping those whose rows are gone."""
+    source = SOURCES[kind]
+    ids = list(ids)
+    documents = list(source.documents(source.model.objects.filter(pk__in=ids)))
+    for document in documents:
+        document.kind = kind
+    missing = set(ids) - {document.object_id for document in documents}
+    with transaction.atomic():
+        SearchDocument.objects.bulk_create(
+            documents, batch_size=BATCH_SIZE,
+            update_conflicts=True, unique_fields=['kind', 'object_id'], update_fields=['body', 'updated_at'],
+        )
+        if missing:
+            SearchDocument.objects.filter(kind=kind, object_id__in=missing).delete()
+
+
+def reindex_on_commit(kind, ids):
+    ids = list(ids)
+    transaction.on_commit(lambda: reindex(kind, ids))
+
+
+def reindex_user(user_id):
+    """Rewrite every document embedding the user's name or email."""
+    for kind, source in SOURCES.items():
+        ids = source.for_user(user_id).values_list('pk', flat=True).order_by('pk')
+        last = 0
+        while True:
+            batch = list(ids.filter(pk__gt=last)[:BATCH_SIZE])
+            if not batch:
+                break
+            reindex(kind, batch)
+            last = batch[-1]
+
+
+def ensure_search_index(using=DEFAULT_DB_ALIAS, **kwargs):
+    """Add the tsvector columns and their GIN indexes on Postgres (post_migrate)."""
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        tables = connection.introspection.table_names(cursor)
+        for model, index_name in VECTOR_INDEXES:
+            table = model._meta.db_table
+            if table not in tables:
+                continue
+            cursor.execute(
+                f'ALTER TABLE {table} ADD COLUMN IF NOT EXISTS search_vector tsvector '
+                f"GENERATED ALWAYS AS (to_tsvector('simple', body)) STORED"
+            )
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS {index_name} ON {table} USING GIN (search_vector)')
+
+
+# Querying
+
+def tsquery(terms):
+    return ' & '.join(f'{term}:*' for term in terms)
+
+
+def match_terms(terms, vendor):
+    """Q matching bodies containing every term (as a prefix on Postgres)."""
+    if vendor == 'postgresql':
+        return Q(RawSQL("search_vector @@ to_tsquery('simple', %s)", (tsquery(terms),), output_field=BooleanField()))
+    query = Q()
+    for term in terms:
+        query &= Q(body__contains=term)
+    return query
+
+
+def search(kind, query, scope=None, limit=MAX_RESULTS):
+    """
+    Ids of the `kind` rows matching every term of `query`, best first, or
+    None when the query has no terms. `scope` is an optional queryset of the
+    source model the matches are restricted to.
+    """
+    terms = parse(query)
+    if not terms:
+        return None
+    documents = SearchDocument.objects.filter(kind=kind)
+    if scope is not None:
+        documents = documents.filter(object_id__in=scope.values('pk'))
+
+    vendor = connections[documents.db].vendor
+    documents = documents.filter(match_terms(terms, vendor))
+    if vendor == 'postgresql':
+        documents = documents.annotate(
+            rank=RawSQL("ts_rank(search_vector, to_tsquery('simple', %s))", (tsquery(terms),), output_field=FloatField())
+        ).order_by('-rank', '-object_id')
+    else:
+        documents = documents.order_by('-object_id')
+    return list(documents.values_list('object_id', flat=True)[:limit])
+
+
+class FullTextSearchFilter(filters.SearchFilter):
+    """
+    SearchFilter answered from the search documents of the view's
+    `search_kind`. Without an explicit ordering the results keep their rank.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        kind = getattr(view, 'search_kind', None)
+        if kind is None:
+            return super().filter_queryset(request, queryset, view)
+
+        # A filtered queryset (one user's rows) is searched within; the full
+        # table is not worth the semi-join
+        scope = queryset if queryset.query.where else None
+        ids = search(kind, request.query_params.get(self.search_param, ''), scope=scope)
+        if ids is None:
+            return queryset
+        if not ids:
+            return queryset.none()
+        queryset = queryset.filter(pk__in=ids)
+        if not request.query_params.get(api_settings.ORDERING_PARAM):
+            queryset = queryset.order_by(
+                Case(*(When(pk=pk, then=position) for position, pk in enumerate(ids)), output_field=IntegerField())
+            )
+        return queryset
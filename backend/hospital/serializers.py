@@ -3,7 +3,7 @@ from wagtail.images.shortcuts import get_rendition_or_not_found
 from django.contrib.auth.models import User
 from .models import (
     Doctor, Appointment, DoctorSchedule, DepartmentPage,
-    ServicePage, NewsPage, Patient, MedicalRecord
+    ServicePage, NewsPage, Patient, MedicalRecord, ExportJob
 )
 
 
@@ -46,6 +46,21 @@ class DoctorScheduleSerializer(serializers.ModelSerializer):
             'id', 'doctor', 'doctor_name', 'date', 'start_time',
             'end_time', 'is_available'
         ]
+        select_related = ['doctor']
+
+
+class PatientSerializer(serializers.ModelSerializer):
+    user = UserSerializer()
+
+    class Meta:
+        model = Patient
+        fields = '__all__'
+
+    def create(self, validated_data):
+        user_data = validated_data.pop('user')
+        user = User.objects.create_user(**user_data)
+        patient = Patient.objects.create(user=user, **validated_data)
+        return patient
 
 
 class AppointmentSerializer(serializers.ModelSerializer):
@@ -87,6 +102,7 @@ class AppointmentSerializer(serializers.ModelSerializer):
 
 class DepartmentSerializer(serializers.ModelSerializer):
     image_url = serializers.SerializerMethodField()
+    url = serializers.CharField(read_only=True)
 
     class Meta:
         model = DepartmentPage
@@ -99,13 +115,16 @@ class DepartmentSerializer(serializers.ModelSerializer):
 
 
 class ServiceSerializer(serializers.ModelSerializer):
+    url = serializers.CharField(read_only=True)
+
     class Meta:
         model = ServicePage
-        fields = ['id', 'title', 'description', 'icon', 'price', 'duration', 'url']
+        fields = ['id', 'title', 'description', 'price', 'url']
 
 
 class NewsSerializer(serializers.ModelSerializer):
     image_url = serializers.SerializerMethodField()
+    url = serializers.CharField(read_only=True)
 
     class Meta:
         model = NewsPage
@@ -117,20 +136,6 @@ class NewsSerializer(serializers.ModelSerializer):
         return None
 
 
-class PatientSerializer(serializers.ModelSerializer):
-    user = UserSerializer()
-
-    class Meta:
-        model = Patient
-        fields = '__all__'
-
-    def create(self, validated_data):
-        user_data = validated_data.pop('user')
-        user = User.objects.create_user(**user_data)
-        patient = Patient.objects.create(user=user, **validated_data)
-        return patient
-
-
 class MedicalRecordSerializer(serializers.ModelSerializer):
     patient = PatientSerializer(read_only=True)
     doctor = DoctorSerializer(read_only=True)
@@ -147,4 +152,36 @@ class MedicalRecordSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = MedicalRecord
-        fields = '__all__' 
\ No newline at end of file
+        fields = '__all__'
+
+
+class ExportJobSerializer(serializers.ModelSerializer):
+    exported_rows = serializers.IntegerField(read_only=True)
+    progress = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ExportJob
+        fields = [
+            'id', 'export_type', 'parameters', 'status', 'total_rows',
+            'exported_rows', 'progress', 'error', 'created_at', 'finished_at'
+        ]
+        read_only_fields = ['status', 'total_rows', 'error', 'created_at', 'finished_at']
+
+    def get_progress(self, obj):
+        if obj.status == 'completed':
+            return 100.0
+        if not obj.total_rows:
+            return 0.0
+        return round(100.0 * (getattr(obj, 'exported_rows', 0) or 0) / obj.total_rows, 1)
+
+    def validate_parameters(self, value):
+        allowed = {'start', 'end', 'patient'}
+        unknown = set(value) - allowed
+        if unknown:
+            raise serializers.ValidationError(
+                f"Unknown parameters: {', '.join(sorted(unknown))}"
+            )
+        for key in ('start', 'end'):
+            if value.get(key):
+                serializers.DateField().to_internal_value(value[key])
+        return value
@@ -0,0 +1,237 @@
+"""
+Cache invalidation hooks.
+
+Each model maps an instance to the cache tags that depend on it; saving or
+deleting the instance purges those tags once the transaction commits.
+
+The calendar feed and DoctorPage slot expansions are versioned rather than
+tagged: schedule changes bump the calendar weeks they touch (doctor changes
+bump every week), weekly schedule rows bump their page's expansion and
+appointments bump their doctor's bookings.
+
+Appointments also move between the buckets of the daily statistics rollup
+(hospital.appointment_stats), which then purges the cached statistics.
+
+Search documents (hospital.search) are rewritten the same way; a user whose
+name or email changed has the documents embedding them rewritten by a task.
+Clinic medical records and their children rewrite the record's clinical
+search entries (hospital.clinical_search); they and the patient's
+appointments purge the patient's cached summary (Patient.get_medical_summary).
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from wagtail.signals import page_published, page_unpublished
+
+from apps.appointments.models import Appointment as ClinicAppointment
+from apps.medical_records.models import LabResult, MedicalRecord as ClinicRecord, Prescription, Vaccination
+from apps.patients.models import Patient as ClinicPatient
+
+from . import appointment_stats, calendar_feed, clinical_search, invalidation, schedule_expansion, search, tasks
+from .models import Appointment, Doctor, DoctorPage, DoctorSchedule, DoctorWeeklySchedule, Patient
+
+
+def doctor_tags(doctor):
+    # Doctor names appear in the doctor list and the availability cache
+    return ['doctors', 'doctor_schedules']
+
+
+def schedule_tags(schedule):
+    return ['doctor_schedules', f'available_slots:{schedule.doctor_id}']
+
+
+def appointment_tags(appointment):
+    return [f'available_slots:{appointment.doctor_id}']
+
+
+def clinic_appointment_tags(appointment):
+    # Clinic slot availability is kept current by the layout and bitmap
+    # versions of apps.appointments.availability, not by tags
+    return [f'patient_summary:{appointment.patient_id}']
+
+
+def clinic_patient_tags(patient):
+    return [f'patient_summary:{patient.pk}']
+
+
+def clinic_record_tags(record):
+    return [f'patient_summary:{record.patient_id}']
+
+
+def clinic_record_child_tags(child):
+    # Children only know their record; its row still exists when they are cascaded
+    patient_id = ClinicRecord.objects.filter(pk=child.medical_record_id).values_list('patient_id', flat=True).first()
+    return [f'patient_summary:{patient_id}'] if patient_id else []
+
+
+TAGS = {
+    Doctor: doctor_tags,
+    DoctorSchedule: schedule_tags,
+    Appointment: appointment_tags,
+    ClinicAppointment: clinic_appointment_tags,
+    ClinicPatient: clinic_patient_tags,
+    ClinicRecord: clinic_record_tags,
+    Prescription: clinic_record_child_tags,
+    LabResult: clinic_record_child_tags,
+    Vaccination: clinic_record_child_tags,
+}
+
+
+def purge_dependent_caches(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    invalidation.purge_on_commit(TAGS[sender](instance))
+
+
+for model in TAGS:
+    post_save.connect(purge_dependent_caches, sender=model, dispatch_uid=f'purge_caches_{model._meta.label}_save')
+    post_delete.connect(purge_dependent_caches, sender=model, dispatch_uid=f'purge_caches_{model._meta.label}_delete')
+
+
+def remember_schedule_date(sender, instance, raw=False, **kwargs):
+    # A schedule moved to another week has to refresh the week it left too
+    if instance.pk and not raw:
+        instance._previous_date = sender.objects.filter(pk=instance.pk).values_list('date', flat=True).first()
+
+
+def bump_schedule_weeks(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    days = [instance.date, getattr(instance, '_previous_date', None)]
+    transaction.on_commit(lambda: calendar_feed.bump_weeks(days))
+
+
+def bump_calendar_generation(sender, instance, raw=False, **kwargs):
+    if not raw:
+        transaction.on_commit(calendar_feed.bump_generation)
+
+
+def bump_calendar_for_doctor_user(sender, instance, raw=False, **kwargs):
+    # Event titles use the doctor's user name
+    if not raw and Doctor.objects.filter(user_id=instance.pk).exists():
+        transaction.on_commit(calendar_feed.bump_generation)
+
+
+pre_save.connect(remember_schedule_date, sender=DoctorSchedule, dispatch_uid='calendar_schedule_pre_save')
+post_save.connect(bump_schedule_weeks, sender=DoctorSchedule, dispatch_uid='calendar_schedule_save')
+post_delete.connect(bump_schedule_weeks, sender=DoctorSchedule, dispatch_uid='calendar_schedule_delete')
+post_save.connect(bump_calendar_generation, sender=Doctor, dispatch_uid='calendar_doctor_save')
+post_delete.connect(bump_calendar_generation, sender=Doctor, dispatch_uid='calendar_doctor_delete')
+post_save.connect(bump_calendar_for_doctor_user, sender=settings.AUTH_USER_MODEL, dispatch_uid='calendar_doctor_user_save')
+
+
+def purge_page_lists(sender, instance, **kwargs):
+    # Department, service and news listings are served from one cached payload each
+    invalidation.purge_on_commit(['pages'])
+
+
+page_published.connect(purge_page_lists, dispatch_uid='purge_page_lists_published')
+page_unpublished.connect(purge_page_lists, dispatch_uid='purge_page_lists_unpublished')
+
+
+def weekly_schedule_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        transaction.on_commit(lambda: schedule_expansion.schedule_changed(instance.page_id))
+
+
+def doctor_page_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        transaction.on_commit(lambda: schedule_expansion.schedule_changed(instance.pk))
+
+
+def doctor_bookings_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        transaction.on_commit(lambda: schedule_expansion.bookings_changed(instance.doctor_id))
+
+
+post_save.connect(weekly_schedule_changed, sender=DoctorWeeklySchedule, dispatch_uid='expansion_weekly_save')
+post_delete.connect(weekly_schedule_changed, sender=DoctorWeeklySchedule, dispatch_uid='expansion_weekly_delete')
+post_save.connect(doctor_page_changed, sender=DoctorPage, dispatch_uid='expansion_page_save')
+post_save.connect(doctor_bookings_changed, sender=Appointment, dispatch_uid='expansion_appointment_save')
+post_delete.connect(doctor_bookings_changed, sender=Appointment, dispatch_uid='expansion_appointment_delete')
+
+
+def remember_statistics_bucket(sender, instance, raw=False, **kwargs):
+    if instance.pk and not raw:
+        previous = sender.objects.filter(pk=instance.pk).values_list('date_time', 'doctor_id', 'status').first()
+        instance._previous_statistics_bucket = appointment_stats.state(*previous) if previous else None
+
+
+def update_statistics_rollup(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    old = getattr(instance, '_previous_statistics_bucket', None)
+    new = appointment_stats.state(instance.date_time, instance.doctor_id, instance.status)
+    if kwargs['signal'] is post_delete:
+        old, new = new, None
+    elif old == new:
+        return
+
+    def apply():
+        # Purge after the counters moved, or a reader could re-cache the old totals
+        appointment_stats.apply_transition(old, new)
+        invalidation.purge(['appointment_statistics'])
+    transaction.on_commit(apply)
+
+
+pre_save.connect(remember_statistics_bucket, sender=Appointment, dispatch_uid='statistics_appointment_pre_save')
+post_save.connect(update_statistics_rollup, sender=Appointment, dispatch_uid='statistics_appointment_save')
+post_delete.connect(update_statistics_rollup, sender=Appointment, dispatch_uid='statistics_appointment_delete')
+
+
+SEARCH_KINDS = {
+    Patient: 'patient',
+    Appointment: 'appointment',
+    ClinicAppointment: 'clinic_appointment',
+}
+SEARCHED_USER_FIELDS = ('first_name', 'last_name', 'email')
+
+
+def reindex_search_document(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.reindex_on_commit(SEARCH_KINDS[sender], [instance.pk])
+
+
+for model in SEARCH_KINDS:
+    post_save.connect(reindex_search_document, sender=model, dispatch_uid=f'search_{model._meta.label}_save')
+    post_delete.connect(reindex_search_document, sender=model, dispatch_uid=f'search_{model._meta.label}_delete')
+
+
+def remember_searched_user_fields(sender, instance, raw=False, **kwargs):
+    if instance.pk and not raw:
+        instance._previous_search_fields = sender.objects.filter(pk=instance.pk).values_list(
+            *SEARCHED_USER_FIELDS
+        ).first()
+
+
+def reindex_user_search_documents(sender, instance, created=False, raw=False, **kwargs):
+    # New users are in no document yet; logins and password changes touch none
+    if raw or created:
+        return
+    current = tuple(getattr(instance, field) for field in SEARCHED_USER_FIELDS)
+    if getattr(instance, '_previous_search_fields', None) != current:
+        transaction.on_commit(lambda: tasks.reindex_user_search_documents.delay(instance.pk))
+
+
+pre_save.connect(remember_searched_user_fields, sender=settings.AUTH_USER_MODEL, dispatch_uid='search_user_pre_save')
+post_save.connect(reindex_user_search_documents, sender=settings.AUTH_USER_MODEL, dispatch_uid='search_user_save')
+
+
+def sync_clinical_record(sender, instance, raw=False, **kwargs):
+    if not raw:
+        clinical_search.sync_on_commit(instance.pk)
+
+
+def sync_clinical_record_child(sender, instance, raw=False, **kwargs):
+    if not raw:
+        clinical_search.sync_on_commit(instance.medical_record_id)
+
+
+post_save.connect(sync_clinical_record, sender=ClinicRecord, dispatch_uid='clinical_search_record_save')
+for model in (Prescription, LabResult, Vaccination):
+    post_save.connect(
+        sync_clinical_record_child, sender=model, dispatch_uid=f'clinical_search_{model._meta.label}_save'
+    )
+    post_delete.connect(
+        sync_clinical_record_child, sender=model, dispatch_uid=f'clinical_search_{model._meta.label}_delete'
+    )
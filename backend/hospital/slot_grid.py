@@ -0,0 +1,155 @@
+"""
+Slot grids on integer minute offsets.
+
+A doctor's day is a grid of equally long slots between the start and end of
+their working hours. Grids are plain ints used as bit arrays (bit i is slot i
+of the day); bookings are OR-ed into a mask per (doctor, date), so the free
+slots of a day are `grid & ~booked` and a month for many doctors costs one
+pass over the bookings plus one bit scan per doctor-day. Doctors sharing the
+same hours share the grid and its labels.
+
+Working hours come from the clinic profile (apps.doctors.Doctor) with the
+same license number; doctors without one keep the 09:00-17:00 grid of
+30-minute slots on every day.
+"""
+from collections import defaultdict, namedtuple
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+
+DAY_NAMES = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday')
+
+WorkingHours = namedtuple('WorkingHours', ['start', 'end', 'length', 'weekdays'])
+
+DEFAULT_HOURS = WorkingHours(9 * 60, 17 * 60, 30, frozenset(range(7)))
+
+
+def to_minutes(value):
+    return value.hour * 60 + value.minute
+
+
+def format_minutes(minutes):
+    return '%02d:%02d' % divmod(minutes, 60)
+
+
+def hours_from_profile(profile):
+    """WorkingHours of an apps.doctors.Doctor"""
+    weekdays = frozenset(
+        DAY_NAMES.index(day) for day in profile.get_available_days_list() if day in DAY_NAMES
+    )
+    return WorkingHours(
+        to_minutes(profile.available_time_start),
+        to_minutes(profile.available_time_end),
+        profile.slot_duration_minutes or DEFAULT_HOURS.length,
+        weekdays,
+    )
+
+
+def iter_bits(mask):
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def booking_masks(hours_by_doctor, bookings):
+    """OR (doctor_id, date, minute_of_day) bookings into {(doctor_id, date): mask}."""
+    masks = defaultdict(int)
+    for doctor_id, day, minute in bookings:
+        hours = hours_by_doctor.get(doctor_id)
+        if hours is None or not hours.start <= minute < hours.end:
+            continue
+        masks[(doctor_id, day)] |= 1 << ((minute - hours.start) // hours.length)
+    return masks
+
+
+def free_slots(hours_by_doctor, start_date, end_date, bookings):
+    """
+    Return {doctor_id: {date: ['HH:MM', ...]}} for every working day in
+    [start_date, end_date].
+    """
+    masks = booking_masks(hours_by_doctor, bookings)
+    days = [start_date + timedelta(days=offset) for offset in range((end_date - start_date).days + 1)]
+    grids = {}
+    result = {}
+    for doctor_id, hours in hours_by_doctor.items():
+        shape = hours[:3]
+        if shape not in grids:
+            count = max(0, (hours.end - hours.start) // hours.length)
+            grids[shape] = (
+                (1 << count) - 1,
+                [format_minutes(hours.start + index * hours.length) for index in range(count)],
+            )
+        grid, labels = grids[shape]
+        result[doctor_id] = {
+            day: [labels[index] for index in iter_bits(grid & ~masks.get((doctor_id, day), 0))]
+            for day in days if day.weekday() in hours.weekdays
+        }
+    return result
+
+
+def day_bounds(start_date, end_date):
+    """
+    Aware [start, end) of the local days start_date..end_date. Filtering
+    date_time on the range keeps it an index range scan, where __date wraps
+    the column in a time zone conversion.
+    """
+    start = timezone.make_aware(datetime.combine(start_date, time.min))
+    return start, timezone.make_aware(datetime.combine(end_date + timedelta(days=1), time.min))
+
+
+def booking_minutes(rows):
+    """(doctor_id, date_time) rows as (doctor_id, local date, minute_of_day)."""
+    for doctor_id, date_time in rows:
+        if timezone.is_aware(date_time):
+            date_time = timezone.localtime(date_time)
+        yield doctor_id, date_time.date(), to_minutes(date_time)
+
+
+def resolve_hours(doctors, profiles):
+    """Map hospital doctors to the WorkingHours of the profile with their license number."""
+    by_license = {profile.license_number: hours_from_profile(profile) for profile in profiles}
+    return {doctor.id: by_license.get(doctor.license_number, DEFAULT_HOURS) for doctor in doctors}
+
+
+def doctor_queryset(doctor_ids):
+    from .models import Doctor
+
+    return Doctor.objects.filter(id__in=doctor_ids).only('id', 'license_number')
+
+
+def profile_queryset(doctors):
+    from apps.doctors.models import Doctor as ClinicDoctor
+
+    return ClinicDoctor.objects.filter(
+        license_number__in=[doctor.license_number for doctor in doctors]
+    ).only('license_number', 'available_days', 'available_time_start', 'available_time_end',
+           'slot_duration_minutes')
+
+
+def booking_queryset(doctor_ids, start_date, end_date):
+    from .models import Appointment
+
+    start, end = day_bounds(start_date, end_date)
+    return Appointment.objects.filter(
+        doctor_id__in=doctor_ids,
+        date_time__gte=start,
+        date_time__lt=end,
+        status='SCHEDULED'
+    ).values_list('doctor_id', 'date_time')
+
+
+def load_free_slots(doctor_ids, start_date, end_date):
+    """free_slots() for hospital doctors, in three queries."""
+    doctors = list(doctor_queryset(doctor_ids))
+    hours_by_doctor = resolve_hours(doctors, profile_queryset(doctors))
+    bookings = booking_queryset(list(hours_by_doctor), start_date, end_date)
+    return free_slots(hours_by_doctor, start_date, end_date, booking_minutes(bookings))
+
+
+async def aload_free_slots(doctor_ids, start_date, end_date):
+    """load_free_slots() through the async ORM."""
+    doctors = [doctor async for doctor in doctor_queryset(doctor_ids)]
+    hours_by_doctor = resolve_hours(doctors, [profile async for profile in profile_queryset(doctors)])
+    bookings = [row async for row in booking_queryset(list(hours_by_doctor), start_date, end_date)]
+    return free_slots(hours_by_doctor, start_date, end_date, booking_minutes(bookings))
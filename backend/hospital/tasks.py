@@ -1,9 +1,9 @@
 from celery import shared_task
 from django.core.mail import send_mail
 from django.utils import timezone
-from datetime import timedelta
-from django.core.cache import cache
-from django.db.models.functions import TruncDate
+from datetime import datetime, time, timedelta
+
+from . import caching
 
 
 @shared_task
@@ -77,20 +77,41 @@ def send_appointment_reminder_email(appointment_id):
 @shared_task
 def check_and_send_appointment_reminders():
     """
-    Daily task to check for upcoming appointments and send reminders
+    Daily task to send reminders for tomorrow's appointments in batches
     """
     from .models import Appointment
+    from .reminders import send_reminders
     
     # Get appointments for tomorrow
     tomorrow = timezone.now().date() + timedelta(days=1)
+    start = timezone.make_aware(datetime.combine(tomorrow, time.min))
     appointments = Appointment.objects.filter(
-        date_time__date=tomorrow
-    )
-    
-    for appointment in appointments:
-        send_appointment_reminder_email.delay(appointment.id)
-    
-    return f"Processed {appointments.count()} appointments for reminders"
+        date_time__gte=start,
+        date_time__lt=start + timedelta(days=1)
+    ).select_related('patient__user', 'doctor__user')
+
+    def build_message(appointment):
+        if not appointment.patient.user.email:
+            return None
+        when = appointment.date_time.strftime("%Y-%m-%d at %H:%M")
+        return (
+            appointment.patient.user.email,
+            f'Appointment Reminder: {appointment.date_time.strftime("%Y-%m-%d %H:%M")}',
+            f'''
+        Dear {appointment.patient.user.get_full_name()},
+
+        This is a reminder for your appointment with Dr. {appointment.doctor.user.get_full_name()} scheduled for {when}.
+
+        Please arrive 15 minutes before your scheduled appointment.
+
+        Thank you,
+        Hospital Team
+        ''',
+            None,
+        )
+
+    stats = send_reminders(appointments, build_message, tomorrow)
+    return f"Sent {stats['sent']} reminders ({stats['failed']} failed, {stats['skipped']} skipped)"
 
 
 @shared_task
@@ -112,7 +133,7 @@ def update_doctor_availability_cache():
         availability_data[doctor.id] = list(schedules)
     
     # Cache for 1 hour
-    cache.set('doctor_availability', availability_data, 3600)
+    caching.store('doctor_availability', availability_data, 3600, tags=['doctor_schedules'])
     
     return "Doctor availability cache updated"
 
@@ -120,36 +141,99 @@ def update_doctor_availability_cache():
 @shared_task
 def generate_appointment_statistics():
     """
-    Task to generate and cache appointment statistics
+    Task to cache hospital appointment statistics from the daily rollup
     """
-    from .models import Appointment
-    from django.db.models import Count
+    from .appointment_stats import summarize
     
     # Get statistics for the last 30 days
-    thirty_days_ago = timezone.now() - timedelta(days=30)
-    
-    stats = {
-        'total_appointments': Appointment.objects.filter(
-            date_time__gte=thirty_days_ago
-        ).count(),
-        
-        'appointments_by_doctor': dict(
-            Appointment.objects.filter(date_time__gte=thirty_days_ago)
-            .values('doctor__user__first_name', 'doctor__user__last_name')
-            .annotate(count=Count('id'))
-            .values_list('doctor__user__first_name', 'count')
-        ),
-        
-        'appointments_by_date': dict(
-            Appointment.objects.filter(date_time__gte=thirty_days_ago)
-            .annotate(date=TruncDate('date_time'))
-            .values('date')
-            .annotate(count=Count('id'))
-            .values_list('date', 'count')
-        )
-    }
+    today = timezone.now().date()
+    stats = summarize(today - timedelta(days=29), today)
     
     # Cache for 6 hours
-    cache.set('appointment_statistics', stats, 21600)
+    caching.store('appointment_statistics', stats, 21600, soft_ttl=300, tags=['appointment_statistics'])
     
-    return "Appointment statistics updated"
\ No newline at end of file
+    return "Appointment statistics updated"
+
+@shared_task
+def start_export_job(job_id):
+    """
+    Plan an export job and fan its chunks out to the workers
+    """
+    from .exports import plan_export_job
+    from .models import ExportJob
+
+    job = ExportJob.objects.get(id=job_id)
+    chunks = plan_export_job(job)
+    job.status = 'running' if chunks else 'completed'
+    if not chunks:
+        job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'total_rows', 'finished_at', 'updated_at'])
+
+    for chunk in chunks:
+        export_chunk.delay(chunk.id)
+
+    return f"Export job {job_id} split into {len(chunks)} chunks"
+
+
+@shared_task(acks_late=True, reject_on_worker_lost=True)
+def export_chunk(chunk_id):
+    """
+    Export one chunk; redelivered after a worker crash and resumed from its checkpoint
+    """
+    from django.db import transaction
+    from .exports import claim_export_chunk, run_export_chunk
+    from .models import ExportChunk, ExportJob
+
+    chunk = ExportChunk.objects.select_related('job').get(id=chunk_id)
+    if not claim_export_chunk(chunk):
+        return f"Chunk {chunk_id} is exported or being exported by another worker"
+
+    try:
+        run_export_chunk(chunk)
+    except Exception as e:
+        ExportChunk.objects.filter(pk=chunk.pk).update(status='failed')
+        ExportJob.objects.filter(pk=chunk.job_id).update(status='failed', error=str(e))
+        raise
+
+    # The last chunk to finish closes the job
+    with transaction.atomic():
+        job = ExportJob.objects.select_for_update().get(pk=chunk.job_id)
+        if job.status == 'running' and not job.chunks.exclude(status='completed').exists():
+            job.status = 'completed'
+            job.finished_at = timezone.now()
+            job.save(update_fields=['status', 'finished_at', 'updated_at'])
+
+    return f"Chunk {chunk_id} exported {chunk.rows} rows"
+
+
+@shared_task
+def resume_export_job(job_id):
+    """
+    Re-dispatch the chunks of an export job that no worker holds
+    """
+    from .exports import claimable_chunks
+    from .models import ExportJob
+
+    job = ExportJob.objects.get(id=job_id)
+    if job.status == 'pending':
+        # Planning is idempotent and chunks are claimed, so racing the queued start is harmless
+        return start_export_job(job_id)
+
+    pending = list(claimable_chunks(job.chunks.all()).values_list('id', flat=True))
+    ExportJob.objects.filter(pk=job_id).update(status='running', error='')
+    for chunk_id in pending:
+        export_chunk.delay(chunk_id)
+
+    return f"Resumed {len(pending)} chunks of export job {job_id}"
+
+
+
+@shared_task
+def reindex_user_search_documents(user_id):
+    """
+    Rewrite the search documents embedding a user's name or email
+    """
+    from . import search
+
+    search.reindex_user(user_id)
+    return f"Search documents of user {user_id} reindexed"
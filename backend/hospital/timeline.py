@@ -0,0 +1,118 @@
+"""
+Patient timeline: a clinic patient's appointments and medical records (with
+their prescriptions, lab results and vaccinations), newest first, in one
+cursor-paginated stream.
+
+Each source is read by its own keyset query through a (patient, date)
+index, LIMIT page size + 1 after the source's position in the cursor, and
+heapq.merge interleaves the sorted rows. The cursor keeps one position per
+source, so a page costs one query per source plus the prefetches of its
+rows however long the history is.
+"""
+import heapq
+from datetime import datetime
+from itertools import islice
+
+from django.utils import timezone
+
+from apps.appointments.models import Appointment as ClinicAppointment
+from apps.appointments.serializers import AppointmentSerializer as ClinicAppointmentSerializer
+from apps.medical_records.models import MedicalRecord as ClinicRecord
+from apps.medical_records.serializers import MedicalRecordSerializer as ClinicRecordSerializer
+
+from .pagination import decode_cursor, encode_cursor, keyset_filter, ordering_values
+from .prefetch import apply_prefetch_plan
+
+MAX_PAGE_SIZE = 100
+
+
+class Source:
+    """One kind of timeline event, read newest first."""
+
+    def __init__(self, kind, model, ordering, serializer_class, timestamp):
+        self.kind = kind
+        self.model = model
+        # Descending, unique thanks to the trailing id
+        self.ordering = ordering
+        self.serializer_class = serializer_class
+        self.timestamp = timestamp
+
+    def queryset(self, patient_id, include_confidential):
+        return apply_prefetch_plan(self.model.objects.filter(patient_id=patient_id), self.serializer_class)
+
+    def rows(self, patient_id, position, limit, include_confidential):
+        queryset = self.queryset(patient_id, include_confidential).order_by(*self.ordering)
+        if position is not None:
+            queryset = queryset.filter(keyset_filter(self.ordering, position))
+        return list(queryset[:limit])
+
+
+class RecordSource(Source):
+    def queryset(self, patient_id, include_confidential):
+        queryset = super().queryset(patient_id, include_confidential)
+        return queryset if include_confidential else queryset.filter(is_confidential=False)
+
+
+def appointment_time(appointment):
+    return timezone.make_aware(datetime.combine(appointment.appointment_date, appointment.time_slot.start_time))
+
+
+SOURCES = [
+    Source(
+        'appointment', ClinicAppointment, ['-appointment_date', '-time_slot__start_time', '-id'],
+        ClinicAppointmentSerializer, appointment_time,
+    ),
+    RecordSource(
+        'medical_record', ClinicRecord, ['-record_date', '-id'],
+        ClinicRecordSerializer, lambda record: record.record_date,
+    ),
+]
+
+
+def decode_positions(encoded):
+    """Per-source positions of a cursor; raises ValueError when malformed."""
+    if not encoded:
+        return [None] * len(SOURCES)
+    positions, _ = decode_cursor(encoded)
+    if len(positions) != len(SOURCES) or any(
+        position is not None and (not isinstance(position, list) or len(position) != len(source.ordering))
+        for source, position in zip(SOURCES, positions)
+    ):
+        raise ValueError('cursor does not match the timeline sources')
+    return positions
+
+
+def get_page(patient_id, positions, page_size, include_confidential=False):
+    """
+    Return (events, next_positions); next_positions is None on the last page.
+    Events are (kind, timestamp, row) tuples, newest first.
+    """
+    streams = []
+    for index, (source, position) in enumerate(zip(SOURCES, positions)):
+        rows = source.rows(patient_id, position, page_size + 1, include_confidential)
+        # Ties on the timestamp order by source, then by id, like the per-source ordering
+        streams.append([(source.timestamp(row), index, row.pk, row) for row in rows])
+
+    merged = heapq.merge(*streams, key=lambda event: event[:3], reverse=True)
+    page = list(islice(merged, page_size))
+    events = [(SOURCES[index].kind, timestamp, row) for timestamp, index, _, row in page]
+    # Every source read one row more than a page, so a leftover means more events
+    if next(merged, None) is None:
+        return events, None
+
+    positions = list(positions)
+    for _, index, _, row in page:
+        positions[index] = ordering_values(row, SOURCES[index].ordering)
+    return events, positions
+
+
+def encode_positions(positions):
+    return encode_cursor(positions)
+
+
+def serialize(events, context):
+    serializers = {source.kind: source.serializer_class for source in SOURCES}
+    return [
+        {'type': kind, 'timestamp': timestamp, kind: serializers[kind](row, context=context).data}
+        for kind, timestamp, row in events
+    ]
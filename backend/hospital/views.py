@@ -1,30 +1,48 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import HttpResponse, JsonResponse
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.views.decorators.http import require_POST
 from django.contrib import messages
-from django.core.cache import cache
 from django.views.decorators.cache import cache_page
-from .models import Doctor, Appointment, DoctorSchedule, HomePage, DepartmentPage, ServicePage, NewsPage, Patient, MedicalRecord
-from .tasks import send_appointment_confirmation_email, update_doctor_availability_cache, generate_appointment_statistics
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from django.urls import reverse
+from . import caching, calendar_feed, clinical_search, metrics, profiling, slot_grid, timeline
+from .search import FullTextSearchFilter
+from .models import (
+    Doctor, Appointment, DoctorSchedule, HomePage, DepartmentPage, ServicePage, NewsPage, Patient, MedicalRecord,
+    ExportJob
+)
+from .tasks import (
+    send_appointment_confirmation_email, update_doctor_availability_cache,
+    start_export_job, resume_export_job
+)
 import json
 from datetime import datetime, timedelta
 from django.utils import timezone
-from rest_framework import viewsets, generics, permissions, status, filters
+from rest_framework import viewsets, generics, permissions, status, filters, mixins
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from django.db.models import Q
+from django.db.models import Q, Sum, Value
+from django.db.models.functions import Coalesce, Concat
+from apps.medical_records.models import MedicalRecord as ClinicRecord
+from apps.medical_records.serializers import MedicalRecordSerializer as ClinicRecordSerializer
+from apps.patients.models import Patient as ClinicPatient
+from apps.patients.serializers import PatientSerializer as ClinicPatientSerializer
+
+from . import appointment_stats, exports
+from .prefetch import PrefetchPlanMixin
 from .serializers import (
     DoctorSerializer, AppointmentSerializer, DoctorScheduleSerializer,
     DepartmentSerializer, ServiceSerializer, NewsSerializer,
-    PatientSerializer, MedicalRecordSerializer
+    PatientSerializer, MedicalRecordSerializer, ExportJobSerializer
 )
-from django.db import models
+from django.db import models, transaction
 from django.views.generic import DetailView, TemplateView
 from django.conf import settings
 import os
-import csv
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.decorators import action
+from rest_framework.utils.urls import replace_query_param
 
 
 def home(request):
@@ -36,11 +54,11 @@ def home(request):
 
 def appointment_form(request):
     """View to handle appointment form"""
-    # Get doctors from cache or database
-    doctors = cache.get('all_doctors')
-    if doctors is None:
-        doctors = list(Doctor.objects.all())
-        cache.set('all_doctors', doctors, 3600)  # Cache for 1 hour
+    # Get doctors from cache or database; doctor edits purge the 'doctors' tag
+    doctors = caching.get_or_compute(
+        'all_doctors', lambda: list(Doctor.objects.all()),
+        ttl=60 * 60 * 6, soft_ttl=60 * 60, tags=['doctors']
+    )
 
     if request.method == 'POST':
         patient_name = request.POST.get('name')
@@ -93,30 +111,43 @@ def doctor_list(request):
 
 def calendar_view(request):
     """View to render calendar page"""
-    return render(request, 'hospital/calendar.html')
+    return render(request, 'hospital/calendar_page.html')
+
+
+def _parse_feed_date(value):
+    # FullCalendar sends ISO datetimes such as 2024-05-27T00:00:00+02:00
+    return datetime.strptime(value[:10], '%Y-%m-%d').date()
 
 
-@cache_page(60 * 5)  # Cache for 5 minutes
 def calendar_data(request):
-    """API view to provide calendar data"""
-    # Try to get data from cache
-    events = cache.get('calendar_events')
-    
-    if events is None:
-        schedules = DoctorSchedule.objects.select_related('doctor').all()
-        events = []
-
-        for schedule in schedules:
-            events.append({
-                'title': f'Dr. {schedule.doctor.name}',
-                'start': f'{schedule.date.isoformat()}T{schedule.start_time.isoformat()}',
-                'end': f'{schedule.date.isoformat()}T{schedule.end_time.isoformat()}',
-            })
-        
-        # Cache for 5 minutes
-        cache.set('calendar_events', events, 300)
+    """Calendar feed for ?start=&end= (end exclusive, default: the next six weeks) and optional ?doctor= ids"""
+    try:
+        start = _parse_feed_date(request.GET['start']) if request.GET.get('start') else timezone.now().date()
+        end = _parse_feed_date(request.GET['end']) if request.GET.get('end') else start + timedelta(weeks=6)
+        doctor_ids = [
+            int(doctor_id)
+            for value in request.GET.getlist('doctor')
+            for doctor_id in value.split(',') if doctor_id
+        ]
+    except ValueError:
+        return JsonResponse({'error': 'Invalid parameters. Use YYYY-MM-DD dates and numeric doctor ids'}, status=400)
+    if end <= start or (end - start).days > calendar_feed.MAX_WEEKS * 7:
+        return JsonResponse(
+            {'error': f'The range must end after it starts and be at most {calendar_feed.MAX_WEEKS} weeks long'},
+            status=400
+        )
 
-    return JsonResponse(events, safe=False)
+    feed = calendar_feed.CalendarFeed(start, end, doctor_ids)
+    etag, last_modified = feed.etag, feed.last_modified
+    response = get_conditional_response(
+        request, etag=etag, last_modified=int(last_modified.timestamp())
+    )
+    if response is None:
+        response = JsonResponse(feed.events(), safe=False)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified.timestamp())
+    patch_cache_control(response, max_age=0, must_revalidate=True)
+    return response
 
 
 def contact(request):
@@ -125,34 +156,39 @@ def contact(request):
 
 
 def statistics(request):
-    """View to show appointment statistics"""
-    stats = cache.get('appointment_statistics')
-    
-    if stats is None:
-        # If stats are not in cache, generate them asynchronously
-        generate_appointment_statistics.delay()
-        # Return empty stats for now
-        stats = {
-            'total_appointments': 0,
-            'appointments_by_doctor': {},
-            'appointments_by_date': {}
-        }
-    
+    """View to show hospital appointment statistics for ?start=/&end= (default: last 30 days)"""
+    today = timezone.now().date()
+    try:
+        end = datetime.strptime(request.GET['end'], '%Y-%m-%d').date() if request.GET.get('end') else today
+        start = datetime.strptime(request.GET['start'], '%Y-%m-%d').date() if request.GET.get('start') else end - timedelta(days=29)
+    except ValueError:
+        return HttpResponse('Invalid date format. Use YYYY-MM-DD', status=400)
+
+    # Read from the daily rollup, so cost grows with the number of days only.
+    # The default range shares its key with the generate_appointment_statistics task.
+    if request.GET.get('start') or request.GET.get('end'):
+        cache_key = f'appointment_statistics_{start.isoformat()}_{end.isoformat()}'
+    else:
+        cache_key = 'appointment_statistics'
+    stats = caching.get_or_compute(
+        cache_key, lambda: appointment_stats.summarize(start, end),
+        ttl=21600, soft_ttl=300, family='appointment_statistics', tags=['appointment_statistics']
+    )
     return render(request, 'hospital/statistics.html', {'stats': stats})
 
 
 # API ViewSets
-class PatientViewSet(viewsets.ModelViewSet):
+class PatientViewSet(PrefetchPlanMixin, viewsets.ModelViewSet):
     queryset = Patient.objects.all()
     serializer_class = PatientSerializer
     permission_classes = [permissions.IsAuthenticated]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, FullTextSearchFilter, filters.OrderingFilter]
     filterset_fields = ['user__email', 'date_of_birth']
-    search_fields = ['user__first_name', 'user__last_name', 'user__email']
+    search_kind = 'patient'
     ordering_fields = ['created_at', 'user__last_name']
 
 
-class DoctorViewSet(viewsets.ModelViewSet):
+class DoctorViewSet(PrefetchPlanMixin, viewsets.ModelViewSet):
     queryset = Doctor.objects.all()
     serializer_class = DoctorSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -162,14 +198,16 @@ class DoctorViewSet(viewsets.ModelViewSet):
     ordering_fields = ['created_at', 'user__last_name']
 
 
-class AppointmentViewSet(viewsets.ModelViewSet):
+class AppointmentViewSet(PrefetchPlanMixin, viewsets.ModelViewSet):
     queryset = Appointment.objects.all()
     serializer_class = AppointmentSerializer
     permission_classes = [permissions.IsAuthenticated]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, FullTextSearchFilter, filters.OrderingFilter]
     filterset_fields = ['status', 'date_time', 'doctor', 'patient']
-    search_fields = ['reason', 'notes']
+    search_kind = 'appointment'
     ordering_fields = ['date_time', 'created_at']
+    cursor_ordering = ['-date_time', 'id']
+    EXPORT_CHUNK_SIZE = 2000
 
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -182,28 +220,69 @@ class AppointmentViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'])
     def export_csv(self, request):
+        """
+        Stream appointments as CSV or NDJSON (?export_format=ndjson), optionally
+        gzip-compressed (?compress=gzip) and limited by ?start=/&end= dates.
+        """
+        export_format = request.query_params.get('export_format', 'csv')
+        if export_format not in ('csv', 'ndjson'):
+            return Response(
+                {"error": "export_format must be csv or ndjson"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
         appointments = self.get_queryset()
-        
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = f'attachment; filename="appointments_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv"'
-        
-        writer = csv.writer(response)
-        writer.writerow(['Date', 'Time', 'Patient', 'Doctor', 'Status', 'Notes'])
-        
-        for appointment in appointments:
-            writer.writerow([
-                appointment.date_time.strftime('%Y-%m-%d'),
-                appointment.date_time.strftime('%H:%M'),
-                f"{appointment.patient.user.get_full_name()}",
-                f"Dr. {appointment.doctor.user.get_full_name()}",
-                appointment.status,
-                appointment.notes
-            ])
-        
+        try:
+            start = request.query_params.get('start')
+            end = request.query_params.get('end')
+            if start:
+                start = datetime.strptime(start, '%Y-%m-%d')
+                appointments = appointments.filter(date_time__gte=timezone.make_aware(start))
+            if end:
+                end = datetime.strptime(end, '%Y-%m-%d') + timedelta(days=1)
+                appointments = appointments.filter(date_time__lt=timezone.make_aware(end))
+        except ValueError:
+            return Response(
+                {"error": "Invalid date format. Use YYYY-MM-DD"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # Names are joined in SQL so no row triggers extra queries
+        rows = appointments.order_by('date_time', 'id').values(
+            'id', 'date_time', 'status', 'notes',
+            patient_name=Concat('patient__user__first_name', Value(' '), 'patient__user__last_name'),
+            doctor_name=Concat('doctor__user__first_name', Value(' '), 'doctor__user__last_name'),
+        ).iterator(chunk_size=self.EXPORT_CHUNK_SIZE)
+
+        if export_format == 'csv':
+            content_type, extension = 'text/csv', 'csv'
+            chunks = exports.iter_csv(
+                rows,
+                ['Date', 'Time', 'Patient', 'Doctor', 'Status', 'Notes'],
+                lambda row: [
+                    row['date_time'].strftime('%Y-%m-%d'),
+                    row['date_time'].strftime('%H:%M'),
+                    row['patient_name'].strip(),
+                    f"Dr. {row['doctor_name'].strip()}",
+                    row['status'],
+                    row['notes'],
+                ]
+            )
+        else:
+            content_type, extension = 'application/x-ndjson', 'ndjson'
+            chunks = exports.iter_ndjson(rows)
+
+        filename = f'appointments_{datetime.now().strftime("%Y%m%d_%H%M%S")}.{extension}'
+        if request.query_params.get('compress') == 'gzip':
+            chunks = exports.gzip_stream(chunks)
+            content_type, filename = 'application/gzip', f'{filename}.gz'
+
+        response = StreamingHttpResponse(chunks, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
         return response
 
 
-class MedicalRecordViewSet(viewsets.ModelViewSet):
+class MedicalRecordViewSet(PrefetchPlanMixin, viewsets.ModelViewSet):
     queryset = MedicalRecord.objects.all()
     serializer_class = MedicalRecordSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -211,9 +290,10 @@ class MedicalRecordViewSet(viewsets.ModelViewSet):
     filterset_fields = ['date', 'doctor', 'patient']
     search_fields = ['diagnosis', 'prescription', 'notes']
     ordering_fields = ['date', 'created_at']
+    cursor_ordering = ['-date', 'id']
 
 
-class DoctorScheduleViewSet(viewsets.ModelViewSet):
+class DoctorScheduleViewSet(PrefetchPlanMixin, viewsets.ModelViewSet):
     queryset = DoctorSchedule.objects.all()
     serializer_class = DoctorScheduleSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -231,7 +311,69 @@ class DoctorScheduleViewSet(viewsets.ModelViewSet):
         return queryset
 
 
+class ExportJobViewSet(mixins.CreateModelMixin, mixins.ListModelMixin,
+                       mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    """Background bulk exports written to storage in chunks."""
+    serializer_class = ExportJobSerializer
+    permission_classes = [permissions.IsAdminUser]
+
+    def get_queryset(self):
+        return ExportJob.objects.annotate(exported_rows=Coalesce(Sum('chunks__rows'), 0))
+
+    def perform_create(self, serializer):
+        job = serializer.save(created_by=self.request.user)
+        transaction.on_commit(lambda: start_export_job.delay(job.id))
+
+    @action(detail=True, methods=['post'])
+    def resume(self, request, pk=None):
+        job = self.get_object()
+        if job.status == 'completed':
+            return Response({"error": "Export job already completed"}, status=status.HTTP_400_BAD_REQUEST)
+        resume_export_job.delay(job.id)
+        return Response({'status': 'Export job resumed'})
+
+    @action(detail=True, methods=['get'])
+    def files(self, request, pk=None):
+        job = self.get_object()
+        return Response([
+            {
+                'name': path,
+                'url': request.build_absolute_uri(
+                    reverse('export-job-download', kwargs={'pk': job.pk, 'name': path.rsplit('/', 1)[-1]})
+                ),
+            }
+            for path in exports.export_job_files(job)
+        ])
+
+    @action(detail=True, methods=['get'], url_path=r'files/(?P<name>[\w.-]+)')
+    def download(self, request, pk=None, name=None):
+        job = self.get_object()
+        path = f'{job.pk}/{name}'
+        storage = exports.export_storage()
+        # Only the parts the job's chunks have committed, never an arbitrary file
+        if path not in exports.export_job_files(job) or not storage.exists(path):
+            raise Http404
+        return FileResponse(storage.open(path, 'rb'), as_attachment=True, filename=name,
+                            content_type='application/gzip')
+
+
 # Custom API Views
+def open_schedule_windows(schedules, booked_date_times):
+    """(start_time, end_time) schedule windows that do not already start with a booking"""
+    booked = {
+        timezone.localtime(date_time).time() if timezone.is_aware(date_time) else date_time.time()
+        for date_time in booked_date_times
+    }
+    return [
+        {
+            'start_time': start_time,
+            'end_time': end_time
+        }
+        for start_time, end_time in schedules
+        if start_time not in booked
+    ]
+
+
 class AvailableSlotsView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
@@ -244,51 +386,173 @@ class AvailableSlotsView(APIView):
                 {"error": "Both doctor and date parameters are required"},
                 status=status.HTTP_400_BAD_REQUEST
             )
+        try:
+            day = datetime.strptime(date, '%Y-%m-%d').date()
+            day_start, day_end = slot_grid.day_bounds(day, day)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-        cache_key = f'available_slots_{doctor_id}_{date}'
-        available_slots = cache.get(cache_key)
-
-        if available_slots is None:
+        def load_slots():
             doctor = get_object_or_404(Doctor, id=doctor_id)
             schedules = DoctorSchedule.objects.filter(
                 doctor=doctor,
                 date=date,
                 is_available=True
-            )
-            available_slots = [
-                {
-                    'start_time': schedule.start_time,
-                    'end_time': schedule.end_time
-                }
-                for schedule in schedules
-            ]
-            cache.set(cache_key, available_slots, timeout=300)  # Cache for 5 minutes
-
+            ).values_list('start_time', 'end_time')
+            booked = Appointment.objects.filter(
+                doctor=doctor, date_time__gte=day_start, date_time__lt=day_end
+            ).exclude(status='CANCELLED').values_list('date_time', flat=True)
+            return open_schedule_windows(schedules, booked)
+
+        # Schedule edits and bookings purge the doctor's 'available_slots' tag
+        available_slots = caching.get_or_compute(
+            f'available_slots_{doctor_id}_{date}', load_slots,
+            ttl=60 * 60 * 3, soft_ttl=60 * 30, family='available_slots',
+            tags=[f'available_slots:{doctor_id}']
+        )
         return Response(available_slots)
 
 
+class ProfilingReportView(APIView):
+    """Aggregates of the sampled request profiles (hospital.profiling)"""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response({
+            'sample_rate': settings.PROFILING_SAMPLE_RATE,
+            'views': profiling.get_report(),
+        })
+
+    def delete(self, request):
+        profiling.reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class ClinicalSearchView(PrefetchPlanMixin, generics.ListAPIView):
+    """
+    Clinic medical records, or their patients with group=patients, meeting
+    every search condition (hospital.clinical_search); facets=true adds
+    record_type and is_abnormal counts.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    filter_backends = []
+
+    @property
+    def cursor_ordering(self):
+        if self.get_group() == 'patients':
+            return ['user__first_name', 'user__last_name', 'id']
+        return ['-record_date', 'id']
+
+    def get_group(self):
+        request = getattr(self, 'request', None)
+        return request.query_params.get('group') if request is not None else None
+
+    def get_params(self):
+        if not hasattr(self, '_params'):
+            serializer = clinical_search.ClinicalSearchParams(data=self.request.query_params)
+            serializer.is_valid(raise_exception=True)
+            self._params = serializer.validated_data
+        return self._params
+
+    def get_serializer_class(self):
+        if self.get_group() == 'patients':
+            self.serializer_class = ClinicPatientSerializer
+        else:
+            self.serializer_class = ClinicRecordSerializer
+        return super().get_serializer_class()
+
+    def get_queryset(self):
+        params = self.get_params()
+        keys = clinical_search.matching_keys(self.request.user, params)
+        if params['group'] == 'patients':
+            return ClinicPatient.objects.filter(id__in=keys)
+        records = ClinicRecord.objects.filter(id__in=keys)
+        if not clinical_search.can_view_confidential(self.request.user):
+            records = records.filter(is_confidential=False)
+        return records
+
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        params = self.get_params()
+        if params['facets']:
+            keys = clinical_search.matching_keys(request.user, params)
+            response.data['facets'] = clinical_search.facet_counts(request.user, params, keys)
+        return response
+
+
+class PatientTimelineView(APIView):
+    """
+    A clinic patient's appointments and medical records, newest first
+    (hospital.timeline). Pass `cursor` from `next` for the following page;
+    summary=true adds the cached Patient.get_medical_summary(); both leave out
+    confidential records unless the user may view them.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, patient_id):
+        patient = get_object_or_404(ClinicPatient, pk=patient_id)
+        user = request.user
+        if not (
+            user.is_superuser
+            or user.user_type in clinical_search.CLINICAL_USER_TYPES
+            or (user.user_type == 'patient' and patient.user_id == user.id)
+        ):
+            return Response({'error': 'Not allowed to view this patient'}, status=status.HTTP_403_FORBIDDEN)
+
+        try:
+            positions = timeline.decode_positions(request.query_params.get('cursor', ''))
+            page_size = min(int(request.query_params.get('page_size', settings.REST_FRAMEWORK['PAGE_SIZE'])),
+                            timeline.MAX_PAGE_SIZE)
+        except ValueError:
+            return Response({'error': 'Invalid cursor or page_size'}, status=status.HTTP_400_BAD_REQUEST)
+        if page_size < 1:
+            return Response({'error': 'Invalid cursor or page_size'}, status=status.HTTP_400_BAD_REQUEST)
+
+        include_confidential = clinical_search.can_view_confidential(user)
+        events, next_positions = timeline.get_page(
+            patient.pk, positions, page_size, include_confidential=include_confidential
+        )
+        data = {
+            'patient': patient.pk,
+            'next': None,
+            'results': timeline.serialize(events, {'request': request}),
+        }
+        if next_positions is not None:
+            data['next'] = replace_query_param(
+                request.build_absolute_uri(), 'cursor', timeline.encode_positions(next_positions)
+            )
+        if request.query_params.get('summary') in ('1', 'true'):
+            data['summary'] = patient.get_medical_summary(cached=True, include_confidential=include_confidential)
+        return Response(data)
+
+
 class BookAppointmentView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def post(self, request):
         serializer = AppointmentSerializer(data=request.data)
         if serializer.is_valid():
-            # Check if the slot is still available
             doctor = serializer.validated_data['doctor']
-            date = serializer.validated_data['date']
-            time = serializer.validated_data['time']
-
-            if Appointment.objects.filter(
-                doctor=doctor,
-                date=date,
-                time=time
-            ).exists():
-                return Response(
-                    {"error": "This slot is no longer available"},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-
-            appointment = serializer.save()
+            date_time = serializer.validated_data['date_time']
+
+            with transaction.atomic():
+                # Bookings for one doctor queue on the doctor row for the
+                # few milliseconds it takes to check and insert
+                list(Doctor.objects.select_for_update().filter(pk=doctor.pk).values_list('pk', flat=True))
+
+                # Check if the slot is still available
+                if Appointment.objects.filter(
+                    doctor=doctor,
+                    date_time=date_time
+                ).exclude(status='CANCELLED').exists():
+                    metrics.record_booking('hospital', 'conflict')
+                    return Response(
+                        {"error": "This slot is no longer available"},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+
+                appointment = serializer.save()
+            metrics.record_booking('hospital', 'success')
             return Response(
                 AppointmentSerializer(appointment).data,
                 status=status.HTTP_201_CREATED
@@ -296,22 +560,52 @@ class BookAppointmentView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class DepartmentListView(generics.ListAPIView):
+def page_list_payload(queryset, serializer_class):
+    """Serialize a page listing without a request, so the result can be cached and shared"""
+    return [dict(item) for item in serializer_class(queryset, many=True).data]
+
+
+class CachedPageListMixin:
+    """
+    Serve a page listing from one cached payload, shared with the async views.
+    Publishing or unpublishing pages purges the 'pages' tag.
+    """
+    cache_key = None
+
+    @classmethod
+    def get_payload(cls):
+        return caching.get_or_compute(
+            cls.cache_key, lambda: page_list_payload(cls.queryset.all(), cls.serializer_class),
+            ttl=60 * 60 * 6, soft_ttl=60 * 60, family='page_lists', tags=['pages']
+        )
+
+    def list(self, request, *args, **kwargs):
+        payload = self.get_payload()
+        page = self.paginate_queryset(payload)
+        if page is not None:
+            return self.get_paginated_response(page)
+        return Response(payload)
+
+
+class DepartmentListView(CachedPageListMixin, generics.ListAPIView):
     queryset = DepartmentPage.objects.live()
     serializer_class = DepartmentSerializer
     permission_classes = [permissions.AllowAny]
+    cache_key = 'page_list_departments'
 
 
-class ServiceListView(generics.ListAPIView):
+class ServiceListView(CachedPageListMixin, generics.ListAPIView):
     queryset = ServicePage.objects.live()
     serializer_class = ServiceSerializer
     permission_classes = [permissions.AllowAny]
+    cache_key = 'page_list_services'
 
 
-class NewsListView(generics.ListAPIView):
+class NewsListView(CachedPageListMixin, generics.ListAPIView):
     queryset = NewsPage.objects.live().order_by('-date')
     serializer_class = NewsSerializer
     permission_classes = [permissions.AllowAny]
+    cache_key = 'page_list_news'
 
 
 class SPAView(TemplateView):
@@ -337,9 +631,18 @@ class SPAView(TemplateView):
 
 
 class DoctorAvailabilityView(APIView):
+    """
+    Free slots of one doctor on one day (?doctor=&date=), or of several
+    doctors over a range (?doctors=1,2&month=YYYY-MM or &start=&end=).
+    """
     permission_classes = [permissions.AllowAny]
+    MAX_RANGE_DAYS = 31
+    MAX_DOCTORS = 50
 
     def get(self, request):
+        if 'doctors' in request.query_params or 'month' in request.query_params:
+            return self.get_range(request)
+
         doctor_id = request.query_params.get('doctor')
         date_str = request.query_params.get('date')
 
@@ -352,24 +655,9 @@ class DoctorAvailabilityView(APIView):
         try:
             date = datetime.strptime(date_str, '%Y-%m-%d').date()
             doctor = Doctor.objects.get(id=doctor_id)
-            
-            # Get all appointments for the doctor on the specified date
-            booked_slots = Appointment.objects.filter(
-                doctor=doctor,
-                date_time__date=date,
-                status='SCHEDULED'
-            ).values_list('date_time__time', flat=True)
-            
-            # Generate available time slots (9 AM to 5 PM, 30-minute intervals)
-            available_slots = []
-            current_time = datetime.strptime('09:00', '%H:%M').time()
-            end_time = datetime.strptime('17:00', '%H:%M').time()
-            
-            while current_time < end_time:
-                if current_time not in booked_slots:
-                    available_slots.append(current_time.strftime('%H:%M'))
-                current_time = (datetime.combine(date, current_time) + timedelta(minutes=30)).time()
-            
+
+            available_slots = slot_grid.load_free_slots([doctor.id], date, date)[doctor.id].get(date, [])
+
             return Response({
                 'doctor_id': doctor_id,
                 'date': date_str,
@@ -384,4 +672,43 @@ class DoctorAvailabilityView(APIView):
             return Response(
                 {"error": str(e)},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
\ No newline at end of file
+            )
+
+    def get_range(self, request):
+        try:
+            doctor_ids = [
+                int(doctor_id)
+                for doctor_id in (request.query_params.get('doctors') or request.query_params.get('doctor', '')).split(',')
+                if doctor_id
+            ]
+            if request.query_params.get('month'):
+                start = datetime.strptime(request.query_params['month'], '%Y-%m').date()
+                end = (start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+            else:
+                start = datetime.strptime(request.query_params['start'], '%Y-%m-%d').date()
+                end = datetime.strptime(request.query_params['end'], '%Y-%m-%d').date()
+        except (KeyError, ValueError):
+            return Response(
+                {"error": "Use doctors=<id,...> with month=YYYY-MM or start/end=YYYY-MM-DD"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not doctor_ids or len(doctor_ids) > self.MAX_DOCTORS:
+            return Response(
+                {"error": f"Between 1 and {self.MAX_DOCTORS} doctors are required"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if end < start or (end - start).days >= self.MAX_RANGE_DAYS:
+            return Response(
+                {"error": f"The range must cover 1 to {self.MAX_RANGE_DAYS} days"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        slots = slot_grid.load_free_slots(doctor_ids, start, end)
+        return Response({
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            'doctors': {
+                doctor_id: {day.isoformat(): times for day, times in days.items()}
+                for doctor_id, days in slots.items()
+            }
+        })
\ No newline at end of file
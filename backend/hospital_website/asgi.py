@@ -3,4 +3,15 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'hospital_website.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported once Django is set up
+from hospital.realtime import slot_events  # noqa: E402
+
+
+async def application(scope, receive, send):
+    # Long-lived event streams are served directly, outside Django's request cycle
+    if scope['type'] == 'http' and scope['path'].startswith('/realtime/slots/'):
+        await slot_events(scope, receive, send)
+        return
+    await django_application(scope, receive, send)
@@ -61,7 +61,6 @@ INSTALLED_APPS = [
     'corsheaders',
     'django_filters',
     'drf_yasg',
-    'debug_toolbar',
     'import_export',
     'phonenumber_field',
     'ckeditor',
@@ -84,7 +83,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
-    'debug_toolbar.middleware.DebugToolbarMiddleware',
+    'hospital.profiling.ProfilingMiddleware',
+    'hospital.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -136,6 +136,10 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Background export files hold patient data: kept outside MEDIA_ROOT and
+# downloaded only through ExportJobViewSet
+EXPORT_ROOT = env.str('EXPORT_ROOT', default=os.path.join(BASE_DIR, 'private', 'exports'))
+
 # CORS settings
 CORS_ALLOWED_ORIGINS = env.list('CORS_ALLOWED_ORIGINS', default=[])
 CORS_ALLOW_CREDENTIALS = True
@@ -158,6 +162,14 @@ CACHES = {
     }
 }
 
+# Slot availability bitmaps ('redis' or 'memory' for single-process setups)
+SLOT_AVAILABILITY_BACKEND = env.str('SLOT_AVAILABILITY_BACKEND', default='redis')
+SLOT_LAYOUT_TTL = 60 * 60 * 24  # 1 day
+SLOT_BITMAP_TTL = 60 * 60 * 24  # 1 day
+
+# Slot event push over ASGI ('redis' pub/sub or 'memory' for single-process setups)
+REALTIME_BACKEND = env.str('REALTIME_BACKEND', default='redis')
+
 # Celery Configuration
 CELERY_BROKER_URL = env.str('REDIS_URL', default='redis://redis:6379/0')
 CELERY_RESULT_BACKEND = CELERY_BROKER_URL
@@ -175,7 +187,7 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'hospital.pagination.HybridPagination',
     'PAGE_SIZE': 20,
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
@@ -222,10 +234,20 @@ SIMPLE_JWT = {
     'AUTH_HEADER_TYPES': ('Bearer',),
 }
 
-# Debug Toolbar settings
+# Debug Toolbar settings (development only; production uses the sampled profiler)
 INTERNAL_IPS = [
     '127.0.0.1',
 ]
+if DEBUG:
+    INSTALLED_APPS.append('debug_toolbar')
+    MIDDLEWARE.insert(1, 'debug_toolbar.middleware.DebugToolbarMiddleware')
+
+# Sampled request profiling (hospital.profiling), e.g. 0.01 for 1% of requests
+PROFILING_SAMPLE_RATE = env.float('PROFILING_SAMPLE_RATE', default=0.0)
+PROFILING_N_PLUS_ONE_THRESHOLD = 5
+
+# Bearer token required by /metrics when set; otherwise restrict it in nginx
+METRICS_TOKEN = env.str('METRICS_TOKEN', default='')
 
 # Swagger settings
 SWAGGER_SETTINGS = {
@@ -0,0 +1,60 @@
+"""
+Settings for the local benchmark suite (manage.py run_benchmarks).
+
+SQLite, or a local Postgres through BENCHMARK_DATABASE_URL, and an
+in-process cache stand in for the production services, so the suite runs
+without Redis, Celery workers or a mail server:
+
+    export DJANGO_SETTINGS_MODULE=hospital_website.settings_benchmark
+    python manage.py migrate
+    python manage.py run_benchmarks --setup
+"""
+import os
+
+# The base settings require these; only their presence matters here
+os.environ.setdefault('DJANGO_SECRET_KEY', 'benchmark-only')
+os.environ.setdefault('DATABASE_URL', 'sqlite:///benchmark.sqlite3')
+os.environ.setdefault('REDIS_URL', 'redis://localhost:6379/0')
+os.environ.setdefault('EMAIL_HOST', 'localhost')
+os.environ.setdefault('EMAIL_PORT', '25')
+os.environ.setdefault('EMAIL_HOST_USER', '')
+os.environ.setdefault('EMAIL_HOST_PASSWORD', '')
+os.environ.setdefault('DEFAULT_FROM_EMAIL', 'benchmark@localhost')
+
+from .settings import *  # noqa: E402,F401,F403
+
+DEBUG = False
+ALLOWED_HOSTS = ['testserver', 'localhost', '127.0.0.1']
+# The test client speaks plain HTTP; a redirect would be timed instead of the view
+SECURE_SSL_REDIRECT = False
+SESSION_COOKIE_SECURE = False
+CSRF_COOKIE_SECURE = False
+
+DATABASES = {
+    'default': env.db('BENCHMARK_DATABASE_URL', default=f'sqlite:///{BASE_DIR / "benchmark.sqlite3"}')
+}
+
+# Fake Redis: caching, invalidation tags and version counters fall back to
+# their plain cache code paths
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'benchmark',
+    }
+}
+SLOT_AVAILABILITY_BACKEND = 'memory'
+REALTIME_BACKEND = 'memory'
+
+CELERY_TASK_ALWAYS_EAGER = True
+EMAIL_BACKEND = 'django.core.mail.backends.locmem.EmailBackend'
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+# Measure the views, not the debug toolbar or the rate limits
+MIDDLEWARE = [
+    middleware for middleware in MIDDLEWARE
+    if middleware not in (
+        'debug_toolbar.middleware.DebugToolbarMiddleware',
+        'django_ratelimit.middleware.RatelimitMiddleware',
+    )
+]
+REST_FRAMEWORK = {**REST_FRAMEWORK, 'DEFAULT_THROTTLE_CLASSES': []}
@@ -8,7 +8,7 @@ from drf_yasg import openapi
 from wagtail.admin import urls as wagtailadmin_urls
 from wagtail import urls as wagtail_urls
 from wagtail.documents import urls as wagtaildocs_urls
-from hospital import views
+from hospital import async_views, metrics, views
 from rest_framework import routers
 from wagtail.api.v2.views import PagesAPIViewSet
 from wagtail.api.v2.router import WagtailAPIRouter
@@ -22,6 +22,7 @@ router.register(r'doctors', api_views.DoctorViewSet)
 router.register(r'patients', api_views.PatientViewSet)
 router.register(r'appointments', api_views.AppointmentViewSet)
 router.register(r'services', api_views.ServiceViewSet)
+router.register(r'export-jobs', views.ExportJobViewSet, basename='export-job')
 
 # Create the Wagtail API router
 wagtail_api = WagtailAPIRouter('wagtailapi')
@@ -53,6 +54,23 @@ urlpatterns = [
     path('api/v1/', include(router.urls)),
     path('api/v1/wagtail/', wagtail_api.urls),
     
+    # Public read endpoints; the async variants are meant for the ASGI server
+    path('api/v1/doctor-availability/', views.DoctorAvailabilityView.as_view(), name='doctor-availability'),
+    path('api/v1/available-slots/', views.AvailableSlotsView.as_view(), name='available-slots'),
+    path('api/v1/departments/', views.DepartmentListView.as_view(), name='department-list'),
+    path('api/v1/service-pages/', views.ServiceListView.as_view(), name='service-page-list'),
+    path('api/v1/news/', views.NewsListView.as_view(), name='news-list'),
+    path('api/v1/async/doctor-availability/', async_views.doctor_availability, name='async-doctor-availability'),
+    path('api/v1/async/available-slots/', async_views.available_slots, name='async-available-slots'),
+    path('api/v1/async/departments/', async_views.department_list, name='async-department-list'),
+    path('api/v1/async/service-pages/', async_views.service_list, name='async-service-page-list'),
+    path('api/v1/async/news/', async_views.news_list, name='async-news-list'),
+    path('api/v1/clinic-patients/<int:patient_id>/timeline/', views.PatientTimelineView.as_view(),
+         name='patient-timeline'),
+    path('api/v1/clinical-search/', views.ClinicalSearchView.as_view(), name='clinical-search'),
+    path('api/v1/admin/profiling/', views.ProfilingReportView.as_view(), name='profiling-report'),
+    path('metrics', metrics.metrics_view, name='metrics'),
+
     # REST API endpoints
     path('api/v1/auth/', include('djoser.urls')),
     path('api/v1/auth/', include('djoser.urls.jwt')),
@@ -65,14 +83,13 @@ urlpatterns = [
     # CKEditor
     path('ckeditor/', include('ckeditor_uploader.urls')),
     
-    # Debug Toolbar
-    path('__debug__/', include('debug_toolbar.urls')),
-    
     # Hospital app URLs
     path('', views.home, name='home'),
     path('hospital/appointment/', views.appointment_form, name='appointment_form'),
     path('hospital/appointment/success/', views.appointment_success, name='appointment_success'),
     path('doctors/', views.doctor_list, name='doctor_list'),
+    path('hospital/calendar/', views.calendar_view, name='calendar'),
+    path('hospital/calendar/events/', views.calendar_data, name='calendar-data'),
     path('contact/', views.contact, name='contact'),
     
     # Wagtail CMS pages - should be at the bottom
@@ -80,5 +97,6 @@ urlpatterns = [
 ]
 
 if settings.DEBUG:
+    urlpatterns += [path('__debug__/', include('debug_toolbar.urls'))]
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
     urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
\ No newline at end of file